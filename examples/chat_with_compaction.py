@@ -11,18 +11,18 @@ keep_last_n_messages = 3
 def compact(messages, user_id: str = "default_user") -> str:
     """ Compact the messages to keep only the last n messages """
 
-    # learn message state 
-    run = memory.add_messages(user_id, messages)
+    # learn message state in the background; the chat loop continues immediately
+    run = memory.add_messages(user_id, messages, return_handle=True)
     messages = messages[-keep_last_n_messages:]
 
-    # get the user memory and summary (can also run in another thread)
-    memory.wait_for_run(run)
+    # refresh the user memory and summary only once the sleeptime run has finished
+    def on_memory_updated(handle):
+        summary = memory.get_summary(user_id, prompt_formatted=True)
+        user_memory = memory.get_user_memory(user_id, prompt_formatted=True)
+        print(f"Summary: {summary}")
+        print(f"User Memory: {user_memory}")
 
-    # print the summary 
-    summary = memory.get_summary(user_id, prompt_formatted=True)
-    user_memory = memory.get_user_memory(user_id, prompt_formatted=True)
-    print(f"Summary: {summary}")
-    print(f"User Memory: {user_memory}")
+    run.add_done_callback(on_memory_updated)
 
     return messages 
 
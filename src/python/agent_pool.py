@@ -0,0 +1,203 @@
+import atexit
+import logging
+import threading
+import time
+import uuid
+import weakref
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+POOL_TAG_PREFIX = "ai-memory-sdk-pool:"
+
+
+class BlockSpec(NamedTuple):
+    """ A memory block a pooled agent is created with """
+    label: str
+    description: str
+    char_limit: int = 10000
+    value: str = ""
+
+
+# the blocks initialize_user_memory creates with its default arguments
+USER_BLOCKS = (
+    BlockSpec("human", "Details about the human user you are speaking to.", 10000),
+    BlockSpec("summary", "A short (1-2 sentences) running summary of the conversation.", 1000),
+)
+
+
+class PoolPolicy(NamedTuple):
+    """ How many pre-created sleeptime agents Memory keeps ready, and with which blocks
+
+    A pool serves onboarding calls that need exactly its block labels: the default
+    (`USER_BLOCKS`) serves `initialize_user_memory`, `blocks=()` serves new subjects. Members
+    older than `max_age` seconds are replaced; `refill_interval` is how often the background
+    thread checks the pool when nothing was claimed.
+
+    Unclaimed members are deleted by `Memory.close()` and at interpreter exit. A process that
+    dies without either (killed, `os._exit`) leaves them idle on the server until the next pool
+    with the same name sweeps them, `max_age` later.
+    """
+    size: int = 4
+    blocks: Sequence[BlockSpec] = USER_BLOCKS
+    max_age: float = 24 * 3600.0
+    refill_interval: float = 60.0
+    name: str = "default"
+    discard_on_close: bool = True  # delete unclaimed members when the pool is closed
+
+
+class PooledAgent(NamedTuple):
+    agent_id: str
+    created_at: float  # wall-clock time, also encoded in the agent name
+    block_ids: Dict[str, str]  # label -> block id
+
+
+# pools not closed yet, closed at interpreter exit so their members are not left idle on the server
+_open_pools: "weakref.WeakSet[AgentPool]" = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_pools() -> None:
+    for pool in list(_open_pools):
+        pool.close()
+
+
+def pool_agent_name(pool_name: str, created_at: float) -> str:
+    return f"pool_agent_{pool_name}_{int(created_at)}_{uuid.uuid4().hex[:8]}"
+
+
+def pool_agent_created_at(name: str) -> Optional[float]:
+    """ Creation time encoded by pool_agent_name, None for other names """
+    parts = (name or "").rsplit("_", 2)
+    if len(parts) != 3 or not parts[0].startswith("pool_agent_") or not parts[1].isdigit():
+        return None
+    return float(parts[1])
+
+
+class AgentPool:
+    """ Background-refilled set of untagged sleeptime agents, ready to be claimed by a new subject
+
+    `provision_fn(name, tags)` creates one member (agent plus the policy's blocks),
+    `discard_fn(agent_id)` deletes one, and `list_fn(tag)` returns (agent id, name) pairs of
+    agents carrying the pool tag. When the pool starts, it deletes members that other processes
+    left behind for longer than `max_age`. A pool only hands out agents it created itself, so
+    processes never claim the same agent.
+    """
+
+    def __init__(
+        self,
+        policy: PoolPolicy,
+        provision_fn: Callable[[str, List[str]], PooledAgent],
+        discard_fn: Callable[[str], None],
+        list_fn: Callable[[str], List[Tuple[str, str]]],
+    ):
+        self.policy = policy
+        self.tag = f"{POOL_TAG_PREFIX}{policy.name}"
+        self.claimed = 0  # members handed out since the pool started
+        self.misses = 0  # claims that found the pool empty
+        self._provision_fn = provision_fn
+        self._discard_fn = discard_fn
+        self._list_fn = list_fn
+        self._labels = frozenset(b.label for b in policy.blocks)
+        self._ready: Deque[PooledAgent] = deque()
+        self._expired: List[PooledAgent] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        _open_pools.add(self)
+        self._thread = threading.Thread(target=self._run, name="ai-memory-sdk-agent-pool", daemon=True)
+        self._thread.start()
+
+    def serves(self, labels: Iterable[str]) -> bool:
+        return frozenset(labels) == self._labels
+
+    def ready_count(self) -> int:
+        with self._lock:
+            return len(self._ready)
+
+    def claim(self, labels: Iterable[str]) -> Optional[PooledAgent]:
+        """ Take the oldest fresh member if the pool serves these block labels, else None """
+        if not self.serves(labels):
+            return None
+        now = time.time()
+        with self._lock:
+            while self._ready and now - self._ready[0].created_at >= self.policy.max_age:
+                self._expired.append(self._ready.popleft())  # deleted by the next refill
+            member = self._ready.popleft() if self._ready else None
+            if member is None:
+                self.misses += 1
+            else:
+                self.claimed += 1
+        self._wakeup.set()
+        return member
+
+    def refill(self) -> int:
+        """ Replace expired members and top the pool up to its size; returns members created """
+        now = time.time()
+        with self._lock:
+            expired = self._expired + [m for m in self._ready if now - m.created_at >= self.policy.max_age]
+            self._ready = deque(m for m in self._ready if now - m.created_at < self.policy.max_age)
+            self._expired = []
+        for member in expired:
+            self._discard(member.agent_id)
+        created = 0
+        while not self._closed and self.ready_count() < self.policy.size:
+            created_at = time.time()
+            member = self._provision_fn(pool_agent_name(self.policy.name, created_at), [self.tag])
+            with self._lock:
+                if self._closed:
+                    stray = member
+                else:
+                    self._ready.append(member)
+                    stray = None
+            if stray is not None:
+                self._discard(stray.agent_id)
+                break
+            created += 1
+        return created
+
+    def sweep(self) -> int:
+        """ Delete pool agents no live pool will claim any more (expired, or left by a dead process) """
+        with self._lock:
+            own = {m.agent_id for m in self._ready}
+        cutoff = time.time() - self.policy.max_age - self.policy.refill_interval
+        stale = [
+            agent_id for agent_id, name in self._list_fn(self.tag)
+            if agent_id not in own and (pool_agent_created_at(name) or 0) < cutoff
+        ]
+        for agent_id in stale:
+            self._discard(agent_id)
+        return len(stale)
+
+    def close(self) -> None:
+        """ Stop refilling; unclaimed members are deleted if the policy says so """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            members, self._ready = list(self._ready), deque()
+        self._wakeup.set()
+        _open_pools.discard(self)
+        if self.policy.discard_on_close:
+            for member in members:
+                self._discard(member.agent_id)
+
+    def _discard(self, agent_id: str) -> None:
+        try:
+            self._discard_fn(agent_id)
+        except Exception as e:
+            logger.warning("Failed to delete pooled agent %s: %s", agent_id, e)
+
+    def _run(self) -> None:
+        try:
+            self.sweep()
+        except Exception as e:
+            logger.warning("Agent pool sweep failed: %s", e)
+        while not self._closed:
+            try:
+                self.refill()
+            except Exception as e:
+                logger.warning("Agent pool refill failed: %s", e)
+            self._wakeup.wait(self.policy.refill_interval)
+            self._wakeup.clear()
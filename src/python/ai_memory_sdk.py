@@ -1,22 +1,105 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Hashable, Iterable, Iterator, NamedTuple, Optional, Sequence, Tuple, Union
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import functools
+import inspect
+from datetime import datetime
+import logging
+import threading
 import time
 import os
-from letta_client import Letta
-from prompt_formatter import format_messages
+import httpx
+from backend import MemoryBackend
+from call_stats import CallAccounting, CallCounter, CallStats, ContextThreadPoolExecutor, CountedClient, tracks_operation
+from agent_pool import POOL_TAG_PREFIX, AgentPool, BlockSpec, PooledAgent, PoolPolicy
+from buffer import BufferPolicy, MessageBuffer
+from cache import BlockCache, CacheStats, CachedBlock, TTLCache
+from clients import ClientOptions, ClientRegistry, shared_clients
+from dedupe import PassageDedupe, normalize_text
+from local_index import LocalIndex
+from file_sync import SyncPlan, SyncResult, default_manifest_path, load_manifest, mark_processed, plan_sync, save_manifest
+from passages import PassageWriteResult, SearchHit, SearchQuery, merge_duplicates, write_passages
+from runs import ALL, FAILED_STATUSES, Backoff, RunHandle, RunPoller, check_return_when, is_satisfied, is_terminal
+from prompt_formatter import context_separator, format_memories, format_messages, iter_file_parts
 from schemas import MessageCreate
+from singleflight import FlightStats, SingleFlight
+from subject_index import SubjectIndex
+from subject_lock import SubjectLocks, process_locks
 
-class Memory: 
-    """ A memory SDK for Letta
 
-    Adds a general "subject" model while keeping user-specific helpers.
-    One subject maps to one Letta agent; multiple labeled blocks (e.g. "human",
-    "summary", "preferences") can be attached to that subject.
-    """
+logger = logging.getLogger(__name__)
+
+
+class _AgentRef(NamedTuple):
+    """ Resolved agent handle. Callers only ever need the id. """
+    id: str
+
+
+class ContextBundle(NamedTuple):
+    """ Everything needed to build a prompt for one subject, from get_context_bundle """
+    subject_id: str
+    agent_id: Optional[str]
+    blocks: List[CachedBlock]  # in the requested label order; missing labels are left out
+    memories: List[SearchHit]
+    prompt: str  # blocks then <relevant_memories>, ready to append to a system prompt
+
+    def block(self, label: str) -> Optional[CachedBlock]:
+        return next((b for b in self.blocks if b.label == label), None)
+
+
+class ReconcileResult(NamedTuple):
+    """ Outcome of reconcile_subject: the agent kept for a subject and what was merged into it """
+    subject_id: str
+    kept: Optional[str]  # None if no agent carries the subject's tags
+    deleted: List[str]  # duplicate agents removed (or that would be, on a dry run)
+    passages_copied: int
+    blocks_copied: int
+
+
+class SubjectExistsError(ValueError):
+    """ Raised by initialize_subject / initialize_user_memory when the agent already exists and reset is False """
+
+    def __init__(self, message: str, agent_id: str):
+        super().__init__(message)
+        self.agent_id = agent_id
+
+
+class _MemoryBase(ABC):
+    """ Configuration, caches and pure helpers shared by Memory and AsyncMemory """
+
+    _supports_message_buffer = False
+    _supports_agent_pool = False
+    _single_flight = SingleFlight
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # attribute upstream calls to the public method they were made for (see stats())
+        for name, value in list(vars(cls).items()):
+            if not name.startswith("_") and inspect.isfunction(value):
+                setattr(cls, name, tracks_operation(name, value))
 
     def __init__(self,
         api_key: Optional[str] = None,
         subject_id: Optional[str] = None,
         base_url: Optional[str] = None,
+        subject_cache_size: int = 1024,
+        subject_cache_ttl: Optional[float] = 60.0,
+        block_cache_size: int = 4096,
+        search_cache_size: int = 1024,
+        search_cache_ttl: Optional[float] = 60.0,
+        passage_write_concurrency: int = 8,
+        message_buffer: Optional[BufferPolicy] = None,
+        passage_dedupe: Optional[PassageDedupe] = None,
+        local_index: Optional[LocalIndex] = None,
+        http_options: Optional[ClientOptions] = None,
+        share_client: bool = True,
+        agent_pool: Optional[PoolPolicy] = None,
+        subject_index: Optional[SubjectIndex] = None,
+        subject_locks: Optional[SubjectLocks] = None,
+        backend: Optional[MemoryBackend] = None,
+        model: str = "openai/gpt-4.1",
+        embedding: Optional[str] = None,
     ):
         """
         Initialize the Memory SDK
@@ -25,18 +108,50 @@ class Memory:
             api_key: Letta API key (defaults to LETTA_API_KEY env var). Required for Letta Cloud.
             subject_id: Optional default subject for instance-scoped operations
             base_url: Letta server URL (defaults to Letta Cloud). For self-hosted: "http://localhost:<port>" or server URL
+            subject_cache_size: Max number of subject -> agent lookups kept in memory (0 disables the cache)
+            subject_cache_ttl: Seconds a cached subject -> agent lookup stays valid (None: until invalidated)
+            block_cache_size: Max number of blocks kept for `max_staleness` reads (0 disables the cache)
+            search_cache_size: Max number of search() results kept in memory (0 disables the cache)
+            search_cache_ttl: Seconds a cached search result stays valid (None: until invalidated)
+            passage_write_concurrency: Max archival passages written in parallel (1 writes them serially)
+            message_buffer: Opt-in write-behind ingestion (Memory only). add_messages calls are queued per
+                subject and flushed as one sleeptime run when the BufferPolicy limits are reached.
+            passage_dedupe: Fingerprint store used to skip archival passages whose text is already
+                stored for the subject (see dedupe.PassageDedupe)
+            local_index: In-process similarity index that answers search() locally, falling back to
+                the server when it has no match (see local_index.LocalIndex; requires numpy)
+            http_options: Connection pool size, keep-alive, HTTP/2 and timeouts (see clients.ClientOptions)
+            share_client: Reuse the process-wide client (and its warm connections) of other instances
+                with the same base_url, api_key and http_options
+            agent_pool: Opt-in pool of pre-created sleeptime agents (Memory only). New users or
+                subjects claim a ready agent instead of creating one (see agent_pool.PoolPolicy).
+            subject_index: Persistent subject -> agent -> block id map consulted before tag scans
+                (see subject_index.SubjectIndex)
+            subject_locks: Per-subject locks serializing agent creation. The default is shared by every
+                instance in this process; SubjectLocks(directory) also covers processes sharing the directory.
+            backend: Use this client instead of connecting to Letta, e.g. local_backend.LocalLetta for
+                tests or deployments without a Letta server (see backend.MemoryBackend). api_key and
+                base_url are then ignored.
+            model: LLM of the sleeptime agents this instance creates
+            embedding: Embedding model of the agents this instance creates (None: the server default)
         """
+        self.http_options = http_options or ClientOptions()
+        self.share_client = share_client
+        self.model = model
+        self.embedding = embedding
         if api_key is None:
             api_key = os.getenv("LETTA_API_KEY")
         
         # Initialize Letta client with appropriate parameters
-        if base_url:
+        if backend is not None:
+            self.letta_client = self._adapt_backend(backend)
+        elif base_url:
             # Self-hosted Letta server
             # Token is optional for self-hosted (only needed if password protection is enabled)
             if api_key:
-                self.letta_client = Letta(base_url=base_url, token=api_key)
+                self.letta_client = self._create_client(base_url=base_url, token=api_key)
             else:
-                self.letta_client = Letta(base_url=base_url)
+                self.letta_client = self._create_client(base_url=base_url)
         else:
             # Letta Cloud (requires API key)
             if not api_key:
@@ -44,112 +159,712 @@ class Memory:
                     "api_key is required for Letta Cloud. Either pass api_key parameter "
                     "or set LETTA_API_KEY environment variable. For self-hosted, pass base_url."
                 )
-            self.letta_client = Letta(token=api_key)
+            self.letta_client = self._create_client(token=api_key)
+        # every upstream call goes through this view of letta_client so it is counted
+        self._calls = CallAccounting()
+        self._upstream = CountedClient(lambda: self.letta_client, self._calls)
         
         # Optional default subject for instance-scoped operations
         self.subject_id = subject_id
         self._default_tag = "ai-memory-sdk"
 
-    def _create_sleeptime_agent(self, name: str, tags: List[str]): 
-        """ Create a subconscious agent that learns over time """ 
-        # Ensure default SDK tag is present
-        tags = list(dict.fromkeys((tags or []) + [self._default_tag]))
-        agent_state = self.letta_client.agents.create(
-            name=name,
-            model="openai/gpt-4.1",
-            agent_type="sleeptime_agent",
-            initial_message_sequence=[], 
-            tags=tags
+        # subject/tag -> agent id lookups; only hits are cached so newly created agents are always found
+        self._agent_cache = TTLCache(maxsize=subject_cache_size, ttl=subject_cache_ttl)
+        # (agent_id, label) -> last block snapshot, served to reads that pass max_staleness
+        self._block_cache = BlockCache(maxsize=block_cache_size)
+        # (agent_id, normalized query, tags, k) -> search results; dropped when the agent gets new passages
+        self._search_cache = TTLCache(maxsize=search_cache_size, ttl=search_cache_ttl)
+        self._search_versions: Dict[str, int] = {}
+        self._search_lock = threading.Lock()
+        # run id -> agent id for runs started by this instance, so completion can invalidate blocks
+        self._tracked_runs = TTLCache(maxsize=4096)
+        # last run id of a chunked submission -> earlier runs of that submission not yet finished
+        self._run_groups = TTLCache(maxsize=4096)
+        # identical lookups in flight at the same time share one upstream call
+        self._flights = self._single_flight()
+
+        self.passage_write_concurrency = max(1, passage_write_concurrency)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._run_poller: Optional[RunPoller] = None
+
+        if message_buffer is not None and not self._supports_message_buffer:
+            raise ValueError(f"message_buffer is not supported by {type(self).__name__}")
+        self._message_buffer_policy = message_buffer
+        self._message_buffer: Optional[MessageBuffer] = None
+        self.passage_dedupe = passage_dedupe
+        self.local_index = local_index
+        self.subject_index = subject_index
+        self.subject_locks = subject_locks or process_locks
+
+        if agent_pool is not None and not self._supports_agent_pool:
+            raise ValueError(f"agent_pool is not supported by {type(self).__name__}")
+        self._agent_pool_policy = agent_pool
+        self._agent_pool: Optional[AgentPool] = None
+        if agent_pool is not None:
+            self._agent_pool = AgentPool(agent_pool, self._provision_pool_agent, self._delete_agent, self._list_pool_agents)
+
+    @abstractmethod
+    def _create_client(self, base_url: Optional[str] = None, token: Optional[str] = None):
+        """ Construct (or look up the shared) Letta client used for all upstream calls """
+
+    def _adapt_backend(self, backend: MemoryBackend) -> MemoryBackend:
+        """ The client to use for a `backend` passed in by the caller """
+        return backend
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """ Lazily create the thread pool used for concurrent upstream calls """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ContextThreadPoolExecutor(
+                    max_workers=self.passage_write_concurrency,
+                    thread_name_prefix="ai-memory-sdk",
+                )
+            return self._executor
+
+    def close(self):
+        """ Release background resources (worker threads) held by this instance """
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def _agent_options(self, blocks: Sequence[BlockSpec] = ()) -> Dict[str, Any]:
+        """ agents.create arguments shared by every sleeptime agent; `blocks` are created with the agent """
+        options: Dict[str, Any] = {"model": self.model, "agent_type": "sleeptime_agent", "initial_message_sequence": []}
+        if self.embedding is not None:
+            options["embedding"] = self.embedding
+        if blocks:
+            options["memory_blocks"] = [
+                {"label": b.label, "description": b.description, "value": b.value, "limit": b.char_limit} for b in blocks
+            ]
+        return options
+
+    def _message_passages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """ Archival passages for a list of messages, tagged with their role """
+        return [{"text": m["content"], "tags": [m["role"], self._default_tag]} for m in messages]
+
+    def _log_passage_failures(self, agent_id: str, results: List[PassageWriteResult]):
+        failed = [r for r in results if not r.ok]
+        if failed:
+            logger.warning(
+                "Failed to store %d of %d passages for agent %s: %s",
+                len(failed), len(results), agent_id, failed[0].error,
+            )
+
+    def _claim_passages(self, agent_id: str, passages: List[Dict[str, Any]]) -> Tuple[List[bool], List[Dict[str, Any]]]:
+        """ Claim passage fingerprints; returns the claim flags and the passages still to write """
+        claimed = self.passage_dedupe.claim(agent_id, [(p["text"], p.get("tags")) for p in passages])
+        return claimed, [p for p, is_new in zip(passages, claimed) if is_new]
+
+    def _merge_claimed(
+        self,
+        agent_id: str,
+        passages: List[Dict[str, Any]],
+        claimed: List[bool],
+        results: List[PassageWriteResult],
+    ) -> List[PassageWriteResult]:
+        """ Release fingerprints of failed writes and report duplicates alongside written passages """
+        fresh = [p for p, is_new in zip(passages, claimed) if is_new]
+        self.passage_dedupe.release(agent_id, [(p["text"], p.get("tags")) for p, r in zip(fresh, results) if not r.ok])
+        skipped = claimed.count(False)
+        if skipped:
+            logger.info("Skipped %d of %d duplicate passages for agent %s", skipped, len(passages), agent_id)
+        return merge_duplicates(passages, claimed, results)
+
+    def _index_written(self, agent_id: str, passages: List[Dict[str, Any]], results: List[PassageWriteResult]):
+        """ Make newly stored passages searchable: drop cached results, extend the local index """
+        if any(r.ok and not r.duplicate for r in results):
+            self._invalidate_search(agent_id)
+        if self.local_index is not None:
+            stored = [(r.text, passages[r.index].get("tags") or []) for r in results if r.ok and not r.duplicate]
+            self.local_index.add(agent_id, stored)
+
+    def _local_hits(self, agent_id: str, q: SearchQuery) -> Optional[List[SearchHit]]:
+        """ Local index hits above the score threshold, or None to fall back to the server """
+        hits = self.local_index.search(agent_id, q.query, tags=list(q.tags), k=q.limit)
+        if not hits:
+            return None
+        return [hit for hit in (SearchHit(h.text, score=h.score, tags=sorted(h.tags)) for h in hits) if q.accepts(hit)]
+
+    def _server_hits(self, response: Any, q: SearchQuery) -> List[SearchHit]:
+        hits = [
+            SearchHit(r.content, score=getattr(r, "score", None), timestamp=getattr(r, "timestamp", None), tags=getattr(r, "tags", None))
+            for r in response.results
+        ]
+        return [hit for hit in hits if q.accepts(hit)]
+
+    def _file_parts(self, file: Dict[str, Any]) -> Iterator[Dict[str, str]]:
+        """ Lazily formatted <file_part> messages for a {"file_path", "label", "description"} dict """
+        file_path = file["file_path"]
+        label = file.get("label") or os.path.basename(file_path)
+        return iter_file_parts(file_path, label, file.get("description", ""))
+
+    def _plan_directory_sync(self, path: str, subject_id: str, agent_id: str, description: str, pattern: str,
+                             manifest_path: Optional[str], hash_workers: Optional[int]):
+        """ Load the manifest and work out which files need ingesting; unchanged/removed entries are applied """
+        manifest_path = manifest_path or default_manifest_path(path, subject_id)
+        manifest = load_manifest(manifest_path)
+        plan = plan_sync(path, manifest, agent_id, description=description, pattern=pattern,
+                         exclude=[manifest_path], max_workers=hash_workers)
+        for rel in plan.removed:
+            manifest.pop(rel)
+        for entry in plan.touched:
+            manifest[entry.label] = entry
+        return manifest_path, manifest, plan
+
+    def _sync_result(self, plan: SyncPlan, run_ids: Dict[str, Optional[str]]) -> SyncResult:
+        return SyncResult(
+            ingested=list(run_ids),
+            unchanged=sorted(plan.unchanged + [e.label for e in plan.touched]),
+            removed=plan.removed,
+            run_ids=run_ids,
         )
-        return agent_state.id
 
-    def _get_matching_agent(self, tags: List[str]): 
-        """ Get an agent with matching tags """ 
-        agents = self.letta_client.agents.list(tags=tags, match_all_tags=True)
-        if agents:
-            return agents[0]
-        return None
+    def _register_chunked_run(self, agent_id: str, run_ids: List[str]) -> str:
+        """ Track the runs of one submission; the last run id stands for the whole group """
+        run_id = run_ids[-1]
+        if len(run_ids) > 1:
+            self._run_groups.set(run_id, run_ids[:-1])
+        self._tracked_runs.set(run_id, agent_id)
+        return run_id
+
+    def _user_blocks(
+        self,
+        user_context_block_prompt: str = "Details about the human user you are speaking to.",
+        user_context_block_char_limit: int = 10000,
+        user_context_block_value: str = "",
+        summary_block_prompt: str = "A short (1-2 sentences) running summary of the conversation.",
+        summary_block_char_limit: int = 1000,
+    ) -> List[BlockSpec]:
+        """ The human and summary blocks of a user agent, as initialize_user_memory creates them """
+        return [
+            BlockSpec("human", user_context_block_prompt, user_context_block_char_limit, user_context_block_value),
+            BlockSpec("summary", summary_block_prompt, summary_block_char_limit),
+        ]
 
     def _subject_tags(self, subject_id: str) -> List[str]:
         """Standardize tags for a subject. Include namespaced, raw, and SDK tag."""
         return [f"subj:{subject_id}", subject_id, self._default_tag]
 
+    def _indexed_agent(self, tags: List[str]) -> Optional[str]:
+        """ Agent id the subject index has for a single-tag lookup """
+        if self.subject_index is None or len(tags) != 1:
+            return None
+        return self.subject_index.agent_for(tags[0])
+
+    def _index_agent(self, agent_id: str, tags: List[str]):
+        """ Record an agent's subject tags; the SDK tag and pool tags are shared, so they are skipped """
+        if self.subject_index is not None:
+            tags = [t for t in tags if t != self._default_tag and not t.startswith(POOL_TAG_PREFIX)]
+            self.subject_index.set_agent(agent_id, tags)
+
+    def _index_blocks(self, agent_id: str, blocks: List[Any]):
+        if self.subject_index is not None:
+            self.subject_index.set_blocks(agent_id, [(self._block_field(b, "label"), self._block_id(b)) for b in blocks])
+
+    def _indexed_block_id(self, agent_id: str, label: str) -> Optional[str]:
+        return self.subject_index.block_id(agent_id, label) if self.subject_index is not None else None
+
+    def _index_entries(self, agents: List[Any]) -> List[Tuple[str, List[str], List[Tuple[str, str]]]]:
+        """ (agent id, subject tags, (label, block id) pairs) for a subject index rebuild """
+        entries = []
+        for agent in agents:
+            tags = [t for t in (agent.tags or []) if t != self._default_tag and not t.startswith(POOL_TAG_PREFIX)]
+            memory = getattr(agent, "memory", None)
+            blocks = getattr(memory, "blocks", None) or []
+            entries.append((agent.id, tags, [(self._block_field(b, "label"), self._block_id(b)) for b in blocks]))
+        return entries
+
+    def _rank_agents(self, agents: List[Any]) -> List[Any]:
+        """ Agents oldest first; agents without created_at keep their listing order, after the rest """
+        def key(agent):
+            created_at = getattr(agent, "created_at", None)
+            return (created_at is None, created_at or datetime.min)
+        return sorted(agents, key=key)
+
+    def _oldest_agent(self, agents: List[Any], tags: List[str]) -> Any:
+        """ The agent a tag lookup resolves to; duplicates from a creation race resolve to the first one created """
+        if len(agents) == 1:
+            return agents[0]
+        agent = self._rank_agents(agents)[0]
+        logger.warning(
+            "%d agents match tags %s, using the oldest (%s); run reconcile_subject() to merge the others",
+            len(agents), tags, agent.id,
+        )
+        return agent
+
+    def _missing_passages(self, existing: Iterable[Any], duplicates: Iterable[Any]) -> List[Dict[str, Any]]:
+        """ Passages of duplicate agents whose normalized text the kept agent does not already have """
+        seen = {normalize_text(p.text) for p in existing}
+        missing = []
+        for passage in duplicates:
+            text = normalize_text(passage.text)
+            if text not in seen:
+                seen.add(text)
+                missing.append({"text": passage.text, "tags": list(getattr(passage, "tags", None) or [])})
+        return missing
+
+    def _missing_blocks(self, existing: Iterable[Any], duplicates: Iterable[Any]) -> List[CachedBlock]:
+        """ Blocks of duplicate agents whose label the kept agent lacks (first one wins per label) """
+        labels = {self._block_field(b, "label") for b in existing}
+        missing = []
+        for block in duplicates:
+            snapshot = self._snapshot_block(block)
+            if snapshot.label not in labels:
+                labels.add(snapshot.label)
+                missing.append(snapshot)
+        return missing
+
+    def _invalidate_subject(self, subject_id: str):
+        """Drop any cached agent lookups for a subject (or legacy user id)."""
+        for key in (("subject", subject_id), ("tags", f"subj:{subject_id}"), ("tags", subject_id)):
+            self._agent_cache.pop(key)
+
+    def _get_effective_subject(self, subject_id: Optional[str]) -> str:
+        """Resolve the effective subject id, preferring the instance default if not provided."""
+        sid = subject_id or self.subject_id
+        if not sid:
+            raise ValueError("No subject_id provided and instance is not bound to a subject. "
+                             "Pass subject_id=... or initialize Memory(subject_id=...).")
+        return sid
+
+    def _block_field(self, block_obj: Any, name: str) -> Any:
+        """Read a field from a block object that may be a model or dict."""
+        value = getattr(block_obj, name, None)
+        if value is None and isinstance(block_obj, dict):
+            value = block_obj.get(name)
+        return value
+
+    def _snapshot_block(self, block_obj: Any) -> CachedBlock:
+        """Copy the cacheable fields of a block into an immutable snapshot."""
+        return CachedBlock(
+            id=self._block_field(block_obj, "id"),
+            label=self._block_field(block_obj, "label"),
+            value=self._block_field(block_obj, "value"),
+            description=self._block_field(block_obj, "description"),
+            limit=self._block_field(block_obj, "limit"),
+        )
+
+    def _block_id(self, block_obj: Any) -> Optional[str]:
+        """Get id from a block object that may be a model or dict."""
+        if block_obj is None:
+            return None
+        return self._block_field(block_obj, "id")
+
+    def _format_block(self, block): 
+        """ Format a block for a prompt """ 
+        return f"<{block.label} description=\"{block.description}\">{block.value}</{block.label}>"
+
+    def _select_blocks(self, blocks: List[CachedBlock], labels: Optional[List[str]]) -> List[CachedBlock]:
+        """ The requested labels in order (all blocks when labels is None) """
+        if labels is None:
+            return blocks
+        by_label = {b.label: b for b in blocks}
+        return [by_label[label] for label in labels if label in by_label]
+
+    def _cached_blocks(self, agent_id: str, labels: Optional[List[str]], max_staleness: Optional[float]) -> Optional[List[CachedBlock]]:
+        """ The requested blocks if every one of them is cached fresh enough, else None """
+        if max_staleness is None or labels is None:
+            return None
+        blocks = []
+        for label in labels:
+            hit, block = self._block_cache.get(agent_id, label, max_staleness)
+            if not hit:
+                return None
+            if block is not None:
+                blocks.append(block)
+        return blocks
+
+    def _render_context(self, blocks: List[CachedBlock], memories: List[str]) -> str:
+        """ Blocks followed by a numbered <relevant_memories> section """
+        parts = [self._format_block(b) for b in blocks] + [format_memories(memories)]
+        return context_separator.join(p for p in parts if p)
+
+    def _search_query(
+        self,
+        query: str,
+        tags: Optional[List[str]],
+        limit: Optional[int] = None,
+        score_threshold: Optional[float] = None,
+        start_datetime: Union[datetime, str, None] = None,
+        end_datetime: Union[datetime, str, None] = None,
+    ) -> SearchQuery:
+        """ Search parameters with the default tag filter (user messages) applied """
+        tags = tags if tags is not None else ["user"]
+        return SearchQuery.build(query, tags, limit, score_threshold, start_datetime, end_datetime)
+
+    def _merge_group_status(self, run_id: str, earlier: List[str], statuses: List[str]) -> Optional[str]:
+        """Fold the statuses of a chunked submission's earlier runs into the group's status.
+
+        Returns a failed or still-pending status if the earlier runs decide it, otherwise None
+        (the group then finishes with the last run).
+        """
+        failed = [s for s in statuses if s in FAILED_STATUSES]
+        if failed:
+            return failed[0]
+        pending = [(r, s) for r, s in zip(earlier, statuses) if not is_terminal(s)]
+        if pending:
+            self._run_groups.set(run_id, [r for r, _ in pending])
+            return pending[0][1]
+        self._run_groups.pop(run_id)
+        return None
+
+    def _on_run_finished(self, run_id: str):
+        """Invalidate cached blocks of the agent a tracked run may have updated."""
+        agent_id = self._tracked_runs.get(run_id)
+        if agent_id is not None:
+            self._tracked_runs.pop(run_id)
+            self._block_cache.invalidate(agent_id)
+            # the sleeptime agent may have inserted archival passages during the run
+            self._invalidate_search(agent_id)
+            if self.local_index is not None:
+                self.local_index.drop(agent_id)
+
+    def _search_key(self, agent_id: str, q: SearchQuery) -> tuple:
+        return (agent_id, q._replace(query=normalize_text(q.query)))
+
+    def _search_version(self, agent_id: str) -> int:
+        with self._search_lock:
+            return self._search_versions.get(agent_id, 0)
+
+    def _cached_search(self, key: tuple) -> Optional[List[SearchHit]]:
+        results = self._search_cache.get(key)
+        return list(results) if results is not None else None
+
+    def _store_search(self, key: tuple, version: int, results: List[SearchHit]) -> None:
+        """ Cache results unless the agent's passages changed since `version` was read """
+        with self._search_lock:
+            if self._search_versions.get(key[0], 0) == version:
+                self._search_cache.set(key, tuple(results))
+
+    def _invalidate_search(self, agent_id: str) -> None:
+        with self._search_lock:
+            self._search_versions[agent_id] = self._search_versions.get(agent_id, 0) + 1
+            self._search_cache.pop_where(lambda key, _results: key[0] == agent_id)
+
+    def search_cache_stats(self) -> CacheStats:
+        """ Hits, misses and current size of the search() result cache """
+        return self._search_cache.stats()
+
+    def coalescing_stats(self) -> FlightStats:
+        """ Upstream lookups executed, and concurrent identical ones that shared their result """
+        return self._flights.stats()
+
+    def stats(self) -> CallStats:
+        """ Upstream calls made by this instance since creation (or reset_stats()), by endpoint and by
+        the public method that made them; calls from background threads count as call_stats.OTHER """
+        return self._calls.totals.stats()
+
+    def reset_stats(self) -> None:
+        self._calls.totals.reset()
+
+    @contextmanager
+    def track_calls(self) -> Iterator[CallCounter]:
+        """ Count the upstream calls this thread (or task) makes while the block runs, including
+        work it fans out to the executor; other threads using the instance are not counted
+
+        Example:
+            with memory.track_calls() as calls:
+                memory.get_context_bundle("user-1", query="orders")
+            assert calls.total <= 2
+        """
+        with self._calls.scope() as counter:
+            yield counter
+
+
+class Memory(_MemoryBase): 
+    """ A memory SDK for Letta
+
+    Adds a general "subject" model while keeping user-specific helpers.
+    One subject maps to one Letta agent; multiple labeled blocks (e.g. "human",
+    "summary", "preferences") can be attached to that subject.
+    """
+
+    _supports_message_buffer = True
+    _supports_agent_pool = True
+
+    def _create_client(self, base_url: Optional[str] = None, token: Optional[str] = None):
+        # imported here so a Memory over a local backend does not need letta_client installed
+        from letta_client import Letta
+
+        if self.share_client:
+            return shared_clients.get(Letta, httpx.Client, base_url, token, self.http_options)
+        return ClientRegistry.create(Letta, httpx.Client, base_url, token, self.http_options)[0]
+
+    def close(self):
+        """ Flush buffered messages, stop background run polling and release worker threads """
+        buffer, self._message_buffer = self._message_buffer, None
+        if buffer is not None:
+            buffer.close()
+        pool, self._agent_pool = self._agent_pool, None
+        if pool is not None:
+            pool.close()
+        poller, self._run_poller = self._run_poller, None
+        if poller is not None:
+            poller.close()
+        super().close()
+
+    def run_handle(self, run_id: str) -> RunHandle:
+        """Get a RunHandle for a run id; it is resolved by this instance's background poller.
+
+        The handle exposes `.result(timeout)`, `.done()`, `.add_done_callback(fn)` and
+        `.future()` (a concurrent.futures.Future), so callers can react when the sleeptime
+        run finishes instead of blocking in wait_for_run.
+        """
+        with self._executor_lock:
+            if self._run_poller is None:
+                self._run_poller = RunPoller(self._get_run_status, self._on_run_finished)
+            poller = self._run_poller
+        return poller.track(run_id)
+
+    def _run_result(self, run_id: Optional[str], return_handle: bool) -> Union[str, RunHandle, None]:
+        if run_id is None:
+            return None
+        return self.run_handle(run_id) if return_handle else run_id
+
+    def _get_message_buffer(self) -> Optional[MessageBuffer]:
+        """ The write-behind buffer, created on first use when a BufferPolicy was configured """
+        if self._message_buffer_policy is None:
+            return None
+        with self._executor_lock:
+            if self._message_buffer is None:
+                self._message_buffer = MessageBuffer(self._message_buffer_policy, self._flush_buffered)
+            return self._message_buffer
+
+    def _flush_buffered(self, key, messages: List[Dict[str, Any]]) -> str:
+        agent_id, skip_vector_storage = key
+        return self._learn_messages_sync(agent_id, messages, skip_vector_storage=skip_vector_storage)
+
+    def _submit_messages(self, agent_id: str, messages: List[Dict[str, Any]], skip_vector_storage: bool) -> Optional[str]:
+        """Learn messages now, or queue them when buffering is enabled.
+
+        Returns the run id, or None if the messages were only buffered.
+        """
+        buffer = self._get_message_buffer()
+        if buffer is None:
+            return self._learn_messages_sync(agent_id, messages, skip_vector_storage=skip_vector_storage)
+        return buffer.add((agent_id, skip_vector_storage), messages)
+
+    def flush(self, subject_id: Optional[str] = None) -> List[str]:
+        """Submit buffered messages now, for one subject (or user id) or for all of them.
+
+        Returns the run ids that were started. A no-op when message buffering is disabled.
+        """
+        buffer = self._message_buffer
+        if buffer is None:
+            return []
+        if subject_id is None:
+            return list(buffer.flush().values())
+        agent = self._get_agent_for_subject(subject_id)
+        if agent is None:
+            return []
+        run_ids = []
+        for skip_vector_storage in (True, False):
+            run_ids.extend(buffer.flush((agent.id, skip_vector_storage)).values())
+        return run_ids
+
+    def _create_sleeptime_agent(self, name: str, tags: List[str], blocks: Sequence[BlockSpec] = ()): 
+        """ Create a subconscious agent that learns over time (with `blocks` created in the same call) """ 
+        # Ensure default SDK tag is present
+        tags = list(dict.fromkeys((tags or []) + [self._default_tag]))
+        agent_state = self._upstream.agents.create(name=name, tags=tags, **self._agent_options(blocks))
+        return agent_state.id
+
+    def _get_matching_agent(self, tags: List[str], fresh: bool = False): 
+        """ Get an agent with matching tags (fresh: ask Letta, bypassing caches and in-flight lookups) """ 
+        key = ("tags",) + tuple(tags)
+        if not fresh:
+            agent_id = self._agent_cache.get(key)
+            if agent_id is not None:
+                return _AgentRef(agent_id)
+            agent_id = self._indexed_agent(tags)
+            if agent_id is not None:
+                self._agent_cache.set(key, agent_id)
+                return _AgentRef(agent_id)
+        list_agents = lambda: self._upstream.agents.list(tags=tags, match_all_tags=True)  # noqa: E731
+        agents = list_agents() if fresh else self._flights.do(key, list_agents)
+        if agents:
+            agent = self._oldest_agent(agents, tags)
+            self._agent_cache.set(key, agent.id)
+            self._index_agent(agent.id, getattr(agent, "tags", None) or tags)
+            return _AgentRef(agent.id)
+        return None
+
     def _get_agent_for_subject(self, subject_id: str):
         """Find an agent for a given subject. Tries both new and legacy tag styles."""
+        key = ("subject", subject_id)
+        agent_id = self._agent_cache.get(key)
+        if agent_id is not None:
+            return _AgentRef(agent_id)
+        return self._flights.do(key, lambda: self._lookup_agent_for_subject(subject_id))
+
+    def _lookup_agent_for_subject(self, subject_id: str, fresh: bool = False):
         # Prefer the namespaced tag
-        agent = self._get_matching_agent(tags=[f"subj:{subject_id}"])
+        agent = self._get_matching_agent(tags=[f"subj:{subject_id}"], fresh=fresh)
+        if not agent:
+            # Fallback to raw tag only
+            agent = self._get_matching_agent(tags=[subject_id], fresh=fresh)
         if agent:
-            return agent
-        # Fallback to raw tag only
-        return self._get_matching_agent(tags=[subject_id])
-
+            self._agent_cache.set(("subject", subject_id), agent.id)
+        return agent
 
     def _create_context_block(self, agent_id: str, label: str, description: str, char_limit: int = 10000, value: str = ""):
         """ Create a memory block for a subject """
-        block = self.letta_client.blocks.create(
+        version = self._block_cache.version(agent_id)
+        block = self._upstream.blocks.create(
             label=label,
             description=description,
             limit=char_limit,
             value=value,
         )
-        self.letta_client.agents.blocks.attach(agent_id=agent_id, block_id=block.id)
+        self._upstream.agents.blocks.attach(agent_id=agent_id, block_id=block.id)
+        self._block_cache.put(agent_id, label, CachedBlock(block.id, label, value, description, char_limit), version)
+        if self.subject_index is not None:
+            self.subject_index.set_block(agent_id, label, block.id)
         return block.id
 
     def _list_context_blocks(self, agent_id: str):
-        """ List all subject blocks for an agent """ 
-        return self.letta_client.agents.blocks.list(agent_id=agent_id)
+        """ List all subject blocks for an agent, refreshing the block cache """ 
+        version = self._block_cache.version(agent_id)
+        # keyed by cache version, so a list started before a local block change is not shared after it
+        blocks = self._flights.do(
+            ("blocks", agent_id, version), lambda: self._upstream.agents.blocks.list(agent_id=agent_id)
+        )
+        for b in blocks:
+            snapshot = self._snapshot_block(b)
+            if snapshot.label is not None:
+                self._block_cache.put(agent_id, snapshot.label, snapshot, version)
+        self._index_blocks(agent_id, blocks)
+        return blocks
 
     def _delete_context_block(self, agent_id: str, block_id: str):
         """ Delete a context block """ 
-        self.letta_client.agents.blocks.detach(agent_id=agent_id, block_id=block_id)
-        self.letta_client.blocks.delete(block_id=block_id)
+        self._upstream.agents.blocks.detach(agent_id=agent_id, block_id=block_id)
+        self._upstream.blocks.delete(block_id=block_id)
+        self._block_cache.invalidate(agent_id)
+        if self.subject_index is not None:
+            self.subject_index.forget_block(agent_id, block_id)
 
     def _delete_agent(self, agent_id: str):
         """ Delete an agent """ 
-        self.letta_client.agents.delete(agent_id=agent_id)
+        self._upstream.agents.delete(agent_id=agent_id)
+        self._agent_cache.pop_where(lambda _key, cached_id: cached_id == agent_id)
+        if self.subject_index is not None:
+            self.subject_index.forget_agent(agent_id)
+        self._block_cache.invalidate(agent_id)
+        if self.passage_dedupe is not None:
+            self.passage_dedupe.forget(agent_id)
+        if self.local_index is not None:
+            self.local_index.drop(agent_id)
+        self._invalidate_search(agent_id)
+
+    def subject_lock(self, subject_id: str):
+        """ Context manager holding the subject's creation lock (see subject_lock.SubjectLocks) """
+        return self.subject_locks.hold(subject_id)
 
     def _ensure_subject(self, subject_id: str) -> str:
         """Ensure a subject exists and return its agent id."""
         agent = self._get_agent_for_subject(subject_id)
+        if agent:
+            return agent.id
+        with self.subject_lock(subject_id):
+            return self._ensure_subject_locked(subject_id)
+
+    def _ensure_subject_locked(self, subject_id: str, blocks: Sequence[BlockSpec] = ()) -> str:
+        """_ensure_subject for a caller holding the subject lock: re-check, then create with `blocks`."""
+        # another thread or process may have created the agent while we waited for the lock
+        agent = self._lookup_agent_for_subject(subject_id, fresh=True)
         if agent:
             return agent.id
         # Create a new agent for this subject with both tags for compatibility
-        agent_id = self._create_sleeptime_agent(name=f"subconscious_agent_subject_{subject_id}", tags=self._subject_tags(subject_id))
+        name, tags = f"subconscious_agent_subject_{subject_id}", self._subject_tags(subject_id)
+        agent_id = self._claim_pooled_agent(name, tags, blocks) or self._create_sleeptime_agent(name=name, tags=tags, blocks=blocks)
         # Create initial passage in archival memory
-        self.letta_client.agents.passages.create(
+        self._upstream.agents.passages.create(
             agent_id=agent_id,
             text=f"Initialized memory for subject {subject_id}",
             tags=[self._default_tag],
         )
+        self._agent_cache.set(("subject", subject_id), agent_id)
+        self._agent_cache.set(("tags", subject_id), agent_id)
+        self._index_agent(agent_id, tags)
         return agent_id
 
-    def _get_effective_subject(self, subject_id: Optional[str]) -> str:
-        """Resolve the effective subject id, preferring the instance default if not provided."""
-        sid = subject_id or self.subject_id
-        if not sid:
-            raise ValueError("No subject_id provided and instance is not bound to a subject. "
-                             "Pass subject_id=... or initialize Memory(subject_id=...).")
-        return sid
+    def _provision_pool_agent(self, name: str, tags: List[str]) -> PooledAgent:
+        """ Create one agent pool member: an agent with the pool's blocks but no subject tags """
+        created_at = time.time()
+        agent_id = self._create_sleeptime_agent(name=name, tags=tags)
+        block_ids = {
+            spec.label: self._create_context_block(agent_id, spec.label, spec.description, spec.char_limit, spec.value)
+            for spec in self._agent_pool_policy.blocks
+        }
+        return PooledAgent(agent_id, created_at, block_ids)
+
+    def _list_pool_agents(self, tag: str) -> List[Tuple[str, str]]:
+        return [(a.id, a.name) for a in self._upstream.agents.list(tags=[tag], match_all_tags=True)]
+
+    def _claim_pooled_agent(self, name: str, tags: List[str], blocks: List[BlockSpec]) -> Optional[str]:
+        """ Re-tag a ready agent from the pool for a new subject; None if there is none to claim """
+        pool = self._agent_pool
+        member = pool.claim(spec.label for spec in blocks) if pool is not None else None
+        if member is None:
+            return None
+        agent_id = member.agent_id
+        try:
+            self._upstream.agents.modify(agent_id=agent_id, name=name, tags=list(dict.fromkeys(tags + [self._default_tag])))
+            pooled = {spec.label: spec for spec in pool.policy.blocks}
+            for spec in blocks:
+                if spec == pooled[spec.label]:
+                    continue
+                version = self._block_cache.version(agent_id)
+                block_id = member.block_ids[spec.label]
+                self._upstream.blocks.modify(
+                    block_id=block_id, value=spec.value, description=spec.description, limit=spec.char_limit,
+                )
+                self._block_cache.put(
+                    agent_id, spec.label, CachedBlock(block_id, spec.label, spec.value, spec.description, spec.char_limit), version,
+                )
+        except Exception as e:
+            logger.warning("Failed to claim pooled agent %s, creating a new one: %s", agent_id, e)
+            try:
+                self._delete_agent(agent_id)
+            except Exception:
+                pass
+            return None
+        return agent_id
+
+    def _find_block_by_label(self, agent_id: str, label: str, max_staleness: Optional[float] = None):
+        """Find a block object attached to an agent by label, or return None.
 
-    def _find_block_by_label(self, agent_id: str, label: str):
-        """Find a block object attached to an agent by label, or return None."""
+        With max_staleness (seconds), a cached snapshot at most that old is returned without
+        contacting Letta.
+        """
+        if max_staleness is not None:
+            hit, cached = self._block_cache.get(agent_id, label, max_staleness)
+            if hit:
+                return cached
+        version = self._block_cache.version(agent_id)
         blocks = self._list_context_blocks(agent_id)
         for b in blocks:
-            b_label = getattr(b, "label", None)
-            if b_label is None and isinstance(b, dict):
-                b_label = b.get("label")
-            if b_label == label:
+            if self._block_field(b, "label") == label:
                 return b
+        # remember that the label is absent so stale-tolerant reads can skip the list too
+        self._block_cache.put(agent_id, label, None, version)
         return None
 
-    def _block_id(self, block_obj: Any) -> Optional[str]:
-        """Get id from a block object that may be a model or dict."""
-        if block_obj is None:
-            return None
-        bid = getattr(block_obj, "id", None)
-        if bid is None and isinstance(block_obj, dict):
-            bid = block_obj.get("id")
-        return bid
+    def _retrieve_block(self, agent_id: str, label: str, max_staleness: Optional[float] = None):
+        """Retrieve a single block by label, optionally served from the block cache."""
+        if max_staleness is not None:
+            hit, cached = self._block_cache.get(agent_id, label, max_staleness)
+            if hit and cached is not None:
+                return cached
+        version = self._block_cache.version(agent_id)
+        block = self._flights.do(
+            ("block", agent_id, label, version), lambda: self._upstream.agents.blocks.retrieve(agent_id, label)
+        )
+        self._block_cache.put(agent_id, label, self._snapshot_block(block), version)
+        return block
 
     def _learn_messages_sync(
         self,
@@ -165,70 +880,169 @@ class Memory:
             skip_vector_storage: If False, also store messages in archival memory
 
         Returns:
-            The run ID for tracking processing
+            The run ID for tracking processing. Long histories are sent as one run per
+            formatted chunk; the last run id is returned and stands for the whole batch.
         """
-        formatted_messages = format_messages([MessageCreate(**msg) for msg in messages])
-        letta_run = self.letta_client.agents.messages.create_async(
-            agent_id=agent_id,
-            messages=formatted_messages
-        )
+        chunks = format_messages([MessageCreate(**msg) for msg in messages])
+        run_id = self._submit_chunks(agent_id, chunks)
 
-        # insert into archival memory sequentially
+        # insert into archival memory concurrently; failures are logged, not raised
         if not skip_vector_storage:
-            for message in messages:
-                self.letta_client.agents.passages.create(
-                    agent_id=agent_id,
-                    text=message["content"],
-                    tags=[message["role"], self._default_tag],
-                )
+            results = self._write_passages(agent_id, self._message_passages(messages))
+            self._log_passage_failures(agent_id, results)
 
-        return letta_run.id
+        return run_id
 
-    def _format_block(self, block): 
-        """ Format a block for a prompt """ 
-        return f"<{block.label} description=\"{block.description}\">{block.value}</{block.label}>"
+    def _submit_chunks(self, agent_id: str, chunks: Iterable[Dict[str, str]]) -> Optional[str]:
+        """Start one sleeptime run per chunk, consuming `chunks` lazily.
+
+        Returns the run id standing for the whole group, or None if there were no chunks.
+        """
+        run_ids = [
+            self._upstream.agents.messages.create_async(agent_id=agent_id, messages=[chunk]).id
+            for chunk in chunks
+        ]
+        return self._register_chunked_run(agent_id, run_ids) if run_ids else None
+
+    def _write_passages(self, agent_id: str, passages: List[Dict[str, Any]]) -> List[PassageWriteResult]:
+        """Write passages to an agent's archival memory through the bounded thread pool.
+
+        With passage_dedupe set, passages already stored for the agent are skipped and reported
+        with `duplicate=True`.
+        """
+        create = functools.partial(self._upstream.agents.passages.create, agent_id)
+        executor = self._get_executor() if self.passage_write_concurrency > 1 else None
+        if self.passage_dedupe is None:
+            results = write_passages(create, passages, executor=executor)
+        else:
+            if self.passage_dedupe.needs_seed(agent_id):
+                self.passage_dedupe.seed(agent_id, ((p.text, getattr(p, "tags", None)) for p in self._iter_passages(agent_id)))
+            claimed, fresh = self._claim_passages(agent_id, passages)
+            results = self._merge_claimed(agent_id, passages, claimed, write_passages(create, fresh, executor=executor))
+        self._index_written(agent_id, passages, results)
+        return results
+
+    def _iter_passages(self, agent_id: str, page_size: int = 1000) -> Iterator[Any]:
+        """Page through every passage already in an agent's archival memory."""
+        after = None
+        while True:
+            page = self._upstream.agents.passages.list(agent_id=agent_id, after=after, limit=page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            after = page[-1].id
+
+    def _search_local(self, agent_id: str, q: SearchQuery) -> Optional[List[SearchHit]]:
+        """Answer a search from the local index, loading the agent's passages on first use.
+
+        Searches with date bounds always go to the server; the local index has no timestamps.
+        """
+        if self.local_index is None or q.start_datetime or q.end_datetime:
+            return None
+        if not self.local_index.is_loaded(agent_id):
+            passages = self._iter_passages(agent_id)
+            self.local_index.load(agent_id, ((p.text, getattr(p, "tags", None) or []) for p in passages))
+        return self._local_hits(agent_id, q)
 
     def _get_run_status(self, run_id: str):
-        """ Get the status of a run """ 
+        """ Get the status of a run (of every chunk, for a chunked submission) """ 
+        earlier = self._run_groups.get(run_id)
+        if earlier:
+            status = self._merge_group_status(run_id, earlier, [self._retrieve_run_status(r) for r in earlier])
+            if status is not None:
+                return status
+        return self._retrieve_run_status(run_id)
 
-        run = self.letta_client.runs.retrieve(run_id)
+    def _retrieve_run_status(self, run_id: str):
+        run = self._upstream.runs.retrieve(run_id)
         if not run:
             raise ValueError(f"Run {run_id} not found")
         return run.status
 
-    def wait_for_run(self, run_id: str, timeout: int = 300):
+    def wait_for_run(self, run_id: Union[str, RunHandle], timeout: int = 300):
         """Wait for a run to complete.
 
         Args:
-            run_id: The run ID to wait for
+            run_id: The run ID (or RunHandle) to wait for
             timeout: Maximum time to wait in seconds (default: 300)
 
         Raises:
             TimeoutError: If the run doesn't complete within the timeout period
+            RuntimeError: If the run finished without completing (failed, cancelled, expired)
+        """
+        run_id = getattr(run_id, "run_id", run_id)
+        status = self.wait_for_runs([run_id], timeout=timeout)[run_id]
+        if not is_terminal(status):
+            raise TimeoutError(f"Run {run_id} did not complete within {timeout} seconds")
+        if status in FAILED_STATUSES:
+            raise RuntimeError(f"Run {run_id} finished with status {status!r}")
+
+    def wait_for_runs(
+        self,
+        run_ids: List[Union[str, RunHandle]],
+        timeout: Optional[float] = 300,
+        return_when: str = ALL,
+    ) -> Dict[str, str]:
+        """Wait for several runs from a single polling loop.
+
+        Pending runs are polled together with adaptive backoff: fast polls at first, slowing
+        to every ~2 seconds for long runs, with jitter.
+
+        Args:
+            run_ids: The run IDs to wait for
+            timeout: Maximum time to wait in seconds (None waits indefinitely)
+            return_when: runs.ALL (every run finished), runs.FIRST (any run finished) or
+                runs.ANY_FAILED (any run failed/cancelled, otherwise all finished)
+
+        Returns:
+            Mapping of run id to its last observed status. Runs still pending when the timeout
+            expires keep their non-terminal status (e.g. "running"); nothing is raised.
         """
-        start_time = time.time()
-        while self._get_run_status(run_id) != "completed":
-            if time.time() - start_time > timeout:
-                raise TimeoutError(f"Run {run_id} did not complete within {timeout} seconds")
-            time.sleep(1)
+        check_return_when(return_when)
+        statuses: Dict[str, str] = {getattr(run_id, "run_id", run_id): "created" for run_id in run_ids}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        backoff = Backoff()
+        while True:
+            pending = [run_id for run_id, status in statuses.items() if not is_terminal(status)]
+            if len(pending) > 1:
+                polled = list(self._get_executor().map(self._get_run_status, pending))
+            else:
+                polled = [self._get_run_status(run_id) for run_id in pending]
+            for run_id, status in zip(pending, polled):
+                statuses[run_id] = status
+                if is_terminal(status):
+                    self._on_run_finished(run_id)
+            if is_satisfied(statuses, return_when):
+                return statuses
+            delay = next(backoff)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return statuses
+                delay = min(delay, remaining)
+            time.sleep(delay)
 
     # ===== General Subject API =====
 
-    def initialize_subject(self, subject_id: str, reset: bool = False) -> str:
-        """Initialize a subject (agent). If it exists and reset is False, raise; otherwise recreate.
+    def initialize_subject(self, subject_id: str, reset: bool = False, blocks: Optional[Sequence[BlockSpec]] = None) -> str:
+        """Initialize a subject (agent). If it exists and reset is False, raise SubjectExistsError; otherwise recreate.
 
+        `blocks` (agent_pool.BlockSpec) are created together with the agent.
         Returns the agent id for the subject.
         """
-        agent = self._get_agent_for_subject(subject_id)
-        if agent:
-            if reset:
-                self._delete_agent(agent.id)
-            else:
-                raise ValueError(
-                    f"Agent {agent.id} already exists for subject {subject_id}. "
-                    f"Cannot re-initialize unless reset=True."
-                )
-        return self._ensure_subject(subject_id)
+        self._invalidate_subject(subject_id)
+        with self.subject_lock(subject_id):
+            agent = self._lookup_agent_for_subject(subject_id, fresh=True)
+            if agent:
+                if reset:
+                    self._delete_agent(agent.id)
+                else:
+                    raise SubjectExistsError(
+                        f"Agent {agent.id} already exists for subject {subject_id}. "
+                        f"Cannot re-initialize unless reset=True.",
+                        agent.id,
+                    )
+            return self._ensure_subject_locked(subject_id, blocks or ())
 
     def list_blocks(self, subject_id: Optional[str] = None):
         """List all blocks for a subject. If instance is bound, subject_id may be omitted."""
@@ -254,13 +1068,16 @@ class Memory:
         sid = self._get_effective_subject(subject_id)
         agent_id = self._ensure_subject(sid)
 
-        existing = self._find_block_by_label(agent_id, label)
-        if existing and reset:
-            self._delete_context_block(agent_id, self._block_id(existing))
-            existing = None
+        existing_id = self._indexed_block_id(agent_id, label)
+        if existing_id is None:
+            existing = self._find_block_by_label(agent_id, label)
+            existing_id = self._block_id(existing) if existing else None
+        if existing_id and reset:
+            self._delete_context_block(agent_id, existing_id)
+            existing_id = None
 
-        if existing:
-            return self._block_id(existing)
+        if existing_id:
+            return existing_id
 
         return self._create_context_block(
             agent_id=agent_id,
@@ -275,21 +1092,23 @@ class Memory:
         label: str,
         prompt_formatted: bool = False,
         subject_id: Optional[str] = None,
+        max_staleness: Optional[float] = None,
     ) -> Optional[str]:
-        """Retrieve a labeled block from a subject. Returns None if missing."""
+        """Retrieve a labeled block from a subject. Returns None if missing.
+
+        Pass max_staleness (seconds) to accept a cached copy up to that old; a cache hit
+        makes no upstream calls once the subject lookup is cached too.
+        """
         sid = self._get_effective_subject(subject_id)
         agent = self._get_agent_for_subject(sid)
         if not agent:
             return None
-        block = self._find_block_by_label(agent.id, label)
+        block = self._find_block_by_label(agent.id, label, max_staleness=max_staleness)
         if not block:
             return None
         if prompt_formatted:
             return self._format_block(block)
-        value = getattr(block, "value", None)
-        if value is None and isinstance(block, dict):
-            value = block.get("value")
-        return value
+        return self._block_field(block, "value")
 
     def delete_block(self, label: str, subject_id: Optional[str] = None):
         """Delete a labeled block from a subject if it exists."""
@@ -297,28 +1116,37 @@ class Memory:
         agent = self._get_agent_for_subject(sid)
         if not agent:
             return
-        block = self._find_block_by_label(agent.id, label)
-        if block:
-            self._delete_context_block(agent.id, self._block_id(block))
+        block_id = self._indexed_block_id(agent.id, label)
+        if block_id is None:
+            block = self._find_block_by_label(agent.id, label)
+            block_id = self._block_id(block) if block else None
+        if block_id:
+            self._delete_context_block(agent.id, block_id)
 
     def add_messages_for_subject(
         self,
         subject_id: str,
         messages: List[Dict[str, Any]],
         skip_vector_storage: bool = True,
-    ) -> str:
-        """Add messages to a specific subject (generalized API)."""
+        return_handle: bool = False,
+    ) -> Union[str, RunHandle, None]:
+        """Add messages to a specific subject (generalized API).
+
+        Returns the run id, or a RunHandle when return_handle=True. With message buffering
+        enabled, returns None when the messages were only queued.
+        """
         agent = self._get_agent_for_subject(subject_id)
         if agent:
             agent_id = agent.id
         else:
             agent_id = self._ensure_subject(subject_id)
-        return self._learn_messages_sync(agent_id, messages, skip_vector_storage=skip_vector_storage)
+        run_id = self._submit_messages(agent_id, messages, skip_vector_storage=skip_vector_storage)
+        return self._run_result(run_id, return_handle)
 
-    def add_messages_here(self, messages: List[Dict[str, Any]], skip_vector_storage: bool = True) -> str:
+    def add_messages_here(self, messages: List[Dict[str, Any]], skip_vector_storage: bool = True, return_handle: bool = False) -> Union[str, RunHandle, None]:
         """Add messages using the instance's bound subject_id."""
         sid = self._get_effective_subject(None)
-        return self.add_messages_for_subject(sid, messages, skip_vector_storage=skip_vector_storage)
+        return self.add_messages_for_subject(sid, messages, skip_vector_storage=skip_vector_storage, return_handle=return_handle)
 
     def initialize_user_memory(self,
         user_id: str,
@@ -344,76 +1172,161 @@ class Memory:
             The Letta agent ID for this user
         """
 
-        # check if agent already exists
+        with self.subject_lock(user_id):
+            # check if agent already exists
+            agent = self._get_matching_agent(tags=[user_id], fresh=True)
+            if agent:
+                if reset:
+                    self._delete_agent(agent.id)
+                else:
+                    raise SubjectExistsError(f"Agent {agent.id} already exists for user {user_id}. Cannot re-initialize memory unless reset=True.", agent.id)
+            return self._create_user_agent(user_id, self._user_blocks(
+                user_context_block_prompt, user_context_block_char_limit, user_context_block_value,
+                summary_block_prompt, summary_block_char_limit,
+            ))
+
+    def _ensure_user(self, user_id: str) -> str:
+        """Ensure a user agent (with the default human and summary blocks) exists and return its id."""
         agent = self._get_matching_agent(tags=[user_id])
         if agent:
-            if reset:
-                self._delete_agent(agent.id)
-            else:
-                raise ValueError(f"Agent {agent.id} already exists for user {user_id}. Cannot re-initialize memory unless reset=True.")
+            return agent.id
+        with self.subject_lock(user_id):
+            # another thread or process may have created the agent while we waited for the lock
+            agent = self._get_matching_agent(tags=[user_id], fresh=True)
+            if agent:
+                return agent.id
+            return self._create_user_agent(user_id, self._user_blocks())
 
-        # create the Letta agent
-        agent_id = self._create_sleeptime_agent(name=f"subconscious_agent_user_{user_id}", tags=[user_id])
+    def _create_user_agent(self, user_id: str, blocks: List[BlockSpec]) -> str:
+        """Create a user's agent with its blocks; the caller holds the subject lock."""
+        name = f"subconscious_agent_user_{user_id}"
+        # claim a pre-created agent if an agent pool has one ready
+        agent_id = self._claim_pooled_agent(name, [user_id], blocks)
+        if agent_id is None:
+            # create the Letta agent
+            agent_id = self._create_sleeptime_agent(name=name, tags=[user_id])
 
-        # create memory blocks
-        self._create_context_block(agent_id=agent_id, label="human", description=user_context_block_prompt, char_limit=user_context_block_char_limit, value=user_context_block_value)
-        self._create_context_block(agent_id=agent_id, label="summary", description=summary_block_prompt, char_limit=summary_block_char_limit, value="")
+            # create memory blocks
+            for spec in blocks:
+                self._create_context_block(agent_id=agent_id, label=spec.label, description=spec.description, char_limit=spec.char_limit, value=spec.value)
 
         # create initial passage in archival memory
-        self.letta_client.agents.passages.create(
+        self._upstream.agents.passages.create(
             agent_id=agent_id,
             text=f"Initialized memory for user {user_id}",
             tags=[self._default_tag],
         )
+        self._agent_cache.set(("tags", user_id), agent_id)
+        self._index_agent(agent_id, [user_id])
         return agent_id
-            
-    def add_messages(self, user_or_messages, messages: Optional[List[Dict[str, Any]]] = None, skip_vector_storage: bool = True): 
+
+    def add_messages(self, user_or_messages, messages: Optional[List[Dict[str, Any]]] = None, skip_vector_storage: bool = True, return_handle: bool = False): 
         """Add messages.
 
         Two modes:
         - Legacy user mode: add_messages(user_id: str, messages: List[...], skip_vector_storage=True)
         - Subject-bound mode: add_messages(messages: List[...], skip_vector_storage=True) when this instance
           was constructed with a subject_id.
+
+        Returns the run id, or a RunHandle when return_handle=True (None if the messages
+        were only queued by the message buffer).
         """
         # If first arg is a string, treat as legacy user mode
         if isinstance(user_or_messages, str):
             user_id = user_or_messages
             if messages is None:
                 raise ValueError("messages must be provided when calling add_messages(user_id, messages, ...)" )
-            agent = self._get_matching_agent(tags=[user_id])
-            if agent:
-                agent_id = agent.id
-            else:
-                agent_id = self.initialize_user_memory(user_id)
-            return self._learn_messages_sync(agent_id, messages, skip_vector_storage=skip_vector_storage)
+            agent_id = self._ensure_user(user_id)
+            run_id = self._submit_messages(agent_id, messages, skip_vector_storage=skip_vector_storage)
+            return self._run_result(run_id, return_handle)
 
         # Otherwise, treat first arg as the messages list and use the bound subject
         inferred_messages = user_or_messages
         if not isinstance(inferred_messages, list):
             raise ValueError("First argument must be a user_id (str) or a messages list (List[Dict]).")
         sid = self._get_effective_subject(None)
-        return self.add_messages_for_subject(sid, inferred_messages, skip_vector_storage=skip_vector_storage)
+        return self.add_messages_for_subject(sid, inferred_messages, skip_vector_storage=skip_vector_storage, return_handle=return_handle)
+
+    def add_passages(
+        self,
+        passages: List[Dict[str, Any]],
+        subject_id: Optional[str] = None,
+    ) -> List[PassageWriteResult]:
+        """Store passages directly in a subject's archival memory.
+
+        Each passage is a dict with "text" and optional "tags". Passages are written concurrently
+        (see passage_write_concurrency); results come back in input order, and a failed passage
+        carries its exception in `error` instead of aborting the rest of the batch. With
+        passage_dedupe set, passages already stored are skipped and marked `duplicate`.
+        """
+        sid = self._get_effective_subject(subject_id)
+        agent_id = self._ensure_subject(sid)
+        return self._write_passages(agent_id, passages)
+
+    def add_files(self, files: List[Dict[str, Any]], subject_id: Optional[str] = None) -> List[Optional[str]]:
+        """Learn about files.
+
+        Each file is a dict with "file_path" and optional "label" (defaults to the file name) and
+        "description". Files are read incrementally and every `prompt_formatter.file_char_limit`
+        characters are sent as their own <file_part> run, so memory use stays bounded for
+        arbitrarily large files.
+
+        Returns one run id per file (standing for all of its parts, see wait_for_run), or None
+        for an empty file.
+        """
+        sid = self._get_effective_subject(subject_id)
+        agent_id = self._ensure_subject(sid)
+        return [self._submit_chunks(agent_id, self._file_parts(file)) for file in files]
 
-    def add_files(self, files: List[Dict[str, Any]]):
-        """ Learn about files """ 
-        raise NotImplementedError
+    def sync_directory(
+        self,
+        path: str,
+        subject_id: Optional[str] = None,
+        description: str = "",
+        pattern: str = "*",
+        manifest_path: Optional[str] = None,
+        hash_workers: Optional[int] = None,
+    ) -> SyncResult:
+        """Incrementally learn a directory of files into a subject.
 
-    def get_user_memory(self, user_id: str, prompt_formatted: bool = False):
+        A manifest of `schemas.File` entries (default: `.ai_memory_sync.<subject>.json` inside
+        `path`) remembers what was ingested. Files whose size and mtime match the manifest are
+        skipped without being read; the rest are hashed in a thread pool (`hash_workers`) and
+        only files whose sha256 changed are streamed through `add_files`. Hidden files and
+        directories are ignored. Files deleted from disk are dropped from the manifest, but
+        what the subject already learned from them is kept.
+        """
+        sid = self._get_effective_subject(subject_id)
+        agent_id = self._ensure_subject(sid)
+        manifest_path, manifest, plan = self._plan_directory_sync(
+            path, sid, agent_id, description, pattern, manifest_path, hash_workers
+        )
+        run_ids: Dict[str, Optional[str]] = {}
+        try:
+            for entry in plan.changed:
+                run_ids[entry.label] = self._submit_chunks(agent_id, self._file_parts(entry.model_dump()))
+                manifest[entry.label] = mark_processed(entry)
+        finally:
+            # record progress even if an upload fails midway, so a rerun resumes where this one stopped
+            save_manifest(manifest_path, manifest)
+        return self._sync_result(plan, run_ids)
+
+    def get_user_memory(self, user_id: str, prompt_formatted: bool = False, max_staleness: Optional[float] = None):
         """ Get the memory for a specific user """ 
         agent = self._get_matching_agent(tags=[user_id])
         if agent:
-            block = self.letta_client.agents.blocks.retrieve(agent.id, "human")
+            block = self._retrieve_block(agent.id, "human", max_staleness=max_staleness)
             if prompt_formatted: 
                 return self._format_block(block)
             return block.value
         return None
 
 
-    def get_summary(self, user_id: str, prompt_formatted: bool = False):
+    def get_summary(self, user_id: str, prompt_formatted: bool = False, max_staleness: Optional[float] = None):
         """ Get the summary for a specific user """ 
         agent = self._get_matching_agent(tags=[user_id])
         if agent:
-            block = self.letta_client.agents.blocks.retrieve(agent.id, "summary")
+            block = self._retrieve_block(agent.id, "summary", max_staleness=max_staleness)
             if prompt_formatted: 
                 return f"<conversation_summary>{block.value}</conversation_summary>"
             return block.value
@@ -426,22 +1339,155 @@ class Memory:
             return agent.id
         return None
 
+    def rebuild_subject_index(self, page_size: int = 100) -> int:
+        """ Repopulate the subject index from a paginated scan of this SDK's agents; returns agents indexed """
+        if self.subject_index is None:
+            raise ValueError("Memory was created without a subject_index")
+        agents, after = [], None
+        while True:
+            page = self._upstream.agents.list(tags=[self._default_tag], match_all_tags=True, after=after, limit=page_size)
+            agents.extend(page)
+            if len(page) < page_size:
+                break
+            after = page[-1].id
+        self.subject_index.rebuild(self._index_entries(agents))
+        self._agent_cache.clear()
+        return len(agents)
+
+    def _list_subject_agents(self, subject_id: str) -> List[Any]:
+        """ Every agent carrying the subject's namespaced or raw tag, oldest first """
+        agents: Dict[str, Any] = {}
+        for tags in ([f"subj:{subject_id}"], [subject_id]):
+            for agent in self._upstream.agents.list(tags=tags, match_all_tags=True):
+                agents.setdefault(agent.id, agent)
+        return self._rank_agents(list(agents.values()))
+
+    def reconcile_subject(self, subject_id: str, merge: bool = True, dry_run: bool = False) -> ReconcileResult:
+        """ Collapse duplicate agents of a subject (e.g. left by a creation race) into the oldest one
+
+        With merge, archival passages the oldest agent lacks are copied to it, and so are blocks
+        whose label it lacks; blocks it already has are kept as they are. The duplicates are then
+        deleted. With dry_run, nothing is changed and the result reports what would be done.
+        """
+        with self.subject_lock(subject_id):
+            agents = self._list_subject_agents(subject_id)
+            if not agents:
+                return ReconcileResult(subject_id, None, [], 0, 0)
+            keep, duplicates = agents[0], agents[1:]
+            passages, blocks = [], []
+            if merge and duplicates:
+                passages = self._missing_passages(
+                    self._iter_passages(keep.id), (p for d in duplicates for p in self._iter_passages(d.id)),
+                )
+                blocks = self._missing_blocks(
+                    self._upstream.agents.blocks.list(agent_id=keep.id),
+                    (b for d in duplicates for b in self._upstream.agents.blocks.list(agent_id=d.id)),
+                )
+            deleted = [d.id for d in duplicates]
+            if dry_run:
+                return ReconcileResult(subject_id, keep.id, deleted, len(passages), len(blocks))
+            copied = 0
+            if passages:
+                results = self._write_passages(keep.id, passages)
+                self._log_passage_failures(keep.id, results)
+                copied = sum(1 for r in results if r.ok and not r.duplicate)
+            for block in blocks:
+                self._create_context_block(keep.id, block.label, block.description or "", block.limit or 10000, block.value or "")
+            for agent_id in deleted:
+                self._delete_agent(agent_id)
+            self._invalidate_subject(subject_id)
+            self._index_agent(keep.id, list(getattr(keep, "tags", None) or self._subject_tags(subject_id)))
+            return ReconcileResult(subject_id, keep.id, deleted, copied, len(blocks))
+
     def delete_user(self, user_id: str):
         """ Delete a user """ 
+        self._invalidate_subject(user_id)
         agent = self._get_matching_agent(tags=[user_id])
         if agent:
             # deleting the agent also deleted associated messages/blocks
-            self.letta_client.agents.delete(agent.id)
+            self._delete_agent(agent.id)
             print(f"Deleted agent {agent.id} for user {user_id}")
 
-    def search(self, user_id: str, query: str, tags: Optional[List[str]] = None):
+    def search(
+        self,
+        user_id: str,
+        query: str,
+        tags: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+        score_threshold: Optional[float] = None,
+        start_datetime: Union[datetime, str, None] = None,
+        end_datetime: Union[datetime, str, None] = None,
+    ) -> Optional[List[SearchHit]]:
         """Search for stored user messages via semantic search.
 
         Default filters to user messages (tags=["user"]).
         Pass a custom list of tags to adjust filtering (e.g., ["assistant"], or [] for all).
+        `limit` and the date bounds (datetime or ISO 8601 string) are applied by the server.
+        Results are SearchHit strings carrying `.score`, `.timestamp` and `.tags`. The server does
+        not score results, so `score_threshold` only filters hits that have a score (local index).
+
+        With a local_index configured, matches are served from it and the server is only
+        searched when the index has none. Results are cached per (subject, query, options) until
+        the subject gets new passages (see search_cache_size / search_cache_ttl).
         """
         agent = self._get_matching_agent(tags=[user_id])
         if agent:
-            search_tags = tags if tags is not None else ["user"]
-            response = self.letta_client.agents.passages.search(agent_id=agent.id, query=query, tags=search_tags)
-            return [result.content for result in response.results]
+            q = self._search_query(query, tags, limit, score_threshold, start_datetime, end_datetime)
+            return self._search_agent(agent.id, q)
+
+    def _search_agent(self, agent_id: str, q: SearchQuery) -> List[SearchHit]:
+        """Search one agent's archival memory: result cache, then local index, then the server."""
+        key = self._search_key(agent_id, q)
+        cached = self._cached_search(key)
+        if cached is not None:
+            return cached
+        version = self._search_version(agent_id)
+        return self._flights.do(("search", key, version), lambda: self._run_search(agent_id, q, key, version))
+
+    def _run_search(self, agent_id: str, q: SearchQuery, key: Hashable, version: int) -> List[SearchHit]:
+        results = self._search_local(agent_id, q)
+        if results is None:
+            response = self._upstream.agents.passages.search(agent_id=agent_id, **q.server_kwargs())
+            results = self._server_hits(response, q)
+        self._store_search(key, version, results)
+        return results
+
+    def get_context_bundle(
+        self,
+        subject_id: Optional[str] = None,
+        labels: Optional[List[str]] = None,
+        query: Optional[str] = None,
+        k: int = 3,
+        tags: Optional[List[str]] = None,
+        max_staleness: Optional[float] = None,
+    ) -> ContextBundle:
+        """Fetch a subject's blocks and relevant memories for a prompt in as few calls as possible.
+
+        The agent is resolved once and every requested block comes from a single block list (or
+        from the block cache, with max_staleness). When `query` is given, the top `k` archival
+        matches (tags as in search()) are fetched concurrently with the blocks.
+
+        Args:
+            subject_id: Subject or legacy user id (defaults to the bound subject)
+            labels: Block labels to include, in prompt order (None: every block)
+            query: Optional text to search archival memory for
+            k: Number of memories to include
+            tags: Tag filter for the search (defaults to ["user"])
+            max_staleness: Accept cached blocks up to this many seconds old
+
+        Returns:
+            A ContextBundle with the blocks, memories and the rendered prompt text
+        """
+        sid = self._get_effective_subject(subject_id)
+        agent = self._get_agent_for_subject(sid)
+        if not agent:
+            return ContextBundle(sid, None, [], [], "")
+        search = None
+        if query:
+            search = self._get_executor().submit(self._search_agent, agent.id, self._search_query(query, tags, k))
+        blocks = self._cached_blocks(agent.id, labels, max_staleness)
+        if blocks is None:
+            listed = [self._snapshot_block(b) for b in self._list_context_blocks(agent.id)]
+            blocks = self._select_blocks(listed, labels)
+        memories = search.result() if search is not None else []
+        return ContextBundle(sid, agent.id, blocks, memories, self._render_context(blocks, memories))
@@ -7,14 +7,26 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-from ai_memory_sdk import Memory
-from typing import List, Dict, Optional, Any
+from agent_pool import USER_BLOCKS, BlockSpec
+from ai_memory_sdk import Memory, SubjectExistsError
+from backend import MemoryBackend
+from clients import ClientOptions
+from prompt_formatter import AssembledContext, ContextSection, assemble_context
+from subject_lock import SubjectLocks
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, List, Dict, Optional, Any
 import os
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# blocks initialize_with_blocks adds when the caller does not define them
+DEFAULT_BLOCKS = (
+    BlockSpec("human", "Information about the human user."),
+    BlockSpec("summary", "A rolling summary of the conversation."),
+)
+
 
 class MemoryService:
     """
@@ -29,7 +41,14 @@ class MemoryService:
         base_url: Optional[str] = None,
         subject_id: Optional[str] = None,
         model: str = "openai/gpt-4.1",
-        embedding: str = "openai/text-embedding-3-small"
+        embedding: str = "openai/text-embedding-3-small",
+        context_timeout: Optional[float] = 5.0,
+        context_workers: int = 32,
+        context_tokenizer: Callable[[str], int] = len,
+        context_priorities: Optional[Dict[str, int]] = None,
+        http_options: Optional[ClientOptions] = None,
+        lock_dir: Optional[str] = None,
+        backend: Optional[MemoryBackend] = None
     ):
         """
         Initialize Memory Service
@@ -40,10 +59,22 @@ class MemoryService:
             subject_id: Optional subject binding for single-user mode
             model: LLM model to use (default: openai/gpt-4.1)
             embedding: Embedding model to use (default: openai/text-embedding-3-small)
+            context_timeout: Default deadline in seconds for get_full_context (None: wait for every part)
+            context_workers: Threads shared by all get_full_context requests for their concurrent fetches
+            context_tokenizer: Measures context budgets (default: characters); e.g. a tokenizer's length function
+            context_priorities: Priority of user_context, summary and relevant_memories under a tight budget
+            http_options: Connection pool settings of the Letta client, shared with other Memory instances
+            lock_dir: Directory for per-user lock files, so that workers sharing it never create two agents
+                for one user (default: locks only cover this process)
+            backend: Serve from this client instead of a Letta server, e.g. local_backend.LocalLetta
         """
         self.subject_id = subject_id
         self.model = model
         self.embedding = embedding
+        self.context_timeout = context_timeout
+        self.context_tokenizer = context_tokenizer
+        self.context_priorities = {"user_context": 2, "relevant_memories": 1, "summary": 0, **(context_priorities or {})}
+        self._context_executor = ThreadPoolExecutor(max_workers=context_workers, thread_name_prefix="memory-context")
         
         # Store for later use when creating agents
         self.api_key = api_key or os.getenv("LETTA_API_KEY")
@@ -52,7 +83,12 @@ class MemoryService:
         self.memory = Memory(
             api_key=self.api_key,
             base_url=self.base_url,
-            subject_id=subject_id
+            subject_id=subject_id,
+            http_options=http_options,
+            subject_locks=SubjectLocks(lock_dir) if lock_dir else None,
+            backend=backend,
+            model=model,
+            embedding=embedding
         )
         
         mode = "subject-scoped" if subject_id else "multi-user"
@@ -65,7 +101,7 @@ class MemoryService:
         if self.subject_id:
             return self.subject_id
         raise ValueError("user_id is required in multi-user mode")
-    
+
     def initialize_user(
         self, 
         user_id: Optional[str] = None,
@@ -77,48 +113,28 @@ class MemoryService:
         """
         try:
             effective_user_id = self._get_user_id(user_id)
+
+            # existing users are answered from the caches; only a miss (or reset) takes the lock
+            agent_id = None if reset else self.memory.get_memory_agent_id(effective_user_id)
+            if agent_id:
+                return {
+                    "success": True,
+                    "message": f"Memory already exists for {effective_user_id}",
+                    "agent_id": agent_id
+                }
             
-            # Check if agent already exists
-            agent = self.memory._get_matching_agent(tags=[effective_user_id])
-            
-            if agent:
-                if reset:
-                    self.memory._delete_agent(agent.id)
-                    agent = None
-                else:
-                    return {
-                        "success": True,
-                        "message": f"Memory already exists for {effective_user_id}",
-                        "agent_id": agent.id
-                    }
-            
-            # Create agent with embedding
-            agent_id = self.memory.letta_client.agents.create(
-                name=f"memory_agent_{effective_user_id}",
-                model=self.model,
-                embedding=self.embedding,
-                agent_type="sleeptime_agent",
-                tags=self.memory._subject_tags(effective_user_id),
-                memory_blocks=[
-                    {
-                        "label": "human",
-                        "description": "Details about the human user you are speaking to.",
-                        "value": user_info
-                    },
-                    {
-                        "label": "summary",
-                        "description": "A short (1-2 sentences) running summary of the conversation.",
-                        "value": ""
-                    }
-                ]
-            ).id
-            
-            # Create initial passage
-            self.memory.letta_client.agents.passages.create(
-                agent_id=agent_id,
-                text=f"Initialized memory for user {effective_user_id}",
-                tags=[self.memory._default_tag]
-            )
+            # initialize_subject serializes check-then-create per user, so concurrent requests cannot create two agents
+            human, summary = USER_BLOCKS
+            try:
+                agent_id = self.memory.initialize_subject(
+                    effective_user_id, reset=reset, blocks=[human._replace(value=user_info), summary]
+                )
+            except SubjectExistsError as e:
+                return {
+                    "success": True,
+                    "message": f"Memory already exists for {effective_user_id}",
+                    "agent_id": e.agent_id
+                }
             
             logger.info(f"Initialized memory for user {effective_user_id}")
             return {
@@ -145,85 +161,44 @@ class MemoryService:
             """
             try:
                 effective_user_id = self._get_user_id(user_id)
-                
-                # Check if agent exists
-                agent = self.memory._get_matching_agent(tags=[effective_user_id])
-                
-                if agent:
-                    if reset:
-                        self.memory._delete_agent(agent.id)
-                        agent = None
-                    else:
-                        return {
-                            "success": False,
-                            "error": f"Memory already exists for {effective_user_id}. Use reset=True to recreate."
-                        }
-                        
-                # if human, summary are not added to the blocks argument by user, add them first check whether they are already added if not add them
-                
-                # Ensure blocks is a list
-                if blocks is None:
-                    blocks = []
-                    
-                # Get labels of blocks already provided by the user
-                existing_labels = {block.get("label") for block in blocks if block.get("label")}
-                
-                # Define the default blocks that should always exist
-                default_block_definitions = [
-                    {
-                        "label": "human",
-                        "description": "Information about the human user.",
-                        "value": "",
-                        "char_limit": 10000
-                    },
-                    {
-                        "label": "summary",
-                        "description": "A rolling summary of the conversation.",
-                        "value": "",
-                        "char_limit": 10000
+
+                # existing users are answered from the caches; only a miss (or reset) takes the lock
+                if not reset and self.memory.get_memory_agent_id(effective_user_id):
+                    return {
+                        "success": False,
+                        "error": f"Memory already exists for {effective_user_id}. Use reset=True to recreate."
                     }
-                ]
                 
-                # Add any missing default blocks
-                for default_block in default_block_definitions:
-                    if default_block["label"] not in existing_labels:
-                        blocks.append(default_block)
+                # if human, summary are not added to the blocks argument by user, add them
+                specs = [
+                    BlockSpec(
+                        label=block.get("label"),
+                        description=block.get("description"),
+                        char_limit=block.get("char_limit", 10000),
+                        value=block.get("value", ""),
+                    )
+                    for block in blocks or []
+                ]
+                existing_labels = {spec.label for spec in specs if spec.label}
+                for default_block in DEFAULT_BLOCKS:
+                    if default_block.label not in existing_labels:
+                        specs.append(default_block)
 
+                # initialize_subject serializes check-then-create per user, so concurrent requests cannot create two agents
+                try:
+                    agent_id = self.memory.initialize_subject(effective_user_id, reset=reset, blocks=specs)
+                except SubjectExistsError:
+                    return {
+                        "success": False,
+                        "error": f"Memory already exists for {effective_user_id}. Use reset=True to recreate."
+                    }
                 
-                # Format blocks for agent creation
-                memory_blocks = []
-                if blocks:
-                    for block in blocks:
-                        memory_blocks.append({
-                            "label": block.get("label"),
-                            "description": block.get("description"),
-                            "value": block.get("value", ""),
-                            "limit": block.get("char_limit", 10000)
-                        })
-                
-                # Create agent with embedding
-                agent_id = self.memory.letta_client.agents.create(
-                    name=f"memory_agent_{effective_user_id}",
-                    model=self.model,
-                    embedding=self.embedding,
-                    agent_type="sleeptime_agent",
-                    tags=self.memory._subject_tags(effective_user_id),
-                    memory_blocks=memory_blocks
-                ).id
-                
-                # Create initial passage
-                self.memory.letta_client.agents.passages.create(
-                    agent_id=agent_id,
-                    text=f"Initialized memory for user {effective_user_id}",
-                    tags=[self.memory._default_tag]
-                )
-                
-                logger.info(f"Created agent with {len(memory_blocks)} blocks")
+                logger.info(f"Created agent with {len(specs)} blocks")
                 return {
                     "success": True,
                     "message": f"Initialized memory for {effective_user_id}",
                     "agent_id": agent_id,
-                    "blocks_created": len(memory_blocks)
+                    "blocks_created": len(specs)
                 }
                 
             except Exception as e:
@@ -337,21 +312,38 @@ class MemoryService:
         query: str,
         user_id: Optional[str] = None,
         max_results: int = 5,
-        tags: Optional[List[str]] = None
+        tags: Optional[List[str]] = None,
+        score_threshold: Optional[float] = None,
+        start_datetime: Optional[str] = None,
+        end_datetime: Optional[str] = None,
     ) -> Dict[str, Any]:
         """Semantic search over conversation history"""
         try:
             effective_user_id = self._get_user_id(user_id)
-            results = self.memory.search(effective_user_id, query, tags=tags)
-            limited_results = results[:max_results]
+            # the limit is applied by the server, so only max_results passages are ranked and returned
+            results = self.memory.search(
+                effective_user_id,
+                query,
+                tags=tags,
+                limit=max_results,
+                score_threshold=score_threshold,
+                start_datetime=start_datetime,
+                end_datetime=end_datetime,
+            ) or []
             
             logger.info(f"Found {len(results)} results for query: {query}")
             
             return {
                 "success": True,
-                "results": limited_results,
-                "count": len(limited_results),
-                "total_found": len(results)
+                "results": results,
+                "count": len(results),
+                # kept for compatibility: with the limit pushed to the server, matches beyond
+                # max_results are never fetched, so this is the number returned, like count
+                "total_found": len(results),
+                # Letta returns no scores, and unscored results pass score_threshold unfiltered
+                "threshold_applied": None if score_threshold is None else all(
+                    getattr(hit, "score", None) is not None for hit in results
+                )
             }
         except Exception as e:
             logger.error(f"Error searching memories: {e}")
@@ -367,49 +359,77 @@ class MemoryService:
         current_query: Optional[str] = None,
         user_id: Optional[str] = None,
         max_search_results: int = 3,
-        include_summary: bool = True
+        include_summary: bool = True,
+        timeout: Optional[float] = None,
+        budget: Optional[int] = None
     ) -> Dict[str, Any]:
-        """Get comprehensive context including blocks and relevant memories"""
+        """
+        Get comprehensive context including blocks and relevant memories
+
+        The user context, summary and search are fetched concurrently, so latency is that of the
+        slowest fetch. A part that has not arrived within `timeout` seconds (default:
+        context_timeout), or whose fetch failed, is left empty and listed in `degraded` instead of
+        failing the response.
+        With a `budget`, combined_context is trimmed to fit it (see _format_combined_context).
+        """
         try:
             effective_user_id = self._get_user_id(user_id)
+            timeout = self.context_timeout if timeout is None else timeout
             
-            # Get user context block
-            user_context_result = self.get_user_context(effective_user_id, format="xml")
-            user_context = user_context_result.get("context", "")
-            
-            # Get summary if requested
-            summary = ""
+            fetches = {
+                "user_context": self._context_executor.submit(self.get_user_context, effective_user_id, format="xml")
+            }
             if include_summary:
-                try:
-                    summary_result = self.get_summary(effective_user_id, format="xml")
-                    summary = summary_result.get("summary", "")
-                except Exception as e:
-                    logger.error(f"Error getting summary: {e}")
-                    summary = ""
-            
-            # Search for relevant memories if query provided
-            relevant_memories = []
+                fetches["summary"] = self._context_executor.submit(self.get_summary, effective_user_id, format="xml")
             if current_query:
-                search_result = self.search_memories(
+                fetches["relevant_memories"] = self._context_executor.submit(
+                    self.search_memories,
                     current_query,
                     user_id=effective_user_id, 
                     max_results=max_search_results
                 )
-                relevant_memories = search_result.get("results", [])
+            wait(fetches.values(), timeout=timeout)
+            
+            parts: Dict[str, Any] = {"user_context": "", "summary": "", "relevant_memories": []}
+            degraded = []
+            for name, future in fetches.items():
+                if not future.done():
+                    # the fetch keeps running in the background; its result is discarded
+                    future.cancel()
+                    logger.warning(f"Context part {name} for {effective_user_id} missed the {timeout}s deadline")
+                    degraded.append(name)
+                    continue
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Error getting {name}: {e}")
+                    degraded.append(name)
+                    continue
+                if result.get("success") is False and "error" in result:
+                    # the fetch caught a backend failure; a user with no memory yet is not one
+                    degraded.append(name)
+                    continue
+                key = {"user_context": "context", "summary": "summary", "relevant_memories": "results"}[name]
+                parts[name] = result.get(key) or parts[name]
             
             # Format combined context
             combined = self._format_combined_context(
-                user_context, 
-                summary,
-                relevant_memories
+                parts["user_context"], 
+                parts["summary"],
+                parts["relevant_memories"],
+                budget=budget
             )
             
             return {
                 "success": True,
-                "user_context": user_context,
-                "summary": summary,
-                "relevant_memories": relevant_memories,
-                "combined_context": combined
+                "user_context": parts["user_context"],
+                "summary": parts["summary"],
+                "relevant_memories": parts["relevant_memories"],
+                "combined_context": combined.text,
+                "included": combined.included,
+                "truncated": combined.truncated,
+                "dropped": combined.dropped,
+                "degraded": degraded
             }
         except Exception as e:
             logger.error(f"Error getting full context: {e}")
@@ -423,25 +443,26 @@ class MemoryService:
         self, 
         user_context: str,
         summary: str,
-        memories: List[str]
-    ) -> str:
-        """Format blocks and memories for injection into system prompt"""
-        context_parts = []
-        
-        if user_context:
-            context_parts.append(user_context)
-        
-        if summary:
-            context_parts.append(summary)
-        
-        if memories:
-            memories_section = "<relevant_memories>"
-            for i, mem in enumerate(memories, 1):
-                memories_section += f"\n{i}. {mem}"
-            memories_section += "\n</relevant_memories>"
-            context_parts.append(memories_section)
-        
-        return "\n\n".join(context_parts)
+        memories: List[str],
+        budget: Optional[int] = None
+    ) -> AssembledContext:
+        """
+        Format blocks and memories for injection into system prompt
+
+        Under a budget (measured by context_tokenizer), the lowest-ranked memories are dropped
+        first and blocks are cut at sentence boundaries, in context_priorities order.
+        """
+        sections = [
+            ContextSection("user_context", user_context, self.context_priorities["user_context"]),
+            ContextSection("summary", summary, self.context_priorities["summary"]),
+        ]
+        return assemble_context(
+            sections,
+            memories,
+            budget=budget,
+            count=self.context_tokenizer,
+            memories_priority=self.context_priorities["relevant_memories"],
+        )
     
     def delete_user(self, user_id: Optional[str] = None) -> Dict[str, Any]:
         """Delete all memory for a user"""
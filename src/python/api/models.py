@@ -98,7 +98,8 @@ class SearchResult(BaseModel):
     success: bool
     results: List[str] = []
     count: int = 0
-    total_found: Optional[int] = None
+    total_found: Optional[int] = None  # deprecated: equals count (results are limited by the server)
+    threshold_applied: Optional[bool] = None  # False: some results carry no score, so score_threshold could not filter them
     error: Optional[str] = None
 
 
@@ -107,6 +108,10 @@ class FullContextResponse(BaseResponse):
     summary: str = ""
     relevant_memories: List[str] = []
     combined_context: str = ""
+    included: List[str] = []  # parts kept in combined_context: section names and memory:N
+    truncated: List[str] = []  # sections cut at a sentence boundary to fit the budget
+    dropped: List[str] = []
+    degraded: List[str] = []  # parts left empty because they failed or missed the deadline
 
 
 # Delete and Agent Response Models
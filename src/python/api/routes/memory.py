@@ -15,22 +15,29 @@ from ..models import (
     AgentIdResponse,
 )
 from ..memory_service import MemoryService
+from local_backend import LocalLetta
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
+# Handlers are plain `def` (not `async def`): MemoryService makes blocking Letta calls, so FastAPI
+# must run them in its threadpool rather than on the event loop. For fully async code use AsyncMemory.
 router = APIRouter(prefix="/memory", tags=["memory"])
 # Initialize memory service with model configuration
 memory_service = MemoryService(
     api_key=os.getenv("LETTA_API_KEY"),
     base_url=os.getenv("LETTA_BASE_URL"),
     model=os.getenv("LETTA_MODEL", "openai/gpt-4.1"),
-    embedding=os.getenv("LETTA_EMBEDDING", "openai/text-embedding-3-small")
+    embedding=os.getenv("LETTA_EMBEDDING", "openai/text-embedding-3-small"),
+    context_timeout=float(os.getenv("MEMORY_CONTEXT_TIMEOUT", "5")),
+    lock_dir=os.getenv("MEMORY_LOCK_DIR"),
+    # serve from a local SQLite store instead of a Letta server
+    backend=LocalLetta(os.environ["MEMORY_LOCAL_DB"]) if os.getenv("MEMORY_LOCAL_DB") else None
 )
 
 
 @router.post("/initialize", response_model=InitializeUserResponse)
-async def initialize_user(request: InitializeUserRequest):
+def initialize_user(request: InitializeUserRequest):
     """
     Initialize memory for a user with default blocks (human, summary)
     
@@ -49,7 +56,7 @@ async def initialize_user(request: InitializeUserRequest):
 
 
 @router.post("/initialize-with-blocks", response_model=InitializeWithBlocksResponse)
-async def initialize_with_blocks(request: InitializeWithBlocksRequest):
+def initialize_with_blocks(request: InitializeWithBlocksRequest):
     """
     Initialize memory with custom blocks
     
@@ -74,7 +81,7 @@ async def initialize_with_blocks(request: InitializeWithBlocksRequest):
 
 
 @router.post("/add", response_model=AddConversationResponse)
-async def add_conversation(request: AddConversationRequest):
+def add_conversation(request: AddConversationRequest):
     """
     Add conversation messages to memory
     
@@ -94,11 +101,13 @@ async def add_conversation(request: AddConversationRequest):
 
 
 @router.get("/context", response_model=FullContextResponse)
-async def get_full_context(
+def get_full_context(
     user_id: str = Query(..., description="User identifier"),
     query: Optional[str] = Query(None, description="Optional query to search for relevant memories"),
     max_results: int = Query(3, description="Number of search results to include"),
-    include_summary: bool = Query(True, description="Include conversation summary")
+    include_summary: bool = Query(True, description="Include conversation summary"),
+    timeout: Optional[float] = Query(None, gt=0, description="Deadline in seconds; parts still pending are left empty"),
+    budget: Optional[int] = Query(None, gt=0, description="Maximum size of combined_context in characters")
 ):
     """
     Get comprehensive context for injecting into LLM system prompts
@@ -109,7 +118,9 @@ async def get_full_context(
         current_query=query,
         user_id=user_id,
         max_search_results=max_results,
-        include_summary=include_summary
+        include_summary=include_summary,
+        timeout=timeout,
+        budget=budget
     )
     
     if not result.get("success"):
@@ -119,7 +130,7 @@ async def get_full_context(
 
 
 @router.get("/user-context", response_model=ContextResponse)
-async def get_user_context(
+def get_user_context(
     user_id: str = Query(..., description="User identifier"),
     format: str = Query("xml", description="Format: 'xml' or 'raw'")
 ):
@@ -133,7 +144,7 @@ async def get_user_context(
 
 
 @router.get("/summary", response_model=SummaryResponse)
-async def get_summary(
+def get_summary(
     user_id: str = Query(..., description="User identifier"),
     format: str = Query("xml", description="Format: 'xml' or 'raw'")
 ):
@@ -147,11 +158,14 @@ async def get_summary(
 
 
 @router.get("/search", response_model=SearchResult)
-async def search_memories(
+def search_memories(
     user_id: str = Query(..., description="User identifier"),
     query: str = Query(..., description="Search query"),
     max_results: int = Query(5, description="Maximum number of results"),
-    tags: Optional[str] = Query(None, description="Comma-separated tags to filter by (e.g., 'user,assistant')")
+    tags: Optional[str] = Query(None, description="Comma-separated tags to filter by (e.g., 'user,assistant')"),
+    score_threshold: Optional[float] = Query(None, description="Drop scored results below this relevance score"),
+    start: Optional[str] = Query(None, description="Only passages created after this ISO 8601 datetime"),
+    end: Optional[str] = Query(None, description="Only passages created before this ISO 8601 datetime"),
 ):
     """
     Semantic search over conversation history
@@ -166,7 +180,10 @@ async def search_memories(
         query=query,
         user_id=user_id,
         max_results=max_results,
-        tags=tags_list
+        tags=tags_list,
+        score_threshold=score_threshold,
+        start_datetime=start,
+        end_datetime=end,
     )
     
     if not result.get("success"):
@@ -176,7 +193,7 @@ async def search_memories(
 
 
 @router.delete("/user/{user_id}", response_model=DeleteResponse)
-async def delete_user(user_id: str):
+def delete_user(user_id: str):
     """Delete all memory for a user"""
     result = memory_service.delete_user(user_id=user_id)
     
@@ -187,7 +204,7 @@ async def delete_user(user_id: str):
 
 
 @router.get("/agent/{user_id}", response_model=AgentIdResponse)
-async def get_agent_id(user_id: str):
+def get_agent_id(user_id: str):
     """Get Letta agent ID and dashboard URL for a user"""
     result = memory_service.get_agent_id(user_id=user_id)
     
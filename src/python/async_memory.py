@@ -0,0 +1,737 @@
+from typing import AsyncIterator, Callable, List, Dict, Any, Hashable, Iterable, Optional, Sequence, Union
+from contextlib import asynccontextmanager
+from datetime import datetime
+import asyncio
+import functools
+import time
+import weakref
+import httpx
+from agent_pool import BlockSpec
+from ai_memory_sdk import ContextBundle, ReconcileResult, SubjectExistsError, _AgentRef, _MemoryBase
+from cache import CachedBlock
+from backend import MemoryBackend
+from clients import ClientRegistry, shared_clients
+from file_sync import SyncResult, mark_processed, save_manifest
+from local_backend import AsyncLocalLetta, LocalLetta
+from passages import PassageWriteResult, SearchHit, SearchQuery, awrite_passages
+from runs import ALL, FAILED_STATUSES, Backoff, check_return_when, is_satisfied, is_terminal
+from prompt_formatter import format_messages
+from schemas import MessageCreate
+from singleflight import AsyncSingleFlight
+
+# (event loop, subject) -> lock shared by every AsyncMemory on that loop, so coroutines queue here
+# instead of each tying up an executor thread waiting for the SubjectLocks lock
+_subject_async_locks: "weakref.WeakValueDictionary[Any, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+class AsyncMemory(_MemoryBase):
+    """ An asyncio memory SDK for Letta
+
+    Same surface as `Memory`, but every method that talks to Letta is a coroutine backed by
+    `letta_client.AsyncLetta`, so it never blocks the event loop. Use this from async web
+    handlers (FastAPI, aiohttp, ...) to serve many memory requests concurrently.
+
+    Not supported (yet) compared to `Memory`:
+        - `message_buffer` and `agent_pool`: passing either raises ValueError
+        - `run_handle()`, `return_handle=True` and `flush()`: await `wait_for_run` /
+          `wait_for_runs` with the returned run ids instead
+    """
+
+    _single_flight = AsyncSingleFlight
+
+    def _create_client(self, base_url: Optional[str] = None, token: Optional[str] = None):
+        from letta_client import AsyncLetta
+
+        # an httpx.AsyncClient is bound to one event loop, so only share within the running loop
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if self.share_client and loop is not None:
+            return shared_clients.get(AsyncLetta, httpx.AsyncClient, base_url, token, self.http_options, loop=loop)
+        return ClientRegistry.create(AsyncLetta, httpx.AsyncClient, base_url, token, self.http_options)[0]
+
+    def _adapt_backend(self, backend: MemoryBackend) -> MemoryBackend:
+        # a LocalLetta is synchronous; run its calls off the event loop
+        if isinstance(backend, LocalLetta):
+            return AsyncLocalLetta(backend)
+        return backend
+
+    async def _in_thread(self, store: Any, fn: Callable[..., Any], *args: Any) -> Any:
+        """ Run a call into a store (subject index, passage dedupe, local index) in a worker thread,
+        so disk I/O, lock waits and scoring never block the event loop; inline when `store` is not configured """
+        if store is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args))
+
+    async def _create_sleeptime_agent(self, name: str, tags: List[str], blocks: Sequence[BlockSpec] = ()):
+        """ Create a subconscious agent that learns over time (with `blocks` created in the same call) """
+        tags = list(dict.fromkeys((tags or []) + [self._default_tag]))
+        agent_state = await self._upstream.agents.create(name=name, tags=tags, **self._agent_options(blocks))
+        return agent_state.id
+
+    async def _get_matching_agent(self, tags: List[str], fresh: bool = False):
+        """ Get an agent with matching tags (fresh: ask Letta, bypassing caches and in-flight lookups) """
+        key = ("tags",) + tuple(tags)
+        if not fresh:
+            agent_id = self._agent_cache.get(key)
+            if agent_id is not None:
+                return _AgentRef(agent_id)
+            agent_id = await self._in_thread(self.subject_index, self._indexed_agent, tags)
+            if agent_id is not None:
+                self._agent_cache.set(key, agent_id)
+                return _AgentRef(agent_id)
+        list_agents = lambda: self._upstream.agents.list(tags=tags, match_all_tags=True)  # noqa: E731
+        agents = await (list_agents() if fresh else self._flights.do(key, list_agents))
+        if agents:
+            agent = self._oldest_agent(agents, tags)
+            self._agent_cache.set(key, agent.id)
+            await self._in_thread(self.subject_index, self._index_agent, agent.id, getattr(agent, "tags", None) or tags)
+            return _AgentRef(agent.id)
+        return None
+
+    async def _get_agent_for_subject(self, subject_id: str):
+        """Find an agent for a given subject. Tries both new and legacy tag styles."""
+        key = ("subject", subject_id)
+        agent_id = self._agent_cache.get(key)
+        if agent_id is not None:
+            return _AgentRef(agent_id)
+        return await self._flights.do(key, lambda: self._lookup_agent_for_subject(subject_id))
+
+    async def _lookup_agent_for_subject(self, subject_id: str, fresh: bool = False):
+        agent = await self._get_matching_agent(tags=[f"subj:{subject_id}"], fresh=fresh)
+        if not agent:
+            agent = await self._get_matching_agent(tags=[subject_id], fresh=fresh)
+        if agent:
+            self._agent_cache.set(("subject", subject_id), agent.id)
+        return agent
+
+    async def _create_context_block(self, agent_id: str, label: str, description: str, char_limit: int = 10000, value: str = ""):
+        """ Create a memory block for a subject """
+        version = self._block_cache.version(agent_id)
+        block = await self._upstream.blocks.create(
+            label=label,
+            description=description,
+            limit=char_limit,
+            value=value,
+        )
+        await self._upstream.agents.blocks.attach(agent_id=agent_id, block_id=block.id)
+        self._block_cache.put(agent_id, label, CachedBlock(block.id, label, value, description, char_limit), version)
+        if self.subject_index is not None:
+            await self._in_thread(self.subject_index, self.subject_index.set_block, agent_id, label, block.id)
+        return block.id
+
+    async def _list_context_blocks(self, agent_id: str):
+        """ List all subject blocks for an agent, refreshing the block cache """
+        version = self._block_cache.version(agent_id)
+        blocks = await self._flights.do(
+            ("blocks", agent_id, version), lambda: self._upstream.agents.blocks.list(agent_id=agent_id)
+        )
+        for b in blocks:
+            snapshot = self._snapshot_block(b)
+            if snapshot.label is not None:
+                self._block_cache.put(agent_id, snapshot.label, snapshot, version)
+        await self._in_thread(self.subject_index, self._index_blocks, agent_id, blocks)
+        return blocks
+
+    async def _delete_context_block(self, agent_id: str, block_id: str):
+        """ Delete a context block """
+        await self._upstream.agents.blocks.detach(agent_id=agent_id, block_id=block_id)
+        await self._upstream.blocks.delete(block_id=block_id)
+        self._block_cache.invalidate(agent_id)
+        if self.subject_index is not None:
+            await self._in_thread(self.subject_index, self.subject_index.forget_block, agent_id, block_id)
+
+    async def _delete_agent(self, agent_id: str):
+        """ Delete an agent """
+        await self._upstream.agents.delete(agent_id=agent_id)
+        self._agent_cache.pop_where(lambda _key, cached_id: cached_id == agent_id)
+        if self.subject_index is not None:
+            await self._in_thread(self.subject_index, self.subject_index.forget_agent, agent_id)
+        self._block_cache.invalidate(agent_id)
+        if self.passage_dedupe is not None:
+            await self._in_thread(self.passage_dedupe, self.passage_dedupe.forget, agent_id)
+        if self.local_index is not None:
+            self.local_index.drop(agent_id)
+        self._invalidate_search(agent_id)
+
+    @asynccontextmanager
+    async def subject_lock(self, subject_id: str) -> AsyncIterator[None]:
+        """ Hold the subject's creation lock: an asyncio.Lock for this loop, then the SubjectLocks lock
+        taken in a worker thread, which also excludes sync Memory instances (and, with a lock
+        directory, other processes) creating the same subject """
+        loop = asyncio.get_running_loop()
+        lock = _subject_async_locks.get((loop, subject_id))
+        if lock is None:
+            lock = _subject_async_locks[(loop, subject_id)] = asyncio.Lock()
+        try:
+            await asyncio.wait_for(lock.acquire(), self.subject_locks.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Timed out waiting for the lock on subject {subject_id}") from None
+        try:
+            acquiring = loop.run_in_executor(None, self.subject_locks.acquire, subject_id)
+            try:
+                held = await asyncio.shield(acquiring)
+            except asyncio.CancelledError:
+                # the worker thread goes on to take the lock; give it back once it has
+                acquiring.add_done_callback(self._release_acquired)
+                raise
+            try:
+                yield
+            finally:
+                self.subject_locks.release(held)
+        finally:
+            lock.release()
+
+    def _release_acquired(self, acquiring: "asyncio.Future[Any]") -> None:
+        if not acquiring.cancelled() and acquiring.exception() is None:
+            self.subject_locks.release(acquiring.result())
+
+    async def _ensure_subject(self, subject_id: str) -> str:
+        """Ensure a subject exists and return its agent id."""
+        agent = await self._get_agent_for_subject(subject_id)
+        if agent:
+            return agent.id
+        async with self.subject_lock(subject_id):
+            return await self._ensure_subject_locked(subject_id)
+
+    async def _ensure_subject_locked(self, subject_id: str, blocks: Sequence[BlockSpec] = ()) -> str:
+        """_ensure_subject for a caller holding the subject lock: re-check, then create with `blocks`."""
+        agent = await self._lookup_agent_for_subject(subject_id, fresh=True)
+        if agent:
+            return agent.id
+        tags = self._subject_tags(subject_id)
+        agent_id = await self._create_sleeptime_agent(name=f"subconscious_agent_subject_{subject_id}", tags=tags, blocks=blocks)
+        await self._upstream.agents.passages.create(
+            agent_id=agent_id,
+            text=f"Initialized memory for subject {subject_id}",
+            tags=[self._default_tag],
+        )
+        self._agent_cache.set(("subject", subject_id), agent_id)
+        self._agent_cache.set(("tags", subject_id), agent_id)
+        await self._in_thread(self.subject_index, self._index_agent, agent_id, tags)
+        return agent_id
+
+    async def _find_block_by_label(self, agent_id: str, label: str, max_staleness: Optional[float] = None):
+        """Find a block object attached to an agent by label, or return None."""
+        if max_staleness is not None:
+            hit, cached = self._block_cache.get(agent_id, label, max_staleness)
+            if hit:
+                return cached
+        version = self._block_cache.version(agent_id)
+        blocks = await self._list_context_blocks(agent_id)
+        for b in blocks:
+            if self._block_field(b, "label") == label:
+                return b
+        self._block_cache.put(agent_id, label, None, version)
+        return None
+
+    async def _retrieve_block(self, agent_id: str, label: str, max_staleness: Optional[float] = None):
+        """Retrieve a single block by label, optionally served from the block cache."""
+        if max_staleness is not None:
+            hit, cached = self._block_cache.get(agent_id, label, max_staleness)
+            if hit and cached is not None:
+                return cached
+        version = self._block_cache.version(agent_id)
+        block = await self._flights.do(
+            ("block", agent_id, label, version), lambda: self._upstream.agents.blocks.retrieve(agent_id, label)
+        )
+        self._block_cache.put(agent_id, label, self._snapshot_block(block), version)
+        return block
+
+    async def _learn_messages(
+        self,
+        agent_id: str,
+        messages: List[Dict[str, Any]],
+        skip_vector_storage: bool,
+    ) -> str:
+        """Learn messages and optionally store in archival memory. Returns the (last chunk's) run ID."""
+        run_id = await self._submit_chunks(agent_id, format_messages([MessageCreate(**msg) for msg in messages]))
+
+        if not skip_vector_storage:
+            results = await self._write_passages(agent_id, self._message_passages(messages))
+            self._log_passage_failures(agent_id, results)
+
+        return run_id
+
+    async def _submit_chunks(self, agent_id: str, chunks: Iterable[Dict[str, str]], read_in_thread: bool = False) -> Optional[str]:
+        """Start one sleeptime run per chunk, consuming `chunks` lazily.
+
+        With read_in_thread=True each chunk is pulled in a worker thread, so file reads don't
+        block the event loop. Returns the run id standing for the whole group, or None.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = iter(chunks)
+        run_ids = []
+        while True:
+            chunk = await loop.run_in_executor(None, next, chunks, None) if read_in_thread else next(chunks, None)
+            if chunk is None:
+                break
+            letta_run = await self._upstream.agents.messages.create_async(agent_id=agent_id, messages=[chunk])
+            run_ids.append(letta_run.id)
+        return self._register_chunked_run(agent_id, run_ids) if run_ids else None
+
+    async def _write_passages(self, agent_id: str, passages: List[Dict[str, Any]]) -> List[PassageWriteResult]:
+        """Write passages concurrently, at most passage_write_concurrency in flight, skipping duplicates."""
+        async def create(**passage):
+            return await self._upstream.agents.passages.create(agent_id=agent_id, **passage)
+        if self.passage_dedupe is None:
+            results = await awrite_passages(create, passages, concurrency=self.passage_write_concurrency)
+        else:
+            dedupe = self.passage_dedupe
+            if await self._in_thread(dedupe, dedupe.needs_seed, agent_id):
+                existing = [(p.text, getattr(p, "tags", None)) for p in await self._list_passages(agent_id)]
+                await self._in_thread(dedupe, dedupe.seed, agent_id, existing)
+            claimed, fresh = await self._in_thread(dedupe, self._claim_passages, agent_id, passages)
+            written = await awrite_passages(create, fresh, concurrency=self.passage_write_concurrency)
+            results = await self._in_thread(dedupe, self._merge_claimed, agent_id, passages, claimed, written)
+        await self._in_thread(self.local_index, self._index_written, agent_id, passages, results)
+        return results
+
+    async def _list_passages(self, agent_id: str, page_size: int = 1000) -> List[Any]:
+        """Every passage already in an agent's archival memory."""
+        passages, after = [], None
+        while True:
+            page = await self._upstream.agents.passages.list(agent_id=agent_id, after=after, limit=page_size)
+            passages.extend(page)
+            if len(page) < page_size:
+                return passages
+            after = page[-1].id
+
+    async def _search_local(self, agent_id: str, q: SearchQuery) -> Optional[List[SearchHit]]:
+        """Answer a search from the local index, loading the agent's passages on first use."""
+        if self.local_index is None or q.start_datetime or q.end_datetime:
+            return None
+        index = self.local_index
+        if not index.is_loaded(agent_id):
+            passages = await self._list_passages(agent_id)
+            await self._in_thread(index, index.load, agent_id, [(p.text, getattr(p, "tags", None) or []) for p in passages])
+        return await self._in_thread(index, self._local_hits, agent_id, q)
+
+    async def _get_run_status(self, run_id: str):
+        """ Get the status of a run (of every chunk, for a chunked submission) """
+        earlier = self._run_groups.get(run_id)
+        if earlier:
+            statuses = await asyncio.gather(*(self._retrieve_run_status(r) for r in earlier))
+            status = self._merge_group_status(run_id, earlier, list(statuses))
+            if status is not None:
+                return status
+        return await self._retrieve_run_status(run_id)
+
+    async def _retrieve_run_status(self, run_id: str):
+        run = await self._upstream.runs.retrieve(run_id)
+        if not run:
+            raise ValueError(f"Run {run_id} not found")
+        return run.status
+
+    async def wait_for_run(self, run_id: str, timeout: int = 300):
+        """Wait for a run to complete without blocking the event loop.
+
+        Raises:
+            TimeoutError: If the run doesn't complete within the timeout period
+            RuntimeError: If the run finished without completing (failed, cancelled, expired)
+        """
+        status = (await self.wait_for_runs([run_id], timeout=timeout))[run_id]
+        if not is_terminal(status):
+            raise TimeoutError(f"Run {run_id} did not complete within {timeout} seconds")
+        if status in FAILED_STATUSES:
+            raise RuntimeError(f"Run {run_id} finished with status {status!r}")
+
+    async def wait_for_runs(
+        self,
+        run_ids: List[str],
+        timeout: Optional[float] = 300,
+        return_when: str = ALL,
+    ) -> Dict[str, str]:
+        """Wait for several runs from one polling loop (see `Memory.wait_for_runs`)."""
+        check_return_when(return_when)
+        statuses: Dict[str, str] = {run_id: "created" for run_id in run_ids}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        backoff = Backoff()
+        while True:
+            pending = [run_id for run_id, status in statuses.items() if not is_terminal(status)]
+            polled = await asyncio.gather(*(self._get_run_status(run_id) for run_id in pending))
+            for run_id, status in zip(pending, polled):
+                statuses[run_id] = status
+                if is_terminal(status):
+                    self._on_run_finished(run_id)
+            if is_satisfied(statuses, return_when):
+                return statuses
+            delay = next(backoff)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return statuses
+                delay = min(delay, remaining)
+            await asyncio.sleep(delay)
+
+    # ===== General Subject API =====
+
+    async def initialize_subject(self, subject_id: str, reset: bool = False, blocks: Optional[Sequence[BlockSpec]] = None) -> str:
+        """Initialize a subject (agent), created with `blocks` (see `Memory.initialize_subject`)."""
+        self._invalidate_subject(subject_id)
+        async with self.subject_lock(subject_id):
+            agent = await self._lookup_agent_for_subject(subject_id, fresh=True)
+            if agent:
+                if reset:
+                    await self._delete_agent(agent.id)
+                else:
+                    raise SubjectExistsError(
+                        f"Agent {agent.id} already exists for subject {subject_id}. "
+                        f"Cannot re-initialize unless reset=True.",
+                        agent.id,
+                    )
+            return await self._ensure_subject_locked(subject_id, blocks or ())
+
+    async def list_blocks(self, subject_id: Optional[str] = None):
+        """List all blocks for a subject. If instance is bound, subject_id may be omitted."""
+        sid = self._get_effective_subject(subject_id)
+        agent = await self._get_agent_for_subject(sid)
+        if not agent:
+            return []
+        return await self._list_context_blocks(agent.id)
+
+    async def initialize_memory(
+        self,
+        label: str,
+        description: str,
+        value: str = "",
+        char_limit: int = 10000,
+        reset: bool = False,
+        subject_id: Optional[str] = None,
+    ) -> str:
+        """Create (or optionally reset) a labeled block within a subject."""
+        sid = self._get_effective_subject(subject_id)
+        agent_id = await self._ensure_subject(sid)
+
+        existing_id = await self._in_thread(self.subject_index, self._indexed_block_id, agent_id, label)
+        if existing_id is None:
+            existing = await self._find_block_by_label(agent_id, label)
+            existing_id = self._block_id(existing) if existing else None
+        if existing_id and reset:
+            await self._delete_context_block(agent_id, existing_id)
+            existing_id = None
+
+        if existing_id:
+            return existing_id
+
+        return await self._create_context_block(
+            agent_id=agent_id,
+            label=label,
+            description=description,
+            char_limit=char_limit,
+            value=value,
+        )
+
+    async def get_memory(
+        self,
+        label: str,
+        prompt_formatted: bool = False,
+        subject_id: Optional[str] = None,
+        max_staleness: Optional[float] = None,
+    ) -> Optional[str]:
+        """Retrieve a labeled block from a subject. Returns None if missing."""
+        sid = self._get_effective_subject(subject_id)
+        agent = await self._get_agent_for_subject(sid)
+        if not agent:
+            return None
+        block = await self._find_block_by_label(agent.id, label, max_staleness=max_staleness)
+        if not block:
+            return None
+        if prompt_formatted:
+            return self._format_block(block)
+        return self._block_field(block, "value")
+
+    async def delete_block(self, label: str, subject_id: Optional[str] = None):
+        """Delete a labeled block from a subject if it exists."""
+        sid = self._get_effective_subject(subject_id)
+        agent = await self._get_agent_for_subject(sid)
+        if not agent:
+            return
+        block_id = await self._in_thread(self.subject_index, self._indexed_block_id, agent.id, label)
+        if block_id is None:
+            block = await self._find_block_by_label(agent.id, label)
+            block_id = self._block_id(block) if block else None
+        if block_id:
+            await self._delete_context_block(agent.id, block_id)
+
+    async def add_messages_for_subject(
+        self,
+        subject_id: str,
+        messages: List[Dict[str, Any]],
+        skip_vector_storage: bool = True,
+    ) -> str:
+        """Add messages to a specific subject (generalized API)."""
+        agent = await self._get_agent_for_subject(subject_id)
+        if agent:
+            agent_id = agent.id
+        else:
+            agent_id = await self._ensure_subject(subject_id)
+        return await self._learn_messages(agent_id, messages, skip_vector_storage=skip_vector_storage)
+
+    async def add_messages_here(self, messages: List[Dict[str, Any]], skip_vector_storage: bool = True) -> str:
+        """Add messages using the instance's bound subject_id."""
+        sid = self._get_effective_subject(None)
+        return await self.add_messages_for_subject(sid, messages, skip_vector_storage=skip_vector_storage)
+
+    async def initialize_user_memory(self,
+        user_id: str,
+        user_context_block_prompt: str = "Details about the human user you are speaking to.",
+        user_context_block_char_limit: int = 10000,
+        user_context_block_value: str = "",
+        summary_block_prompt: str = "A short (1-2 sentences) running summary of the conversation.",
+        summary_block_char_limit: int = 1000,
+        reset: bool = False
+    ):
+        """Initialize a user's memory with default blocks (human, summary). Returns the agent ID."""
+        async with self.subject_lock(user_id):
+            agent = await self._get_matching_agent(tags=[user_id], fresh=True)
+            if agent:
+                if reset:
+                    await self._delete_agent(agent.id)
+                else:
+                    raise SubjectExistsError(f"Agent {agent.id} already exists for user {user_id}. Cannot re-initialize memory unless reset=True.", agent.id)
+
+            return await self._create_user_agent(user_id, self._user_blocks(
+                user_context_block_prompt, user_context_block_char_limit, user_context_block_value,
+                summary_block_prompt, summary_block_char_limit,
+            ))
+
+    async def _ensure_user(self, user_id: str) -> str:
+        """Ensure a user agent (with the default human and summary blocks) exists and return its id."""
+        agent = await self._get_matching_agent(tags=[user_id])
+        if agent:
+            return agent.id
+        async with self.subject_lock(user_id):
+            agent = await self._get_matching_agent(tags=[user_id], fresh=True)
+            if agent:
+                return agent.id
+            return await self._create_user_agent(user_id, self._user_blocks())
+
+    async def _create_user_agent(self, user_id: str, blocks: List[BlockSpec]) -> str:
+        """Create a user's agent with its blocks; the caller holds the subject lock."""
+        agent_id = await self._create_sleeptime_agent(name=f"subconscious_agent_user_{user_id}", tags=[user_id])
+
+        # the blocks and the initial passage are independent, so create them concurrently
+        await asyncio.gather(
+            *(self._create_context_block(agent_id=agent_id, label=spec.label, description=spec.description, char_limit=spec.char_limit, value=spec.value)
+              for spec in blocks),
+            self._upstream.agents.passages.create(
+                agent_id=agent_id,
+                text=f"Initialized memory for user {user_id}",
+                tags=[self._default_tag],
+            ),
+        )
+        self._agent_cache.set(("tags", user_id), agent_id)
+        await self._in_thread(self.subject_index, self._index_agent, agent_id, [user_id])
+        return agent_id
+
+    async def add_messages(self, user_or_messages, messages: Optional[List[Dict[str, Any]]] = None, skip_vector_storage: bool = True):
+        """Add messages (legacy user mode or subject-bound mode, see `Memory.add_messages`)."""
+        if isinstance(user_or_messages, str):
+            user_id = user_or_messages
+            if messages is None:
+                raise ValueError("messages must be provided when calling add_messages(user_id, messages, ...)" )
+            agent_id = await self._ensure_user(user_id)
+            return await self._learn_messages(agent_id, messages, skip_vector_storage=skip_vector_storage)
+
+        inferred_messages = user_or_messages
+        if not isinstance(inferred_messages, list):
+            raise ValueError("First argument must be a user_id (str) or a messages list (List[Dict]).")
+        sid = self._get_effective_subject(None)
+        return await self.add_messages_for_subject(sid, inferred_messages, skip_vector_storage=skip_vector_storage)
+
+    async def add_passages(
+        self,
+        passages: List[Dict[str, Any]],
+        subject_id: Optional[str] = None,
+    ) -> List[PassageWriteResult]:
+        """Store passages directly in a subject's archival memory (see `Memory.add_passages`)."""
+        sid = self._get_effective_subject(subject_id)
+        agent_id = await self._ensure_subject(sid)
+        return await self._write_passages(agent_id, passages)
+
+    async def add_files(self, files: List[Dict[str, Any]], subject_id: Optional[str] = None) -> List[Optional[str]]:
+        """Learn about files, streaming each one as <file_part> runs (see `Memory.add_files`)."""
+        sid = self._get_effective_subject(subject_id)
+        agent_id = await self._ensure_subject(sid)
+        return [await self._submit_chunks(agent_id, self._file_parts(file), read_in_thread=True) for file in files]
+
+    async def sync_directory(
+        self,
+        path: str,
+        subject_id: Optional[str] = None,
+        description: str = "",
+        pattern: str = "*",
+        manifest_path: Optional[str] = None,
+        hash_workers: Optional[int] = None,
+    ) -> SyncResult:
+        """Incrementally learn a directory of files into a subject (see `Memory.sync_directory`)."""
+        sid = self._get_effective_subject(subject_id)
+        agent_id = await self._ensure_subject(sid)
+        loop = asyncio.get_running_loop()
+        manifest_path, manifest, plan = await loop.run_in_executor(
+            None, self._plan_directory_sync, path, sid, agent_id, description, pattern, manifest_path, hash_workers
+        )
+        run_ids: Dict[str, Optional[str]] = {}
+        try:
+            for entry in plan.changed:
+                run_ids[entry.label] = await self._submit_chunks(
+                    agent_id, self._file_parts(entry.model_dump()), read_in_thread=True
+                )
+                manifest[entry.label] = mark_processed(entry)
+        finally:
+            await loop.run_in_executor(None, save_manifest, manifest_path, manifest)
+        return self._sync_result(plan, run_ids)
+
+    async def get_user_memory(self, user_id: str, prompt_formatted: bool = False, max_staleness: Optional[float] = None):
+        """ Get the memory for a specific user """
+        agent = await self._get_matching_agent(tags=[user_id])
+        if agent:
+            block = await self._retrieve_block(agent.id, "human", max_staleness=max_staleness)
+            if prompt_formatted:
+                return self._format_block(block)
+            return block.value
+        return None
+
+    async def get_summary(self, user_id: str, prompt_formatted: bool = False, max_staleness: Optional[float] = None):
+        """ Get the summary for a specific user """
+        agent = await self._get_matching_agent(tags=[user_id])
+        if agent:
+            block = await self._retrieve_block(agent.id, "summary", max_staleness=max_staleness)
+            if prompt_formatted:
+                return f"<conversation_summary>{block.value}</conversation_summary>"
+            return block.value
+        return None
+
+    async def get_memory_agent_id(self, user_id: str):
+        """ Get the agent ID for a specific user """
+        agent = await self._get_matching_agent(tags=[user_id])
+        if agent:
+            return agent.id
+        return None
+
+    async def rebuild_subject_index(self, page_size: int = 100) -> int:
+        """ Repopulate the subject index from a paginated scan of this SDK's agents; returns agents indexed """
+        if self.subject_index is None:
+            raise ValueError("AsyncMemory was created without a subject_index")
+        agents, after = [], None
+        while True:
+            page = await self._upstream.agents.list(tags=[self._default_tag], match_all_tags=True, after=after, limit=page_size)
+            agents.extend(page)
+            if len(page) < page_size:
+                break
+            after = page[-1].id
+        await self._in_thread(self.subject_index, self.subject_index.rebuild, self._index_entries(agents))
+        self._agent_cache.clear()
+        return len(agents)
+
+    async def _list_subject_agents(self, subject_id: str) -> List[Any]:
+        """ Every agent carrying the subject's namespaced or raw tag, oldest first """
+        agents: Dict[str, Any] = {}
+        for tags in ([f"subj:{subject_id}"], [subject_id]):
+            for agent in await self._upstream.agents.list(tags=tags, match_all_tags=True):
+                agents.setdefault(agent.id, agent)
+        return self._rank_agents(list(agents.values()))
+
+    async def reconcile_subject(self, subject_id: str, merge: bool = True, dry_run: bool = False) -> ReconcileResult:
+        """Collapse duplicate agents of a subject into the oldest one (see `Memory.reconcile_subject`)."""
+        async with self.subject_lock(subject_id):
+            agents = await self._list_subject_agents(subject_id)
+            if not agents:
+                return ReconcileResult(subject_id, None, [], 0, 0)
+            keep, duplicates = agents[0], agents[1:]
+            passages, blocks = [], []
+            if merge and duplicates:
+                kept_passages, *duplicate_passages = await asyncio.gather(*(self._list_passages(a.id) for a in agents))
+                passages = self._missing_passages(kept_passages, (p for page in duplicate_passages for p in page))
+                kept_blocks, *duplicate_blocks = await asyncio.gather(
+                    *(self._upstream.agents.blocks.list(agent_id=a.id) for a in agents)
+                )
+                blocks = self._missing_blocks(kept_blocks, (b for page in duplicate_blocks for b in page))
+            deleted = [d.id for d in duplicates]
+            if dry_run:
+                return ReconcileResult(subject_id, keep.id, deleted, len(passages), len(blocks))
+            copied = 0
+            if passages:
+                results = await self._write_passages(keep.id, passages)
+                self._log_passage_failures(keep.id, results)
+                copied = sum(1 for r in results if r.ok and not r.duplicate)
+            for block in blocks:
+                await self._create_context_block(keep.id, block.label, block.description or "", block.limit or 10000, block.value or "")
+            for agent_id in deleted:
+                await self._delete_agent(agent_id)
+            self._invalidate_subject(subject_id)
+            await self._in_thread(
+                self.subject_index, self._index_agent, keep.id, list(getattr(keep, "tags", None) or self._subject_tags(subject_id))
+            )
+            return ReconcileResult(subject_id, keep.id, deleted, copied, len(blocks))
+
+    async def delete_user(self, user_id: str):
+        """ Delete a user """
+        self._invalidate_subject(user_id)
+        agent = await self._get_matching_agent(tags=[user_id])
+        if agent:
+            await self._delete_agent(agent.id)
+            print(f"Deleted agent {agent.id} for user {user_id}")
+
+    async def search(
+        self,
+        user_id: str,
+        query: str,
+        tags: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+        score_threshold: Optional[float] = None,
+        start_datetime: Union[datetime, str, None] = None,
+        end_datetime: Union[datetime, str, None] = None,
+    ) -> Optional[List[SearchHit]]:
+        """Search for stored user messages via semantic search (see `Memory.search`)."""
+        agent = await self._get_matching_agent(tags=[user_id])
+        if agent:
+            q = self._search_query(query, tags, limit, score_threshold, start_datetime, end_datetime)
+            return await self._search_agent(agent.id, q)
+
+    async def _search_agent(self, agent_id: str, q: SearchQuery) -> List[SearchHit]:
+        """Search one agent's archival memory: result cache, then local index, then the server."""
+        key = self._search_key(agent_id, q)
+        cached = self._cached_search(key)
+        if cached is not None:
+            return cached
+        version = self._search_version(agent_id)
+        return await self._flights.do(("search", key, version), lambda: self._run_search(agent_id, q, key, version))
+
+    async def _run_search(self, agent_id: str, q: SearchQuery, key: Hashable, version: int) -> List[SearchHit]:
+        results = await self._search_local(agent_id, q)
+        if results is None:
+            response = await self._upstream.agents.passages.search(agent_id=agent_id, **q.server_kwargs())
+            results = self._server_hits(response, q)
+        self._store_search(key, version, results)
+        return results
+
+    async def get_context_bundle(
+        self,
+        subject_id: Optional[str] = None,
+        labels: Optional[List[str]] = None,
+        query: Optional[str] = None,
+        k: int = 3,
+        tags: Optional[List[str]] = None,
+        max_staleness: Optional[float] = None,
+    ) -> ContextBundle:
+        """Fetch blocks and relevant memories for a prompt; the search and block list run concurrently (see `Memory.get_context_bundle`)."""
+        sid = self._get_effective_subject(subject_id)
+        agent = await self._get_agent_for_subject(sid)
+        if not agent:
+            return ContextBundle(sid, None, [], [], "")
+
+        async def fetch_blocks():
+            blocks = self._cached_blocks(agent.id, labels, max_staleness)
+            if blocks is None:
+                listed = [self._snapshot_block(b) for b in await self._list_context_blocks(agent.id)]
+                blocks = self._select_blocks(listed, labels)
+            return blocks
+
+        async def fetch_memories():
+            return await self._search_agent(agent.id, self._search_query(query, tags, k)) if query else []
+
+        blocks, memories = await asyncio.gather(fetch_blocks(), fetch_memories())
+        return ContextBundle(sid, agent.id, blocks, memories, self._render_context(blocks, memories))
@@ -0,0 +1,57 @@
+from typing import Any, List, Optional, Protocol, Sequence
+
+
+class AgentBlocksAPI(Protocol):
+    def attach(self, agent_id: str, block_id: str) -> Any: ...
+    def detach(self, agent_id: str, block_id: str) -> Any: ...
+    def list(self, agent_id: str) -> List[Any]: ...
+    def retrieve(self, agent_id: str, block_label: str) -> Any: ...
+
+
+class AgentPassagesAPI(Protocol):
+    def create(self, agent_id: str, *, text: str, tags: Optional[Sequence[str]] = None) -> List[Any]: ...
+    def list(self, agent_id: str, *, after: Optional[str] = None, limit: Optional[int] = None) -> List[Any]: ...
+    def search(self, agent_id: str, *, query: str, tags: Optional[Sequence[str]] = None, **options: Any) -> Any: ...
+
+
+class AgentMessagesAPI(Protocol):
+    def create_async(self, agent_id: str, *, messages: Sequence[Any]) -> Any: ...
+
+
+class AgentsAPI(Protocol):
+    blocks: AgentBlocksAPI
+    passages: AgentPassagesAPI
+    messages: AgentMessagesAPI
+
+    def create(self, *, name: str, tags: Optional[Sequence[str]] = None, **options: Any) -> Any: ...
+    def list(self, *, tags: Optional[Sequence[str]] = None, match_all_tags: Optional[bool] = None,
+             after: Optional[str] = None, limit: Optional[int] = None) -> List[Any]: ...
+    def modify(self, agent_id: str, *, name: Optional[str] = None, tags: Optional[Sequence[str]] = None) -> Any: ...
+    def delete(self, agent_id: str) -> Any: ...
+
+
+class BlocksAPI(Protocol):
+    def create(self, *, label: str, value: str, limit: Optional[int] = None, description: Optional[str] = None) -> Any: ...
+    def modify(self, block_id: str, *, value: Optional[str] = None, limit: Optional[int] = None,
+               description: Optional[str] = None) -> Any: ...
+    def delete(self, block_id: str) -> Any: ...
+
+
+class RunsAPI(Protocol):
+    def retrieve(self, run_id: str) -> Any: ...
+
+
+class MemoryBackend(Protocol):
+    """ The part of the `letta_client.Letta` surface Memory uses
+
+    `letta_client.Letta` satisfies it, and so does `local_backend.LocalLetta`; pass either (or
+    any other implementation) as `Memory(backend=...)`. Returned objects only need the
+    attributes Memory reads: agents have `id`, `name`, `tags`, `created_at` and `memory.blocks`;
+    blocks `id`, `label`, `value`, `limit` and `description`; passages `id`, `text` and `tags`;
+    runs `id` and `status`; search responses `results` of `content`, `timestamp` and `tags`.
+    AsyncMemory expects the same surface with coroutine methods, like `letta_client.AsyncLetta`.
+    """
+
+    agents: AgentsAPI
+    blocks: BlocksAPI
+    runs: RunsAPI
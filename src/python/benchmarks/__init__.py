@@ -0,0 +1 @@
+""" Load benchmarks for Memory and MemoryService against a latency-injecting Letta emulator """
@@ -0,0 +1,61 @@
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+
+from benchmarks.workloads import WORKLOADS, run_benchmarks
+
+
+def _format_ms(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark Memory and MemoryService workloads")
+    parser.add_argument("workloads", nargs="*", help=f"any of {', '.join(sorted(WORKLOADS))} (default: all)")
+    parser.add_argument("--ops", type=int, default=100, help="timed operations per workload")
+    parser.add_argument("--concurrency", type=int, default=8, help="threads issuing operations")
+    parser.add_argument("--users", type=int, default=20, help="users created by the setup of each workload")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiplier for emulated latencies")
+    parser.add_argument("--error-rate", type=float, default=None, help="error probability of every endpoint")
+    parser.add_argument("--rate-limit", type=float, default=None, help="calls per second allowed per endpoint")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="write the report as JSON ('-' for stdout)")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.workloads if name not in WORKLOADS]
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(unknown)}")
+
+    # MemoryService logs every request at INFO
+    logging.getLogger().setLevel(logging.WARNING)
+    names = args.workloads or sorted(WORKLOADS)
+    results = run_benchmarks(
+        names, ops=args.ops, concurrency=args.concurrency, users=args.users, time_scale=args.time_scale,
+        error_rate=args.error_rate, rate_limit=args.rate_limit, seed=args.seed,
+    )
+
+    if args.json != "-":
+        print(f"{'workload':<16} {'ops/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'calls/op':>9} {'errors':>7}")
+        for r in results:
+            print(f"{r.workload:<16} {r.throughput_ops_s:>8.1f} {_format_ms(r.p50_ms):>8} {_format_ms(r.p95_ms):>8} "
+                  f"{_format_ms(r.p99_ms):>8} {r.upstream_calls_per_op:>9.2f} {r.errors:>7}")
+    if args.json:
+        report = {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("workloads", "json")},
+            "results": [r._asdict() for r in results],
+        }
+        if args.json == "-":
+            json.dump(report, sys.stdout, indent=2)
+            print()
+        else:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+import math
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Mapping, NamedTuple, Optional, Union
+
+from local_backend import LocalLetta
+
+
+class Fixed(NamedTuple):
+    seconds: float
+
+    def sample(self, rng: random.Random) -> float:
+        return self.seconds
+
+
+class Uniform(NamedTuple):
+    low: float
+    high: float
+
+    def sample(self, rng: random.Random) -> float:
+        return rng.uniform(self.low, self.high)
+
+
+class LogNormal(NamedTuple):
+    """ Right-skewed latency: half the calls take less than `median`, a long tail takes much more """
+    median: float
+    sigma: float = 0.5
+
+    def sample(self, rng: random.Random) -> float:
+        return self.median * math.exp(rng.gauss(0.0, self.sigma))
+
+
+Latency = Union[Fixed, Uniform, LogNormal]
+
+
+class EndpointProfile(NamedTuple):
+    """ How one emulated endpoint behaves
+
+    Every call waits a sample of `latency`, then fails with probability `error_rate` (a 500).
+    With `rate_limit` (calls per second, bursts of up to `burst` calls), calls over the limit
+    are rejected at once with a 429, as a server would.
+    """
+    latency: Latency = Fixed(0.0)
+    error_rate: float = 0.0
+    rate_limit: Optional[float] = None
+    burst: int = 10
+
+
+# rough Letta Cloud figures; tune them to the deployment being modelled
+DEFAULT_PROFILES: Dict[str, EndpointProfile] = {
+    "agents.create": EndpointProfile(LogNormal(0.8, 0.4)),
+    "agents.list": EndpointProfile(LogNormal(0.08)),
+    "agents.modify": EndpointProfile(LogNormal(0.06)),
+    "agents.delete": EndpointProfile(LogNormal(0.15)),
+    "agents.blocks.attach": EndpointProfile(LogNormal(0.06)),
+    "agents.blocks.detach": EndpointProfile(LogNormal(0.06)),
+    "agents.blocks.list": EndpointProfile(LogNormal(0.06)),
+    "agents.blocks.retrieve": EndpointProfile(LogNormal(0.05)),
+    "agents.passages.create": EndpointProfile(LogNormal(0.12)),
+    "agents.passages.list": EndpointProfile(LogNormal(0.08)),
+    "agents.passages.search": EndpointProfile(LogNormal(0.15)),
+    "agents.messages.create_async": EndpointProfile(LogNormal(0.1)),
+    "blocks.create": EndpointProfile(LogNormal(0.06)),
+    "blocks.modify": EndpointProfile(LogNormal(0.06)),
+    "blocks.delete": EndpointProfile(LogNormal(0.06)),
+    "runs.retrieve": EndpointProfile(LogNormal(0.04)),
+}
+
+
+class EmulatedApiError(Exception):
+    """ An error response from the emulator, shaped like letta_client's ApiError """
+
+    def __init__(self, status_code: int, endpoint: str):
+        super().__init__(f"{status_code} from {endpoint}")
+        self.status_code = status_code
+        self.endpoint = endpoint
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class _EmulatedNamespace:
+    def __init__(self, emulator: "LettaEmulator", target: Any, prefix: str):
+        self._emulator = emulator
+        self._target = target
+        self._prefix = prefix
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        endpoint = f"{self._prefix}{name}"
+        if not callable(attr):
+            # a nested namespace such as agents.blocks
+            return _EmulatedNamespace(self._emulator, attr, endpoint + ".")
+        return lambda *args, **kwargs: self._emulator._call(endpoint, attr, args, kwargs)
+
+
+class LettaEmulator:
+    """ A `backend.MemoryBackend` with the latency, errors and rate limits of a remote Letta server
+
+    Requests are served by a LocalLetta (in-memory SQLite unless one is passed in). Each
+    endpoint behaves as its EndpointProfile says; endpoints missing from `profiles` use
+    `default`. Every call is counted, including failed and rejected ones, so a benchmark can
+    report upstream calls per operation.
+
+    Args:
+        backend: The LocalLetta answering requests
+        profiles: Endpoint ("agents.passages.search", ...) -> EndpointProfile
+        time_scale: Multiplier for every sampled latency (0 removes latency, 0.1 runs 10x faster)
+        seed: Seed for latency and error sampling
+    """
+
+    def __init__(
+        self,
+        backend: Optional[LocalLetta] = None,
+        profiles: Mapping[str, EndpointProfile] = DEFAULT_PROFILES,
+        default: EndpointProfile = EndpointProfile(),
+        time_scale: float = 1.0,
+        seed: Optional[int] = 0,
+    ):
+        self.backend = backend or LocalLetta()
+        self.profiles = dict(profiles)
+        self.default = default
+        self.time_scale = time_scale
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._calls: Counter = Counter()
+        self._rejected: Counter = Counter()
+        self._failed: Counter = Counter()
+        self._buckets: Dict[str, _TokenBucket] = {}
+        self._bypass = False
+        self.agents = _EmulatedNamespace(self, self.backend.agents, "agents.")
+        self.blocks = _EmulatedNamespace(self, self.backend.blocks, "blocks.")
+        self.runs = _EmulatedNamespace(self, self.backend.runs, "runs.")
+
+    def profile(self, endpoint: str) -> EndpointProfile:
+        return self.profiles.get(endpoint, self.default)
+
+    @contextmanager
+    def bypassed(self) -> Iterator[None]:
+        """ Serve calls straight from the backend, uncounted, e.g. while a benchmark sets up its data """
+        self._bypass = True
+        try:
+            yield
+        finally:
+            self._bypass = False
+
+    def _call(self, endpoint: str, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> Any:
+        if self._bypass:
+            return fn(*args, **kwargs)
+        profile = self.profile(endpoint)
+        with self._lock:
+            self._calls[endpoint] += 1
+            if profile.rate_limit is not None:
+                bucket = self._buckets.get(endpoint)
+                if bucket is None:
+                    bucket = self._buckets[endpoint] = _TokenBucket(profile.rate_limit, profile.burst)
+                if not bucket.take():
+                    self._rejected[endpoint] += 1
+                    raise EmulatedApiError(429, endpoint)
+            delay = profile.latency.sample(self._rng) * self.time_scale
+            failed = profile.error_rate > 0 and self._rng.random() < profile.error_rate
+            if failed:
+                self._failed[endpoint] += 1
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            raise EmulatedApiError(500, endpoint)
+        return fn(*args, **kwargs)
+
+    def calls(self) -> Dict[str, int]:
+        """ Calls per endpoint since the last reset, including failed and rejected ones """
+        with self._lock:
+            return dict(self._calls)
+
+    def errors(self) -> Dict[str, int]:
+        """ Injected errors per status code since the last reset """
+        with self._lock:
+            return {"429": sum(self._rejected.values()), "500": sum(self._failed.values())}
+
+    def reset_counts(self) -> None:
+        with self._lock:
+            self._calls.clear()
+            self._rejected.clear()
+            self._failed.clear()
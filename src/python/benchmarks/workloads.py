@@ -0,0 +1,202 @@
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from ai_memory_sdk import Memory
+from api.memory_service import MemoryService
+from benchmarks.emulator import DEFAULT_PROFILES, EndpointProfile, LettaEmulator
+
+_TOPICS = ["laptop", "refund", "shipping", "warranty", "invoice", "password", "subscription", "discount"]
+_VERBS = ["asked about", "complained about", "ordered", "cancelled", "updated", "paid for"]
+
+
+class BenchEnv:
+    """ What a workload's setup and operations share: one emulator, and SDK entry points on top of it """
+
+    def __init__(self, emulator: LettaEmulator, users: int, seed: int = 0):
+        self.emulator = emulator
+        self.memory = Memory(backend=emulator)
+        self.service = MemoryService(backend=emulator)
+        self.users = [f"bench-user-{i}" for i in range(users)]
+        self.rng = random.Random(seed)
+
+    def user(self, i: int) -> str:
+        return self.users[i % len(self.users)]
+
+    def sentence(self) -> str:
+        return f"The customer {self.rng.choice(_VERBS)} the {self.rng.choice(_TOPICS)} on order {self.rng.randint(1000, 9999)}."
+
+    def close(self) -> None:
+        self.memory.close()
+        self.service.memory.close()
+        self.emulator.backend.close()
+
+
+class Workload(NamedTuple):
+    name: str
+    description: str
+    setup: Callable[[BenchEnv], None]  # untimed, with the emulator bypassed
+    operation: Callable[[BenchEnv, int], None]  # the i-th timed operation; raising counts as an error
+
+
+def _no_setup(env: BenchEnv) -> None:
+    pass
+
+
+def _onboard(env: BenchEnv, i: int) -> None:
+    env.memory.initialize_user_memory(f"new-user-{i}")
+
+
+def _setup_users(env: BenchEnv) -> None:
+    for user in env.users:
+        env.memory.initialize_user_memory(user, user_context_block_value=env.sentence())
+
+
+def _chat_turn(env: BenchEnv, i: int) -> None:
+    user = env.user(i)
+    env.memory.get_user_memory(user)
+    env.memory.add_messages(user, [
+        {"role": "user", "content": f"Question {i} about my {_TOPICS[i % len(_TOPICS)]}"},
+        {"role": "assistant", "content": f"Answer {i}"},
+    ], skip_vector_storage=False)
+
+
+def _setup_archive(env: BenchEnv, passages: int = 50) -> None:
+    _setup_users(env)
+    for user in env.users:
+        env.memory.add_passages([{"text": env.sentence(), "tags": ["user"]} for _ in range(passages)], subject_id=user)
+
+
+def _search(env: BenchEnv, i: int) -> None:
+    env.memory.search(env.user(i), f"{_TOPICS[i % len(_TOPICS)]} order")
+
+
+def _setup_service_users(env: BenchEnv, passages: int = 50) -> None:
+    for user in env.users:
+        env.service.initialize_user(user, user_info=env.sentence())
+        env.memory.add_passages([{"text": env.sentence(), "tags": ["user"]} for _ in range(passages)], subject_id=user)
+
+
+def _context_fetch(env: BenchEnv, i: int) -> None:
+    response = env.service.get_full_context(current_query=f"{_TOPICS[i % len(_TOPICS)]} order", user_id=env.user(i))
+    if not response["success"]:
+        raise RuntimeError(response["error"])
+    if response["degraded"]:
+        raise RuntimeError(f"degraded: {', '.join(response['degraded'])}")
+
+
+WORKLOADS: Dict[str, Workload] = {w.name: w for w in (
+    Workload("onboarding", "Memory.initialize_user_memory for a new user per operation", _no_setup, _onboard),
+    Workload("chat_turn", "Memory.get_user_memory, then add_messages with archival storage", _setup_users, _chat_turn),
+    Workload("context_fetch", "MemoryService.get_full_context with a search query", _setup_service_users, _context_fetch),
+    Workload("archival_search", "Memory.search over 50 passages per user", _setup_archive, _search),
+)}
+
+
+class WorkloadResult(NamedTuple):
+    workload: str
+    ops: int
+    errors: int
+    concurrency: int
+    duration_s: float
+    throughput_ops_s: float
+    p50_ms: Optional[float]  # latency percentiles of the operations that succeeded
+    p95_ms: Optional[float]
+    p99_ms: Optional[float]
+    mean_ms: Optional[float]
+    upstream_calls_per_op: float  # including calls that failed or were rate limited
+    calls_per_op: Dict[str, float]  # by endpoint
+    error_types: Dict[str, int]
+    injected_errors: Dict[str, int]  # by status code
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """ Linearly interpolated q-th percentile (0-100) of values, None if there are none """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _error_name(error: BaseException) -> str:
+    status = getattr(error, "status_code", None)
+    return f"{type(error).__name__}({status})" if status is not None else type(error).__name__
+
+
+def run_workload(workload: Workload, env: BenchEnv, ops: int, concurrency: int) -> WorkloadResult:
+    """ Set the workload up, then time `ops` operations issued from `concurrency` threads """
+    with env.emulator.bypassed():
+        workload.setup(env)
+    env.emulator.reset_counts()
+
+    def timed(i: int) -> Tuple[float, Optional[str]]:
+        start = time.perf_counter()
+        try:
+            workload.operation(env, i)
+        except Exception as e:
+            return time.perf_counter() - start, _error_name(e)
+        return time.perf_counter() - start, None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as pool:
+        outcomes = list(pool.map(timed, range(ops)))
+    duration = time.perf_counter() - start
+
+    latencies = [elapsed * 1000 for elapsed, error in outcomes if error is None]
+    error_types = Counter(error for _, error in outcomes if error is not None)
+    calls = env.emulator.calls()
+    ms = lambda q: None if not latencies else round(percentile(latencies, q), 3)  # noqa: E731
+    return WorkloadResult(
+        workload=workload.name,
+        ops=ops,
+        errors=sum(error_types.values()),
+        concurrency=concurrency,
+        duration_s=round(duration, 4),
+        throughput_ops_s=round(ops / duration, 2) if duration else 0.0,
+        p50_ms=ms(50),
+        p95_ms=ms(95),
+        p99_ms=ms(99),
+        mean_ms=round(sum(latencies) / len(latencies), 3) if latencies else None,
+        upstream_calls_per_op=round(sum(calls.values()) / ops, 3) if ops else 0.0,
+        calls_per_op={endpoint: round(n / ops, 3) for endpoint, n in sorted(calls.items())},
+        error_types=dict(error_types),
+        injected_errors=env.emulator.errors(),
+    )
+
+
+def profiles_with(error_rate: Optional[float] = None, rate_limit: Optional[float] = None,
+                  profiles: Mapping[str, EndpointProfile] = DEFAULT_PROFILES) -> Dict[str, EndpointProfile]:
+    """ Copy of profiles with the error rate and/or rate limit of every endpoint overridden """
+    changes: Dict[str, Any] = {}
+    if error_rate is not None:
+        changes["error_rate"] = error_rate
+    if rate_limit is not None:
+        changes["rate_limit"] = rate_limit
+    return {endpoint: profile._replace(**changes) for endpoint, profile in profiles.items()}
+
+
+def run_benchmarks(
+    names: Sequence[str],
+    ops: int = 100,
+    concurrency: int = 8,
+    users: int = 20,
+    time_scale: float = 1.0,
+    error_rate: Optional[float] = None,
+    rate_limit: Optional[float] = None,
+    seed: int = 0,
+) -> List[WorkloadResult]:
+    """ Run each named workload against a fresh emulator """
+    profiles = profiles_with(error_rate, rate_limit)
+    results = []
+    for name in names:
+        env = BenchEnv(LettaEmulator(profiles=profiles, time_scale=time_scale, seed=seed), users=users, seed=seed)
+        try:
+            results.append(run_workload(WORKLOADS[name], env, ops, concurrency))
+        finally:
+            env.close()
+    return results
@@ -0,0 +1,166 @@
+import atexit
+import logging
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BufferPolicy(NamedTuple):
+    """ When a per-subject message buffer is flushed into a single sleeptime run
+
+    A buffer flushes as soon as any limit is reached: `max_messages` queued messages,
+    `max_chars` characters of message content, or `flush_interval` seconds since the oldest
+    queued message. Everything left is flushed on `Memory.close()` and at interpreter exit. A
+    buffer garbage collected without being closed only logs what it still held: a finalizer
+    cannot safely make network calls.
+    """
+    max_messages: int = 20
+    max_chars: int = 20000
+    flush_interval: Optional[float] = 30.0
+
+
+class _Pending:
+    __slots__ = ("messages", "chars", "since")
+
+    def __init__(self):
+        self.messages: List[Dict[str, Any]] = []
+        self.chars = 0
+        self.since = time.monotonic()
+
+
+# buffers not closed yet, flushed at interpreter exit; weak, so dropped buffers are not kept alive
+_open_buffers: "weakref.WeakSet[MessageBuffer]" = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_buffers() -> None:
+    for buffer in list(_open_buffers):
+        buffer.close()
+
+
+def _run_timer(ref: "weakref.ReferenceType[MessageBuffer]", wakeup: threading.Event, interval: float) -> None:
+    """ Interval flushes; holds the buffer only while flushing, and stops once it is closed or collected """
+    tick = max(0.01, min(1.0, interval / 4))
+    while not wakeup.wait(tick):
+        buffer = ref()
+        if buffer is None:
+            return
+        try:
+            buffer.flush(older_than=interval)
+        except Exception:
+            logger.exception("Interval flush of buffered messages failed; will retry")
+        finally:
+            buffer = None
+
+
+class MessageBuffer:
+    """ Write-behind buffer that coalesces messages per key and hands them to `flush_fn` in batches
+
+    `flush_fn(key, messages)` is called with everything queued for a key, in arrival order.
+    Flushes are serialized so batches for the same key are submitted in order.
+    """
+
+    def __init__(self, policy: BufferPolicy, flush_fn: Callable[[Hashable, List[Dict[str, Any]]], Any]):
+        self.policy = policy
+        self._flush_fn = flush_fn
+        self._pending: Dict[Hashable, _Pending] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._timer: Optional[threading.Thread] = None
+        self._closed = False
+        _open_buffers.add(self)
+
+    def add(self, key: Hashable, messages: List[Dict[str, Any]]) -> Optional[Any]:
+        """ Queue messages; returns flush_fn's result if this call triggered a flush, else None """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MessageBuffer is closed")
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = _Pending()
+            pending.messages.extend(messages)
+            pending.chars += sum(len(m.get("content") or "") for m in messages)
+            full = len(pending.messages) >= self.policy.max_messages or pending.chars >= self.policy.max_chars
+            self._ensure_timer()
+        if full:
+            return self.flush(key).get(key)
+        return None
+
+    def pending_count(self, key: Optional[Hashable] = None) -> int:
+        with self._lock:
+            if key is not None:
+                pending = self._pending.get(key)
+                return len(pending.messages) if pending else 0
+            return sum(len(p.messages) for p in self._pending.values())
+
+    def flush(self, key: Optional[Hashable] = None, older_than: Optional[float] = None) -> Dict[Hashable, Any]:
+        """ Flush one key (or every key), optionally only buffers older than `older_than` seconds """
+        results: Dict[Hashable, Any] = {}
+        with self._flush_lock:
+            with self._lock:
+                now = time.monotonic()
+                keys = [key] if key is not None else list(self._pending)
+                batches = []
+                for k in keys:
+                    pending = self._pending.get(k)
+                    if pending is None or (older_than is not None and now - pending.since < older_than):
+                        continue
+                    del self._pending[k]
+                    batches.append((k, pending))
+            error: Optional[Exception] = None
+            for k, pending in batches:
+                try:
+                    results[k] = self._flush_fn(k, pending.messages)
+                except Exception as e:
+                    self._requeue(k, pending)
+                    error = error or e
+        if error is not None:
+            raise error
+        return results
+
+    def close(self) -> None:
+        """ Flush everything still buffered and stop the interval timer """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wakeup.set()
+        _open_buffers.discard(self)
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Failed to flush buffered messages on close")
+
+    def _requeue(self, key: Hashable, pending: _Pending) -> None:
+        """ Put a failed batch back in front of anything queued since """
+        with self._lock:
+            newer = self._pending.get(key)
+            if newer is not None:
+                pending.messages.extend(newer.messages)
+                pending.chars += newer.chars
+            self._pending[key] = pending
+
+    def _ensure_timer(self) -> None:
+        if self.policy.flush_interval is None or (self._timer is not None and self._timer.is_alive()):
+            return
+        self._timer = threading.Thread(
+            target=_run_timer,
+            args=(weakref.ref(self), self._wakeup, self.policy.flush_interval),
+            name="ai-memory-sdk-buffer",
+            daemon=True,
+        )
+        self._timer.start()
+
+    def __del__(self) -> None:
+        # dropped without close(): stop the timer, but never flush from a finalizer, where the
+        # Letta client (or the interpreter) may already be torn down
+        if self._closed:
+            return
+        self._wakeup.set()
+        unsent = sum(len(p.messages) for p in list(self._pending.values()))
+        if unsent:
+            logger.warning("MessageBuffer was garbage collected without close(); %d buffered messages were not sent", unsent)
@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    size: int
+
+
+class TTLCache:
+    """ A small thread-safe LRU cache whose entries expire after `ttl` seconds
+
+    A `maxsize` of 0 disables the cache (every lookup misses and nothing is stored).
+    A `ttl` of None keeps entries until they are evicted or invalidated.
+    Lookups are counted as hits or misses (see `stats`).
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """ Return the cached value for key, or default if missing/expired """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """ Store a value, evicting the least recently used entry when full """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """ Drop a single key if present """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def pop_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """ Drop every entry for which predicate(key, value) is true. Returns the number dropped. """
+        with self._lock:
+            stale = [k for k, (v, _) in self._data.items() if predicate(k, v)]
+            for k in stale:
+                del self._data[k]
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self.hits, self.misses, len(self._data))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class CachedBlock(NamedTuple):
+    """ Snapshot of a memory block as last read from Letta """
+    id: Optional[str]
+    label: str
+    value: Optional[str]
+    description: Optional[str]
+    limit: Optional[int]
+
+
+class BlockCache:
+    """ Versioned read cache for memory blocks, keyed by (agent_id, label)
+
+    Every invalidation bumps the agent's version. A reader captures the version before
+    going upstream and passes it to `put`; if an invalidation happened in between, the
+    (possibly stale) result is discarded instead of overwriting fresher state.
+    A cached value of None records that the label was absent when last listed.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Optional[CachedBlock], float]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def version(self, agent_id: str) -> int:
+        with self._lock:
+            return self._versions.get(agent_id, 0)
+
+    def get(self, agent_id: str, label: str, max_staleness: float) -> Tuple[bool, Optional[CachedBlock]]:
+        """ Return (hit, block) for an entry fetched at most `max_staleness` seconds ago """
+        with self._lock:
+            entry = self._entries.get((agent_id, label))
+            if entry is None:
+                return False, None
+            block, fetched_at = entry
+            if time.monotonic() - fetched_at > max_staleness:
+                return False, None
+            self._entries.move_to_end((agent_id, label))
+            return True, block
+
+    def put(self, agent_id: str, label: str, block: Optional[CachedBlock], version: int) -> bool:
+        """ Store a block read under `version`. Returns False if the agent was invalidated since. """
+        if self.maxsize <= 0:
+            return False
+        with self._lock:
+            if self._versions.get(agent_id, 0) != version:
+                return False
+            self._entries[(agent_id, label)] = (block, time.monotonic())
+            self._entries.move_to_end((agent_id, label))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(self, agent_id: str, label: Optional[str] = None) -> None:
+        """ Drop one label (or every label) for an agent and bump its version """
+        with self._lock:
+            self._versions[agent_id] = self._versions.get(agent_id, 0) + 1
+            if label is not None:
+                self._entries.pop((agent_id, label), None)
+                return
+            for key in [k for k in self._entries if k[0] == agent_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            for agent_id in self._versions:
+                self._versions[agent_id] += 1
+            self._entries.clear()
@@ -0,0 +1,155 @@
+import contextvars
+import functools
+import inspect
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# calls made outside any public Memory method: background threads (run polling, message buffer,
+# agent pool) or callers using the client directly, such as MemoryService
+OTHER = "(other)"
+
+# public Memory method the current call stack (or task) started from
+_operation: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("ai_memory_sdk_operation", default=None)
+# (accounting, counter) of every track_calls() block open in the current context
+_scopes: "contextvars.ContextVar[Tuple[Tuple[CallAccounting, CallCounter], ...]]" = contextvars.ContextVar(
+    "ai_memory_sdk_call_scopes", default=()
+)
+
+
+class CallStats(NamedTuple):
+    """ Upstream call counts, from Memory.stats() or a Memory.track_calls() block """
+    total: int
+    by_endpoint: Dict[str, int]  # "agents.passages.search" -> calls
+    by_operation: Dict[str, Dict[str, int]]  # public method -> endpoint -> calls
+
+    def calls(self, operation: Optional[str] = None, endpoint: Optional[str] = None) -> int:
+        """ Calls made by one public method and/or to one endpoint """
+        if operation is not None:
+            counts = self.by_operation.get(operation, {})
+            return counts.get(endpoint, 0) if endpoint is not None else sum(counts.values())
+        return self.by_endpoint.get(endpoint, 0) if endpoint is not None else self.total
+
+
+class CallCounter:
+    """ Thread-safe upstream call counts keyed by (operation, endpoint) """
+
+    def __init__(self):
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, operation: str, endpoint: str) -> None:
+        with self._lock:
+            self._counts[(operation, endpoint)] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+    @property
+    def total(self) -> int:
+        with self._lock:
+            return sum(self._counts.values())
+
+    def stats(self) -> CallStats:
+        with self._lock:
+            counts: List[Tuple[Tuple[str, str], int]] = sorted(self._counts.items())
+        by_endpoint: Counter = Counter()
+        by_operation: Dict[str, Dict[str, int]] = {}
+        for (operation, endpoint), n in counts:
+            by_endpoint[endpoint] += n
+            by_operation.setdefault(operation, {})[endpoint] = n
+        return CallStats(sum(by_endpoint.values()), dict(sorted(by_endpoint.items())), by_operation)
+
+
+class CallAccounting:
+    """ Counts every upstream call of one Memory instance, in total and for each open scope
+
+    A scope only sees calls made in the context that opened it (its thread or task, and work
+    that context submits through a ContextThreadPoolExecutor or to child tasks), so concurrent
+    requests on a shared instance do not inflate each other's counts.
+    """
+
+    def __init__(self):
+        self.totals = CallCounter()
+
+    def record(self, endpoint: str) -> None:
+        operation = _operation.get() or OTHER
+        self.totals.add(operation, endpoint)
+        for owner, counter in _scopes.get():
+            if owner is self:
+                counter.add(operation, endpoint)
+
+    @contextmanager
+    def scope(self) -> Iterator[CallCounter]:
+        counter = CallCounter()
+        token = _scopes.set(_scopes.get() + ((self, counter),))
+        try:
+            yield counter
+        finally:
+            _scopes.reset(token)
+
+
+class CountedClient:
+    """ View of a Letta client that records each endpoint call before making it
+
+    Attributes are looked up on `root()` at call time, so the view follows a replaced client
+    and patched methods.
+    """
+
+    def __init__(self, root: Callable[[], Any], accounting: CallAccounting, path: str = ""):
+        self._root = root
+        self._accounting = accounting
+        self._path = path
+
+    def __getattr__(self, name: str) -> Any:
+        endpoint = f"{self._path}{name}"
+        target = functools.reduce(getattr, endpoint.split("."), self._root())
+        if not callable(target):
+            # a namespace such as agents or agents.passages
+            return CountedClient(self._root, self._accounting, endpoint + ".")
+
+        def call(*args: Any, **kwargs: Any) -> Any:
+            self._accounting.record(endpoint)
+            return target(*args, **kwargs)
+        return call
+
+
+def tracks_operation(name: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+    """ Wrap a public method so upstream calls made under it are attributed to `name`
+
+    Nested public calls keep the outermost name: the calls initialize_memory makes through
+    _ensure_subject count for initialize_memory.
+    """
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _operation.get() is not None:
+                return await fn(*args, **kwargs)
+            token = _operation.set(name)
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                _operation.reset(token)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if _operation.get() is not None:
+            return fn(*args, **kwargs)
+        token = _operation.set(name)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _operation.reset(token)
+    return wrapper
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """ ThreadPoolExecutor running each task in a copy of the submitter's context, so work fanned
+    out by a public method is still attributed to it """
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
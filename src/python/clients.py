@@ -0,0 +1,98 @@
+import asyncio
+import importlib.util
+import threading
+import weakref
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+import httpx
+
+
+class ClientOptions(NamedTuple):
+    """ Connection pool and timeout settings for a shared Letta client """
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0  # seconds an idle connection is kept open
+    http2: bool = True  # only used when the h2 package is installed
+    timeout: float = 60.0  # default per-request timeout in seconds
+    connect_timeout: float = 10.0
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+def _http_client(http_client_class: Callable[..., Any], options: ClientOptions) -> Any:
+    return http_client_class(
+        limits=httpx.Limits(
+            max_connections=options.max_connections,
+            max_keepalive_connections=options.max_keepalive_connections,
+            keepalive_expiry=options.keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(options.timeout, connect=options.connect_timeout),
+        http2=options.http2 and http2_available(),
+        follow_redirects=True,
+    )
+
+
+class ClientRegistry:
+    """ Process-wide Letta clients, one per (client class, base_url, token, options)
+
+    Memory instances pointing at the same server with the same credentials share a client and
+    with it a warm connection pool, so only the first one pays for the TLS handshake. Async
+    clients are additionally scoped to the event loop they are created in, because an
+    httpx.AsyncClient cannot be used across loops.
+    """
+
+    def __init__(self):
+        self._clients: Dict[Tuple, Tuple[Any, Any]] = {}
+        self._loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple, Tuple[Any, Any]]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def create(
+        factory: Callable[..., Any],
+        http_client_class: Callable[..., Any],
+        base_url: Optional[str] = None,
+        token: Optional[str] = None,
+        options: ClientOptions = ClientOptions(),
+    ) -> Tuple[Any, Any]:
+        """ A new (Letta client, http client) pair with the given pool settings """
+        http_client = _http_client(http_client_class, options)
+        kwargs = {"base_url": base_url} if base_url else {}
+        if token:
+            kwargs["token"] = token
+        return factory(httpx_client=http_client, timeout=options.timeout, **kwargs), http_client
+
+    def get(
+        self,
+        factory: Callable[..., Any],
+        http_client_class: Callable[..., Any],
+        base_url: Optional[str] = None,
+        token: Optional[str] = None,
+        options: ClientOptions = ClientOptions(),
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> Any:
+        """ The shared client for these settings, created on first use """
+        key = (factory, base_url, token, options)
+        with self._lock:
+            clients = self._clients if loop is None else self._loop_clients.setdefault(loop, {})
+            entry = clients.get(key)
+            if entry is None:
+                entry = clients[key] = self.create(factory, http_client_class, base_url, token, options)
+            return entry[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._clients) + sum(len(c) for c in self._loop_clients.values())
+
+    def close(self) -> None:
+        """ Close every shared sync client (async clients are released with their event loop) """
+        with self._lock:
+            entries, self._clients = list(self._clients.values()), {}
+        for _, http_client in entries:
+            http_client.close()
+
+
+shared_clients = ClientRegistry()
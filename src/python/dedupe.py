@@ -0,0 +1,103 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import unicodedata
+from typing import Iterable, List, Optional, Tuple, Union
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """ Canonical form used for fingerprinting: NFKC, case-folded, whitespace collapsed """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip().casefold()
+
+
+# a passage's text, or (text, tags): the same text under other tags (e.g. role) is another passage
+PassageKey = Union[str, Tuple[str, Optional[Iterable[str]]]]
+
+
+def fingerprint(text: str, tags: Optional[Iterable[str]] = None) -> str:
+    key = normalize_text(text)
+    if tags:
+        key += "\x00" + "\x1f".join(sorted(set(tags)))
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _split(passage: PassageKey) -> Tuple[str, Optional[Iterable[str]]]:
+    return (passage, None) if isinstance(passage, str) else passage
+
+
+def _fingerprint(passage: PassageKey) -> str:
+    return fingerprint(*_split(passage))
+
+
+class PassageDedupe:
+    """ Persistent per-agent set of archival passage fingerprints, stored in SQLite
+
+    Memory claims a fingerprint before writing a passage and skips passages whose fingerprint
+    was already claimed, so identical text (after normalization) with the same tags is embedded
+    once per subject. Tags are part of the fingerprint: a "user" and an "assistant" message with
+    the same text are both stored.
+    Fingerprints of failed writes are released again. With `seed_existing=True` the passages
+    an agent already has are fingerprinted the first time it is written to.
+
+    Args:
+        path: SQLite database file (":memory:" keeps fingerprints for this process only)
+        seed_existing: Scan an agent's existing passages before its first deduplicated write
+    """
+
+    def __init__(self, path: str = ":memory:", seed_existing: bool = False):
+        self.path = path
+        self.seed_existing = seed_existing
+        self.skipped = 0  # passages skipped as duplicates since this store was opened
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints (agent_id TEXT, fp TEXT, PRIMARY KEY (agent_id, fp)) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS seeded (agent_id TEXT PRIMARY KEY)")
+
+    def needs_seed(self, agent_id: str) -> bool:
+        if not self.seed_existing:
+            return False
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM seeded WHERE agent_id = ?", (agent_id,)).fetchone()
+        return row is None
+
+    def seed(self, agent_id: str, passages: Iterable[PassageKey]) -> None:
+        """ Record fingerprints of passages the agent already has """
+        rows = ((agent_id, _fingerprint(p)) for p in passages if _split(p)[0])
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO fingerprints VALUES (?, ?)", rows)
+            self._conn.execute("INSERT OR IGNORE INTO seeded VALUES (?)", (agent_id,))
+
+    def claim(self, agent_id: str, passages: List[PassageKey]) -> List[bool]:
+        """ Claim each passage's fingerprint; False means it is a duplicate (also within `passages`) """
+        claimed = []
+        with self._lock, self._conn:
+            for passage in passages:
+                cursor = self._conn.execute("INSERT OR IGNORE INTO fingerprints VALUES (?, ?)", (agent_id, _fingerprint(passage)))
+                claimed.append(cursor.rowcount == 1)
+            self.skipped += claimed.count(False)
+        return claimed
+
+    def release(self, agent_id: str, passages: List[PassageKey]) -> None:
+        """ Forget fingerprints whose passages failed to store, so a retry is not skipped """
+        if not passages:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM fingerprints WHERE agent_id = ? AND fp = ?", ((agent_id, _fingerprint(p)) for p in passages)
+            )
+
+    def forget(self, agent_id: str) -> None:
+        """ Drop everything recorded for a deleted agent """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM fingerprints WHERE agent_id = ?", (agent_id,))
+            self._conn.execute("DELETE FROM seeded WHERE agent_id = ?", (agent_id,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,144 @@
+import fnmatch
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional
+
+from schemas import File
+
+MANIFEST_PREFIX = ".ai_memory_sync"
+hash_chunk_size = 1 << 20  # bytes read per hashing step
+
+
+class SyncPlan(NamedTuple):
+    """ What sync_directory has to do, relative to the manifest """
+    changed: List[File]  # new or modified files to (re-)ingest; entries carry the new hash, label is the relative path
+    touched: List[File]  # size/mtime changed but content did not; only the manifest is updated
+    unchanged: List[str]
+    removed: List[str]
+
+
+class SyncResult(NamedTuple):
+    """ Outcome of Memory.sync_directory; paths are relative to the synced directory """
+    ingested: List[str]
+    unchanged: List[str]
+    removed: List[str]
+    run_ids: Dict[str, Optional[str]]  # ingested path -> run id standing for all of its parts
+
+
+def default_manifest_path(root: str, subject_id: str) -> str:
+    """ Manifest kept inside the synced directory, one per subject """
+    return os.path.join(root, f"{MANIFEST_PREFIX}.{subject_id}.json")
+
+
+def hash_file(path: str) -> str:
+    """ sha256 of a file, read in fixed-size chunks """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(hash_chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_files(paths: List[str], max_workers: Optional[int] = None) -> List[str]:
+    """ Hash files in a thread pool (inline for a single file or max_workers=1)
+
+    Threads rather than processes: file reads and sha256 over large buffers release the GIL, and
+    forking a process that runs the SDK's background threads can deadlock the child.
+    """
+    if len(paths) < 2 or max_workers == 1:
+        return [hash_file(p) for p in paths]
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-memory-sdk-hash") as pool:
+        return list(pool.map(hash_file, paths))
+
+
+def load_manifest(manifest_path: str) -> Dict[str, File]:
+    """ Relative path -> File entry, empty if the manifest does not exist yet """
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    return {rel: File.model_validate(entry) for rel, entry in entries.items()}
+
+
+def save_manifest(manifest_path: str, manifest: Dict[str, File]) -> None:
+    """ Write the manifest atomically so an interrupted sync never leaves it truncated """
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({rel: entry.model_dump(mode="json") for rel, entry in sorted(manifest.items())}, f, indent=1)
+    os.replace(tmp_path, manifest_path)
+
+
+def _mtime(stat: os.stat_result) -> datetime:
+    return datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+
+
+def scan_directory(root: str, pattern: str = "*", exclude: Optional[List[str]] = None) -> Dict[str, os.stat_result]:
+    """ Relative path -> stat for every regular file under root whose name matches pattern """
+    excluded = {os.path.abspath(p) for p in (exclude or [])}
+    found = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if name.startswith(".") or not fnmatch.fnmatch(name, pattern) or os.path.abspath(path) in excluded:
+                continue
+            stat = os.stat(path)
+            found[os.path.relpath(path, root)] = stat
+    return found
+
+
+def plan_sync(
+    root: str,
+    manifest: Dict[str, File],
+    agent_id: str,
+    description: str = "",
+    pattern: str = "*",
+    exclude: Optional[List[str]] = None,
+    max_workers: Optional[int] = None,
+) -> SyncPlan:
+    """ Compare the directory with the manifest, hashing only files whose size or mtime changed """
+    current = scan_directory(root, pattern=pattern, exclude=exclude)
+    unchanged, candidates = [], []
+    for rel, stat in sorted(current.items()):
+        entry = manifest.get(rel)
+        if (
+            entry is not None and entry.processed and entry.agent_id == agent_id
+            and entry.size == stat.st_size and entry.last_modified == _mtime(stat)
+        ):
+            unchanged.append(rel)
+        else:
+            candidates.append(rel)
+
+    hashes = hash_files([os.path.join(root, rel) for rel in candidates], max_workers=max_workers)
+    next_id = max((e.id for e in manifest.values()), default=0) + 1
+    now = datetime.now(timezone.utc)
+    changed, touched = [], []
+    for rel, file_hash in zip(candidates, hashes):
+        stat = current[rel]
+        entry = manifest.get(rel)
+        same_content = entry is not None and entry.processed and entry.agent_id == agent_id and entry.file_hash == file_hash
+        if entry is None:
+            entry = File(
+                id=next_id, agent_id=agent_id, file_path=os.path.join(root, rel), file_hash=file_hash,
+                size=stat.st_size, last_modified=_mtime(stat), processed=False,
+                label=rel, description=description, registered_at=now,
+            )
+            next_id += 1
+        else:
+            entry = entry.model_copy(update={
+                "agent_id": agent_id, "file_path": os.path.join(root, rel), "file_hash": file_hash,
+                "size": stat.st_size, "last_modified": _mtime(stat), "processed": same_content,
+                "label": rel, "description": description,
+            })
+        (touched if same_content else changed).append(entry)
+
+    removed = sorted(rel for rel in manifest if rel not in current)
+    return SyncPlan(changed=changed, touched=touched, unchanged=unchanged, removed=removed)
+
+
+def mark_processed(entry: File) -> File:
+    """ Copy of a manifest entry recording that it was just ingested """
+    return entry.model_copy(update={"processed": True, "processed_at": datetime.now(timezone.utc)})
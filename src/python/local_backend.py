@@ -0,0 +1,660 @@
+import asyncio
+import functools
+import json
+import math
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+
+_TOKEN = re.compile(r"\w+")
+
+# learner(backend, agent_id, messages): what a run does with the messages it was given
+Learner = Callable[["LocalLetta", str, List[Dict[str, Any]]], None]
+
+
+class NotFoundError(LookupError):
+    """ Raised for an agent, block or run id (or block label) the local backend does not have """
+
+
+class LocalBlock(NamedTuple):
+    id: str
+    label: str
+    value: str
+    limit: Optional[int]
+    description: Optional[str]
+
+
+class LocalMemory(NamedTuple):
+    blocks: List[LocalBlock]
+
+
+class LocalAgent(NamedTuple):
+    id: str
+    name: str
+    tags: List[str]
+    created_at: datetime
+    memory: LocalMemory
+
+
+class LocalPassage(NamedTuple):
+    id: str
+    text: str
+    tags: List[str]
+    created_at: datetime
+
+
+class LocalRun(NamedTuple):
+    id: str
+    agent_id: str
+    status: str  # created -> running -> completed | failed
+    created_at: datetime
+    completed_at: Optional[datetime]
+    error: Optional[str]
+
+
+class LocalSearchResult(NamedTuple):
+    content: str
+    timestamp: str
+    tags: List[str]
+    score: float
+
+
+class LocalSearchResponse(NamedTuple):
+    results: List[LocalSearchResult]
+    count: int
+
+
+def _new_id(kind: str) -> str:
+    return f"{kind}-{uuid.uuid4()}"
+
+
+def _datetime(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+def _timestamp(value: Union[datetime, str, None]) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN.findall(text.casefold())
+
+
+def _message_dict(message: Any) -> Dict[str, Any]:
+    if isinstance(message, dict):
+        return dict(message)
+    if hasattr(message, "model_dump"):
+        return message.model_dump()
+    return {"role": getattr(message, "role", None), "content": getattr(message, "content", None)}
+
+
+class _Bm25Index:
+    """ In-memory BM25 postings for one agent's passages, kept in step with the passages table """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.docs: List[Tuple[LocalPassage, int]] = []  # (passage, token count)
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}  # term -> [(doc, term frequency)]
+        self.total_len = 0
+        self.last_seq = 0  # passages.seq of the newest passage indexed
+
+    def add(self, passage: LocalPassage, seq: int) -> None:
+        self.last_seq = max(self.last_seq, seq)
+        tokens = _tokens(passage.text)
+        doc = len(self.docs)
+        self.docs.append((passage, len(tokens)))
+        self.total_len += len(tokens)
+        for term, tf in Counter(tokens).items():
+            self.postings.setdefault(term, []).append((doc, tf))
+
+    def search(self, query: str, accepts: Callable[[LocalPassage], bool], k: int) -> List[Tuple[LocalPassage, float]]:
+        n = len(self.docs)
+        if not n:
+            return []
+        avg_len = self.total_len / n or 1.0
+        scores: Dict[int, float] = {}
+        for term in set(_tokens(query)):
+            postings = self.postings.get(term, ())
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc, tf in postings:
+                length = self.docs[doc][1]
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_len)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (self.k1 + 1) / norm
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        hits = []
+        for doc, score in ranked:
+            passage = self.docs[doc][0]
+            if accepts(passage):
+                hits.append((passage, score))
+                if len(hits) == k:
+                    break
+        return hits
+
+
+class _Namespace:
+    def __init__(self, backend: "LocalLetta"):
+        self._backend = backend
+
+
+class _AgentBlocks(_Namespace):
+    def attach(self, agent_id: str, block_id: str, **_options: Any) -> LocalAgent:
+        return self._backend._attach_block(agent_id, block_id)
+
+    def detach(self, agent_id: str, block_id: str, **_options: Any) -> LocalAgent:
+        return self._backend._detach_block(agent_id, block_id)
+
+    def list(self, agent_id: str, **_options: Any) -> List[LocalBlock]:
+        return self._backend._agent_blocks(agent_id)
+
+    def retrieve(self, agent_id: str, block_label: str, **_options: Any) -> LocalBlock:
+        for block in self._backend._agent_blocks(agent_id):
+            if block.label == block_label:
+                return block
+        raise NotFoundError(f"Agent {agent_id} has no block labeled {block_label!r}")
+
+
+class _AgentPassages(_Namespace):
+    def create(self, agent_id: str, text: str, tags: Optional[Sequence[str]] = None, **_options: Any) -> List[LocalPassage]:
+        return [self._backend._create_passage(agent_id, text, tags)]
+
+    def list(self, agent_id: str, after: Optional[str] = None, limit: Optional[int] = None, **_options: Any) -> List[LocalPassage]:
+        return self._backend._list_passages(agent_id, after, limit)
+
+    def search(
+        self,
+        agent_id: str,
+        query: str,
+        tags: Optional[Sequence[str]] = None,
+        tag_match_mode: Optional[str] = None,
+        top_k: Optional[int] = None,
+        start_datetime: Union[datetime, str, None] = None,
+        end_datetime: Union[datetime, str, None] = None,
+        **_options: Any,
+    ) -> LocalSearchResponse:
+        return self._backend._search(agent_id, query, tags, tag_match_mode, top_k, start_datetime, end_datetime)
+
+
+class _AgentMessages(_Namespace):
+    def create_async(self, agent_id: str, messages: Sequence[Any], **_options: Any) -> LocalRun:
+        return self._backend._start_run(agent_id, [_message_dict(m) for m in messages])
+
+
+class _Agents(_Namespace):
+    def __init__(self, backend: "LocalLetta"):
+        super().__init__(backend)
+        self.blocks = _AgentBlocks(backend)
+        self.passages = _AgentPassages(backend)
+        self.messages = _AgentMessages(backend)
+
+    def create(
+        self,
+        name: Optional[str] = None,
+        tags: Optional[Sequence[str]] = None,
+        memory_blocks: Optional[Sequence[Dict[str, Any]]] = None,
+        **_options: Any,
+    ) -> LocalAgent:
+        return self._backend._create_agent(name, tags, memory_blocks)
+
+    def list(
+        self,
+        tags: Optional[Sequence[str]] = None,
+        match_all_tags: Optional[bool] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        **_options: Any,
+    ) -> List[LocalAgent]:
+        return self._backend._list_agents(tags, bool(match_all_tags), after, limit)
+
+    def retrieve(self, agent_id: str, **_options: Any) -> LocalAgent:
+        return self._backend._agent(agent_id)
+
+    def modify(self, agent_id: str, name: Optional[str] = None, tags: Optional[Sequence[str]] = None, **_options: Any) -> LocalAgent:
+        return self._backend._modify_agent(agent_id, name, tags)
+
+    def delete(self, agent_id: str, **_options: Any) -> None:
+        self._backend._delete_agent(agent_id)
+
+
+class _Blocks(_Namespace):
+    def create(self, label: str, value: str = "", limit: Optional[int] = None, description: Optional[str] = None,
+               **_options: Any) -> LocalBlock:
+        return self._backend._create_block(label, value, limit, description)
+
+    def retrieve(self, block_id: str, **_options: Any) -> LocalBlock:
+        return self._backend._block(block_id)
+
+    def modify(self, block_id: str, value: Optional[str] = None, limit: Optional[int] = None,
+               description: Optional[str] = None, label: Optional[str] = None, **_options: Any) -> LocalBlock:
+        return self._backend._modify_block(block_id, value, limit, description, label)
+
+    def delete(self, block_id: str, **_options: Any) -> None:
+        self._backend._delete_block(block_id)
+
+
+class _Runs(_Namespace):
+    def retrieve(self, run_id: str, **_options: Any) -> LocalRun:
+        return self._backend._run(run_id)
+
+
+class LocalLetta:
+    """ In-process stand-in for a Letta server: SQLite storage, BM25 search and a pluggable learner
+
+    Implements the `backend.MemoryBackend` surface, so `Memory(backend=LocalLetta("memory.db"))`
+    runs without a Letta server, for integration tests or on-prem deployments. Agents, blocks,
+    passages, messages and runs live in SQLite (WAL mode, so processes can share a file).
+    Archival search ranks an agent's passages with BM25 from postings kept in memory, brought
+    up to date with passages other processes wrote before each search.
+
+    A run (`agents.messages.create_async`) calls `learner(backend, agent_id, messages)` on a
+    worker thread; runs of one agent execute in submission order. The default learner only
+    records the messages, so runs complete without changing memory; pass a function that edits
+    blocks through this backend to simulate a sleeptime agent.
+
+    Args:
+        path: SQLite database file (":memory:" keeps everything in this process)
+        learner: What each run does with its messages (None: nothing)
+        workers: Threads executing runs
+    """
+
+    def __init__(self, path: str = ":memory:", learner: Optional[Learner] = None, workers: int = 4,
+                 busy_timeout: float = 5.0):
+        self.path = path
+        self.learner = learner
+        self.agents = _Agents(self)
+        self.blocks = _Blocks(self)
+        self.runs = _Runs(self)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS agents (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE NOT NULL, name TEXT, created_at REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS agent_tags (agent_id TEXT, tag TEXT, PRIMARY KEY (agent_id, tag));
+                CREATE INDEX IF NOT EXISTS agent_tags_tag ON agent_tags (tag);
+                CREATE TABLE IF NOT EXISTS blocks (
+                    id TEXT PRIMARY KEY, label TEXT, value TEXT NOT NULL, "limit" INTEGER, description TEXT);
+                CREATE TABLE IF NOT EXISTS agent_blocks (
+                    agent_id TEXT, block_id TEXT, position INTEGER, PRIMARY KEY (agent_id, block_id));
+                CREATE TABLE IF NOT EXISTS passages (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE NOT NULL, agent_id TEXT NOT NULL,
+                    text TEXT NOT NULL, tags TEXT NOT NULL, created_at REAL NOT NULL);
+                CREATE INDEX IF NOT EXISTS passages_agent ON passages (agent_id, seq);
+                CREATE TABLE IF NOT EXISTS messages (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT, agent_id TEXT NOT NULL, run_id TEXT NOT NULL,
+                    role TEXT, content TEXT, created_at REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS runs (
+                    id TEXT PRIMARY KEY, agent_id TEXT NOT NULL, status TEXT NOT NULL, created_at REAL NOT NULL,
+                    completed_at REAL, error TEXT);
+                """
+            )
+        self._search_indexes: Dict[str, _Bm25Index] = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="local-letta-run")
+        self._queued: Dict[str, Deque[Tuple[str, List[Dict[str, Any]]]]] = {}
+        self._draining: Set[str] = set()
+        self._idle = threading.Condition()
+        self._active = 0
+        self._closed = False
+
+    # ----- agents -----
+
+    def _agent_row(self, row: Tuple[str, str, float]) -> LocalAgent:
+        agent_id, name, created_at = row
+        tags = [t for (t,) in self._conn.execute("SELECT tag FROM agent_tags WHERE agent_id = ? ORDER BY rowid", (agent_id,))]
+        return LocalAgent(agent_id, name, tags, _datetime(created_at), LocalMemory(self._agent_blocks(agent_id)))
+
+    def _agent(self, agent_id: str) -> LocalAgent:
+        with self._lock:
+            row = self._conn.execute("SELECT id, name, created_at FROM agents WHERE id = ?", (agent_id,)).fetchone()
+            if row is None:
+                raise NotFoundError(f"Agent {agent_id} not found")
+            return self._agent_row(row)
+
+    def _create_agent(self, name: Optional[str], tags: Optional[Sequence[str]],
+                      memory_blocks: Optional[Sequence[Dict[str, Any]]]) -> LocalAgent:
+        agent_id = _new_id("agent")
+        with self._lock:
+            with self._conn:
+                self._conn.execute("INSERT INTO agents (id, name, created_at) VALUES (?, ?, ?)",
+                                   (agent_id, name or agent_id, time.time()))
+                self._conn.executemany("INSERT OR IGNORE INTO agent_tags VALUES (?, ?)", ((agent_id, t) for t in tags or ()))
+            for spec in memory_blocks or ():
+                block = self._create_block(spec["label"], spec.get("value") or "", spec.get("limit"), spec.get("description"))
+                self._attach_block(agent_id, block.id)
+            return self._agent(agent_id)
+
+    def _list_agents(self, tags: Optional[Sequence[str]], match_all_tags: bool, after: Optional[str],
+                     limit: Optional[int]) -> List[LocalAgent]:
+        sql, params = "SELECT id, name, created_at FROM agents a WHERE 1", []
+        if tags:
+            marks = ",".join("?" * len(tags))
+            sql += f" AND (SELECT COUNT(*) FROM agent_tags t WHERE t.agent_id = a.id AND t.tag IN ({marks})) >= ?"
+            params += [*tags, len(set(tags)) if match_all_tags else 1]
+        if after is not None:
+            sql += " AND seq > (SELECT seq FROM agents WHERE id = ?)"
+            params.append(after)
+        sql += " ORDER BY seq"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [self._agent_row(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def _modify_agent(self, agent_id: str, name: Optional[str], tags: Optional[Sequence[str]]) -> LocalAgent:
+        with self._lock:
+            self._agent(agent_id)
+            with self._conn:
+                if name is not None:
+                    self._conn.execute("UPDATE agents SET name = ? WHERE id = ?", (name, agent_id))
+                if tags is not None:
+                    self._conn.execute("DELETE FROM agent_tags WHERE agent_id = ?", (agent_id,))
+                    self._conn.executemany("INSERT OR IGNORE INTO agent_tags VALUES (?, ?)", ((agent_id, t) for t in tags))
+            return self._agent(agent_id)
+
+    def _delete_agent(self, agent_id: str) -> None:
+        """ Delete an agent with its passages, messages and the blocks no other agent uses """
+        with self._lock:
+            self._agent(agent_id)
+            with self._conn:
+                block_ids = [b for (b,) in self._conn.execute("SELECT block_id FROM agent_blocks WHERE agent_id = ?", (agent_id,))]
+                for table in ("agent_tags", "agent_blocks", "passages", "messages"):
+                    self._conn.execute(f"DELETE FROM {table} WHERE agent_id = ?", (agent_id,))
+                self._conn.execute("DELETE FROM agents WHERE id = ?", (agent_id,))
+                self._conn.executemany(
+                    "DELETE FROM blocks WHERE id = ? AND NOT EXISTS (SELECT 1 FROM agent_blocks WHERE block_id = blocks.id)",
+                    ((b,) for b in block_ids),
+                )
+            self._search_indexes.pop(agent_id, None)
+
+    # ----- blocks -----
+
+    def _block_row(self, row: Tuple[str, str, str, Optional[int], Optional[str]]) -> LocalBlock:
+        return LocalBlock(*row)
+
+    def _block(self, block_id: str) -> LocalBlock:
+        with self._lock:
+            row = self._conn.execute('SELECT id, label, value, "limit", description FROM blocks WHERE id = ?', (block_id,)).fetchone()
+        if row is None:
+            raise NotFoundError(f"Block {block_id} not found")
+        return self._block_row(row)
+
+    def _agent_blocks(self, agent_id: str) -> List[LocalBlock]:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT b.id, b.label, b.value, b."limit", b.description FROM agent_blocks ab '
+                "JOIN blocks b ON b.id = ab.block_id WHERE ab.agent_id = ? ORDER BY ab.position",
+                (agent_id,),
+            ).fetchall()
+        return [self._block_row(row) for row in rows]
+
+    def _check_limit(self, value: str, limit: Optional[int]) -> None:
+        if limit is not None and len(value) > limit:
+            raise ValueError(f"Block value of {len(value)} characters exceeds its limit of {limit}")
+
+    def _create_block(self, label: str, value: str, limit: Optional[int], description: Optional[str]) -> LocalBlock:
+        self._check_limit(value, limit)
+        block = LocalBlock(_new_id("block"), label, value, limit, description)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO blocks VALUES (?, ?, ?, ?, ?)", tuple(block))
+        return block
+
+    def _modify_block(self, block_id: str, value: Optional[str], limit: Optional[int], description: Optional[str],
+                      label: Optional[str]) -> LocalBlock:
+        with self._lock:
+            block = self._block(block_id)
+            changes = {k: v for k, v in (("value", value), ("limit", limit), ("description", description), ("label", label)) if v is not None}
+            block = block._replace(**changes)
+            self._check_limit(block.value, block.limit)
+            with self._conn:
+                self._conn.execute(
+                    'UPDATE blocks SET label = ?, value = ?, "limit" = ?, description = ? WHERE id = ?',
+                    (block.label, block.value, block.limit, block.description, block_id),
+                )
+            return block
+
+    def _delete_block(self, block_id: str) -> None:
+        with self._lock:
+            self._block(block_id)
+            with self._conn:
+                self._conn.execute("DELETE FROM agent_blocks WHERE block_id = ?", (block_id,))
+                self._conn.execute("DELETE FROM blocks WHERE id = ?", (block_id,))
+
+    def _attach_block(self, agent_id: str, block_id: str) -> LocalAgent:
+        with self._lock:
+            self._agent(agent_id)
+            self._block(block_id)
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO agent_blocks VALUES (?, ?, "
+                    "(SELECT COALESCE(MAX(position), -1) + 1 FROM agent_blocks WHERE agent_id = ?))",
+                    (agent_id, block_id, agent_id),
+                )
+            return self._agent(agent_id)
+
+    def _detach_block(self, agent_id: str, block_id: str) -> LocalAgent:
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM agent_blocks WHERE agent_id = ? AND block_id = ?", (agent_id, block_id))
+            return self._agent(agent_id)
+
+    def set_block_value(self, agent_id: str, label: str, value: str) -> LocalBlock:
+        """ Replace the value of an agent's block; the helper learners use to edit memory """
+        block = self.agents.blocks.retrieve(agent_id, label)
+        return self._modify_block(block.id, value, None, None, None)
+
+    # ----- passages -----
+
+    def _passage_row(self, row: Tuple[str, str, str, float]) -> LocalPassage:
+        passage_id, text, tags, created_at = row
+        return LocalPassage(passage_id, text, json.loads(tags), _datetime(created_at))
+
+    def _create_passage(self, agent_id: str, text: str, tags: Optional[Sequence[str]]) -> LocalPassage:
+        passage = LocalPassage(_new_id("passage"), text, list(tags or []), _datetime(time.time()))
+        with self._lock:
+            self._agent(agent_id)
+            with self._conn:
+                seq = self._conn.execute(
+                    "INSERT INTO passages (id, agent_id, text, tags, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (passage.id, agent_id, text, json.dumps(passage.tags), passage.created_at.timestamp()),
+                ).lastrowid
+            index = self._search_indexes.get(agent_id)
+            if index is not None:
+                index.add(passage, seq)
+        return passage
+
+    def _list_passages(self, agent_id: str, after: Optional[str], limit: Optional[int]) -> List[LocalPassage]:
+        sql, params = "SELECT id, text, tags, created_at FROM passages WHERE agent_id = ?", [agent_id]
+        if after is not None:
+            sql += " AND seq > (SELECT seq FROM passages WHERE id = ?)"
+            params.append(after)
+        sql += " ORDER BY seq"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [self._passage_row(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def _search_index(self, agent_id: str) -> _Bm25Index:
+        """ The agent's BM25 postings, built from SQLite on first search
+
+        Processes sharing the database file write passages this instance never sees, so every
+        search compares the index with the agent's passage count and newest seq: newer rows are
+        appended, anything else (deletions) rebuilds the index.
+        """
+        count, last_seq = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(MAX(seq), 0) FROM passages WHERE agent_id = ?", (agent_id,)
+        ).fetchone()
+        index = self._search_indexes.get(agent_id)
+        if index is not None and (len(index.docs), index.last_seq) == (count, last_seq):
+            return index
+        newer = self._passage_rows(agent_id, index.last_seq if index is not None else 0)
+        if index is None or len(index.docs) + len(newer) != count:
+            index, newer = _Bm25Index(), self._passage_rows(agent_id, 0)
+        for seq, passage in newer:
+            index.add(passage, seq)
+        self._search_indexes[agent_id] = index
+        return index
+
+    def _passage_rows(self, agent_id: str, after_seq: int) -> List[Tuple[int, LocalPassage]]:
+        rows = self._conn.execute(
+            "SELECT seq, id, text, tags, created_at FROM passages WHERE agent_id = ? AND seq > ? ORDER BY seq",
+            (agent_id, after_seq),
+        ).fetchall()
+        return [(row[0], self._passage_row(row[1:])) for row in rows]
+
+    def _search(self, agent_id: str, query: str, tags: Optional[Sequence[str]], tag_match_mode: Optional[str],
+                top_k: Optional[int], start_datetime: Union[datetime, str, None],
+                end_datetime: Union[datetime, str, None]) -> LocalSearchResponse:
+        wanted = set([tags] if isinstance(tags, str) else tags or ())
+        match = all if tag_match_mode == "all" else any
+        start, end = _timestamp(start_datetime), _timestamp(end_datetime)
+
+        def accepts(passage: LocalPassage) -> bool:
+            created = passage.created_at.timestamp()
+            if start is not None and created < start or end is not None and created > end:
+                return False
+            return not wanted or match(t in passage.tags for t in wanted)
+
+        with self._lock:
+            self._agent(agent_id)
+            hits = self._search_index(agent_id).search(query, accepts, top_k or 10)
+        results = [LocalSearchResult(p.text, p.created_at.isoformat(), p.tags, score) for p, score in hits]
+        return LocalSearchResponse(results, len(results))
+
+    # ----- runs -----
+
+    def _run_row(self, row: Tuple[str, str, str, float, Optional[float], Optional[str]]) -> LocalRun:
+        run_id, agent_id, status, created_at, completed_at, error = row
+        return LocalRun(run_id, agent_id, status, _datetime(created_at), _datetime(completed_at) if completed_at else None, error)
+
+    def _run(self, run_id: str) -> LocalRun:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, agent_id, status, created_at, completed_at, error FROM runs WHERE id = ?", (run_id,)
+            ).fetchone()
+        if row is None:
+            raise NotFoundError(f"Run {run_id} not found")
+        return self._run_row(row)
+
+    def _set_run_status(self, run_id: str, status: str, error: Optional[str] = None) -> None:
+        completed_at = time.time() if status in ("completed", "failed") else None
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE runs SET status = ?, completed_at = ?, error = ? WHERE id = ?",
+                               (status, completed_at, error, run_id))
+
+    def _start_run(self, agent_id: str, messages: List[Dict[str, Any]]) -> LocalRun:
+        run_id, now = _new_id("run"), time.time()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("LocalLetta is closed")
+            self._agent(agent_id)
+            with self._conn:
+                self._conn.execute("INSERT INTO runs VALUES (?, ?, 'created', ?, NULL, NULL)", (run_id, agent_id, now))
+                self._conn.executemany(
+                    "INSERT INTO messages (agent_id, run_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                    ((agent_id, run_id, m.get("role"), m.get("content"), now) for m in messages),
+                )
+        with self._idle:
+            self._active += 1
+            self._queued.setdefault(agent_id, deque()).append((run_id, messages))
+            drain = agent_id not in self._draining
+            self._draining.add(agent_id)
+        if drain:
+            self._executor.submit(self._drain, agent_id)
+        return self._run(run_id)
+
+    def _drain(self, agent_id: str) -> None:
+        """ Execute an agent's queued runs one after another, in submission order """
+        while True:
+            with self._idle:
+                queue = self._queued.get(agent_id)
+                if not queue:
+                    self._queued.pop(agent_id, None)
+                    self._draining.discard(agent_id)
+                    return
+                run_id, messages = queue.popleft()
+            try:
+                self._execute(run_id, agent_id, messages)
+            finally:
+                with self._idle:
+                    self._active -= 1
+                    self._idle.notify_all()
+
+    def _execute(self, run_id: str, agent_id: str, messages: List[Dict[str, Any]]) -> None:
+        self._set_run_status(run_id, "running")
+        try:
+            if self.learner is not None:
+                self.learner(self, agent_id, messages)
+        except Exception as e:
+            self._set_run_status(run_id, "failed", f"{type(e).__name__}: {e}")
+        else:
+            self._set_run_status(run_id, "completed")
+
+    def messages(self, agent_id: str) -> List[Dict[str, Any]]:
+        """ Every message the agent was sent, oldest first, with the id of the run that carried it """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT run_id, role, content FROM messages WHERE agent_id = ? ORDER BY seq", (agent_id,)
+            ).fetchall()
+        return [{"run_id": run_id, "role": role, "content": content} for run_id, role, content in rows]
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """ Wait until every submitted run has finished; False if the timeout expired first """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._active == 0, timeout)
+
+    def close(self) -> None:
+        """ Finish queued runs, then close the database """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._conn.close()
+
+
+class _AsyncNamespace:
+    """ Coroutine view of a LocalLetta namespace; each call runs on the loop's default executor """
+
+    def __init__(self, target: Any):
+        self._target = target
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if isinstance(attr, _Namespace):
+            return _AsyncNamespace(attr)
+        if not callable(attr):
+            return attr
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, functools.partial(attr, *args, **kwargs))
+        return call
+
+
+class AsyncLocalLetta:
+    """ `letta_client.AsyncLetta`-shaped view of a LocalLetta, for AsyncMemory """
+
+    def __init__(self, backend: LocalLetta):
+        self.backend = backend
+        self.agents = _AsyncNamespace(backend.agents)
+        self.blocks = _AsyncNamespace(backend.blocks)
+        self.runs = _AsyncNamespace(backend.runs)
+
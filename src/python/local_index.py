@@ -0,0 +1,171 @@
+import hashlib
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency: pip install "ai-memory-sdk[local-index]"
+    np = None
+
+_TOKEN = re.compile(r"\w+")
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('The local search index requires numpy: pip install "ai-memory-sdk[local-index]"')
+
+
+class HashingEmbedder:
+    """ Deterministic offline embedder: signed feature hashing of word unigrams and bigrams
+
+    Needs no model or network, and gives the same vectors in every process (it uses blake2b,
+    not Python's salted hash). Rows are L2-normalized so a dot product is cosine similarity.
+    """
+
+    def __init__(self, dim: int = 1024):
+        _require_numpy()
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        tokens = _TOKEN.findall(text.casefold())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def __call__(self, texts: Sequence[str]) -> "np.ndarray":
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                matrix[row, h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+
+class LocalHit(NamedTuple):
+    text: str
+    score: float
+    tags: frozenset
+
+
+class _SubjectIndex:
+    """ Embedding matrix for one agent, grown by doubling so appends are amortized O(1) """
+
+    def __init__(self):
+        self.matrix: Optional["np.ndarray"] = None
+        self.texts: List[str] = []
+        self.tags: List[frozenset] = []
+        self.loaded_at = time.monotonic()
+
+    def add(self, vectors: "np.ndarray", texts: Sequence[str], tags: Sequence[Iterable[str]]) -> None:
+        if not len(texts):
+            return
+        needed = len(self.texts) + len(texts)
+        if self.matrix is None:
+            self.matrix = np.zeros((max(needed, 64), vectors.shape[1]), dtype=np.float32)
+        elif needed > len(self.matrix):
+            grown = np.zeros((max(needed, 2 * len(self.matrix)), self.matrix.shape[1]), dtype=np.float32)
+            grown[:len(self.texts)] = self.matrix[:len(self.texts)]
+            self.matrix = grown
+        self.matrix[len(self.texts):needed] = vectors
+        self.texts.extend(texts)
+        self.tags.extend(frozenset(t or ()) for t in tags)
+
+
+class LocalIndex:
+    """ In-process similarity index over a subject's archival passages
+
+    Memory loads an agent's passages once (the first search for that agent), keeps the index
+    current with passages it writes itself, and answers searches with one matrix-vector product
+    plus `argpartition`. An agent's index is reloaded after one of its tracked runs finishes
+    (the sleeptime agent may have inserted passages), and once it is older than `ttl` seconds,
+    which picks up passages written by other processes.
+
+    Args:
+        embedder: Callable mapping a list of texts to an (n, dim) array of L2-normalized rows
+            (defaults to HashingEmbedder). Swap in a real embedding model for semantic quality.
+        top_k: Number of results returned by a local search
+        min_score: Hits scoring at or below this are dropped; if none remain, Memory asks the server.
+            With HashingEmbedder, one word shared by a longer query and passage scores about
+            0.1-0.15, while a passage repeating most of the query scores 0.3 and up, so the
+            default leaves weak lexical overlaps to the server's semantic search. Tune it for
+            another embedder.
+        ttl: Seconds before an agent's index is reloaded from the server (None: never)
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Callable[[Sequence[str]], Any]] = None,
+        top_k: int = 10,
+        min_score: float = 0.25,
+        ttl: Optional[float] = 300.0,
+    ):
+        _require_numpy()
+        self.embedder = embedder or HashingEmbedder()
+        self.top_k = top_k
+        self.min_score = min_score
+        self.ttl = ttl
+        self._subjects: Dict[str, _SubjectIndex] = {}
+        self._lock = threading.Lock()
+
+    def is_loaded(self, agent_id: str) -> bool:
+        with self._lock:
+            subject = self._subjects.get(agent_id)
+        return subject is not None and (self.ttl is None or time.monotonic() - subject.loaded_at < self.ttl)
+
+    def load(self, agent_id: str, passages: Iterable[Tuple[str, Iterable[str]]]) -> None:
+        """ (Re)build an agent's index from (text, tags) pairs """
+        passages = list(passages)
+        subject = _SubjectIndex()
+        if passages:
+            vectors = self._embed([text for text, _ in passages])
+            subject.add(vectors, [text for text, _ in passages], [tags for _, tags in passages])
+        with self._lock:
+            self._subjects[agent_id] = subject
+
+    def add(self, agent_id: str, passages: Sequence[Tuple[str, Iterable[str]]]) -> None:
+        """ Append passages to an already loaded agent (ignored otherwise; they arrive with the next load) """
+        if not passages:
+            return
+        vectors = self._embed([text for text, _ in passages])
+        with self._lock:
+            subject = self._subjects.get(agent_id)
+            if subject is not None:
+                subject.add(vectors, [text for text, _ in passages], [tags for _, tags in passages])
+
+    def drop(self, agent_id: str) -> None:
+        with self._lock:
+            self._subjects.pop(agent_id, None)
+
+    def search(self, agent_id: str, query: str, tags: Optional[List[str]] = None, k: Optional[int] = None) -> Optional[List[LocalHit]]:
+        """ Top-k passages by cosine similarity, best first; None if the agent is not loaded
+
+        Like the server, `tags` matches passages carrying any of the given tags.
+        """
+        k = k or self.top_k
+        query_vector = self._embed([query])[0]
+        with self._lock:
+            subject = self._subjects.get(agent_id)
+            if subject is None:
+                return None
+            n = len(subject.texts)
+            if n == 0:
+                return []
+            scores = subject.matrix[:n] @ query_vector
+            if tags:
+                wanted = set(tags)
+                mask = np.fromiter((not wanted.isdisjoint(t) for t in subject.tags), dtype=bool, count=n)
+                scores = np.where(mask, scores, -np.inf)
+                n = int(mask.sum())
+            k = min(k, n)
+            if k <= 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                LocalHit(subject.texts[i], float(scores[i]), subject.tags[i])
+                for i in top if scores[i] > self.min_score
+            ]
+
+    def _embed(self, texts: Sequence[str]) -> "np.ndarray":
+        return np.asarray(self.embedder(texts), dtype=np.float32)
@@ -0,0 +1,145 @@
+import asyncio
+from concurrent.futures import Executor
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+
+class PassageWriteResult(NamedTuple):
+    """ Outcome of writing one passage to archival memory """
+    index: int
+    text: str
+    passage_id: Optional[str] = None
+    error: Optional[BaseException] = None
+    duplicate: bool = False  # skipped because the same text was already stored for the subject
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class SearchHit(str):
+    """ A search result: the passage text, plus its score (when known), timestamp and tags
+
+    Behaves exactly like the text string, so callers that treat results as strings keep working.
+    Letta's passage search does not return scores; hits from a LocalIndex carry one.
+    """
+
+    def __new__(
+        cls,
+        text: str,
+        score: Optional[float] = None,
+        timestamp: Optional[str] = None,
+        tags: Optional[Iterable[str]] = None,
+    ):
+        hit = super().__new__(cls, text)
+        hit.score = score
+        hit.timestamp = timestamp
+        hit.tags = list(tags or [])
+        return hit
+
+    @property
+    def text(self) -> str:
+        return str(self)
+
+    def __repr__(self) -> str:
+        return f"SearchHit({str(self)!r}, score={self.score!r}, timestamp={self.timestamp!r})"
+
+
+class SearchQuery(NamedTuple):
+    """ Normalized search parameters; hashable so it can be part of a cache key """
+    query: str
+    tags: Tuple[str, ...]
+    limit: Optional[int] = None
+    score_threshold: Optional[float] = None
+    start_datetime: Optional[str] = None  # ISO 8601
+    end_datetime: Optional[str] = None
+
+    @classmethod
+    def build(
+        cls,
+        query: str,
+        tags: Sequence[str],
+        limit: Optional[int] = None,
+        score_threshold: Optional[float] = None,
+        start_datetime: Union[datetime, str, None] = None,
+        end_datetime: Union[datetime, str, None] = None,
+    ) -> "SearchQuery":
+        def iso(value):
+            return value.isoformat() if isinstance(value, datetime) else value
+        return cls(query, tuple(sorted(tags)), limit, score_threshold, iso(start_datetime), iso(end_datetime))
+
+    def server_kwargs(self) -> Dict[str, Any]:
+        """ Keyword arguments for passages.search; unset options are left to the server defaults """
+        kwargs: Dict[str, Any] = {"query": self.query, "tags": list(self.tags)}
+        for name, value in (("top_k", self.limit), ("start_datetime", self.start_datetime), ("end_datetime", self.end_datetime)):
+            if value is not None:
+                kwargs[name] = value
+        return kwargs
+
+    def accepts(self, hit: SearchHit) -> bool:
+        """ Client-side score filter; hits without a score always pass """
+        return self.score_threshold is None or hit.score is None or hit.score >= self.score_threshold
+
+
+def _passage_id(created: Any) -> Optional[str]:
+    """ passages.create returns a list of passages (one per embedded chunk); keep the first id """
+    if isinstance(created, (list, tuple)):
+        created = created[0] if created else None
+    return getattr(created, "id", None)
+
+
+def merge_duplicates(
+    passages: Sequence[Dict[str, Any]],
+    claimed: Sequence[bool],
+    results: Sequence[PassageWriteResult],
+) -> List[PassageWriteResult]:
+    """ Results for every input passage, given the results of writing only the claimed ones """
+    written = iter(results)
+    merged = []
+    for index, (passage, is_new) in enumerate(zip(passages, claimed)):
+        if is_new:
+            merged.append(next(written)._replace(index=index))
+        else:
+            merged.append(PassageWriteResult(index, passage["text"], duplicate=True))
+    return merged
+
+
+def write_passages(
+    create: Callable[..., Any],
+    passages: Sequence[Dict[str, Any]],
+    executor: Optional[Executor] = None,
+) -> List[PassageWriteResult]:
+    """ Write passages through a bounded executor, returning results in input order
+
+    Each passage is a dict with "text" and optional "tags", passed as keyword arguments to
+    `create`. A failing passage is reported in its result instead of aborting the batch.
+    Without an executor the passages are written one after another.
+    """
+    def write_one(index: int, passage: Dict[str, Any]) -> PassageWriteResult:
+        try:
+            return PassageWriteResult(index, passage["text"], _passage_id(create(**passage)))
+        except Exception as e:
+            return PassageWriteResult(index, passage["text"], error=e)
+
+    if executor is None or len(passages) <= 1:
+        return [write_one(i, p) for i, p in enumerate(passages)]
+    futures = [executor.submit(write_one, i, p) for i, p in enumerate(passages)]
+    return [f.result() for f in futures]
+
+
+async def awrite_passages(
+    create: Callable[..., Awaitable[Any]],
+    passages: Sequence[Dict[str, Any]],
+    concurrency: int = 8,
+) -> List[PassageWriteResult]:
+    """ Async counterpart of `write_passages`, with at most `concurrency` writes in flight """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def write_one(index: int, passage: Dict[str, Any]) -> PassageWriteResult:
+        async with semaphore:
+            try:
+                return PassageWriteResult(index, passage["text"], _passage_id(await create(**passage)))
+            except Exception as e:
+                return PassageWriteResult(index, passage["text"], error=e)
+
+    return list(await asyncio.gather(*(write_one(i, p) for i, p in enumerate(passages))))
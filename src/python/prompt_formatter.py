@@ -1,4 +1,5 @@
-from typing import List, Dict, Any
+import re
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence
 from schemas import Message, File
 
 
@@ -10,7 +11,36 @@ file_tag = "file"
 file_part_tag = "file_part"
 file_char_limit = 20000 # how many character to include in file part 
 
-def format_messages(messages: List[Message]) -> List[str]:
+memories_tag = "relevant_memories"
+context_separator = "\n\n"
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+_ENCLOSING_TAG = re.compile(r"^(<(\w+)[^>]*>)(.*)(</\2>)$", re.DOTALL)
+
+def _split_to_budget(text: str, budget: int, count: Callable[[str], int]) -> List[str]:
+    """ Split text into consecutive pieces that each fit within the budget """
+    pieces = []
+    while text:
+        if count(text) <= budget:
+            pieces.append(text)
+            break
+        # largest prefix that fits (at least one character, so we always make progress)
+        lo, hi = 1, len(text) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if count(text[:mid]) <= budget:
+                lo = mid
+            else:
+                hi = mid - 1
+        pieces.append(text[:lo])
+        text = text[lo:]
+    return pieces
+
+
+def format_messages(
+    messages: List[Message],
+    budget: Optional[int] = message_total_char_limit,
+    count: Callable[[str], int] = len,
+) -> List[Dict[str, str]]:
     """
     Format messages like the following: 
 
@@ -18,46 +48,174 @@ def format_messages(messages: List[Message]) -> List[str]:
     assistant: Hello Sarah! I'm Sam. smiles warmly There's something special about first meetings, don't you think? Like opening a book to its first page, full of possibilities. I'd love to get to know you better - what brings you here today?
     assistant: Tool call returned Sent message successfully.
 
+    Long histories are split into several <messages> chunks, one sleeptime input each, that fit
+    within `budget` (the <messages> wrapper included) as measured by `count` (characters by
+    default; pass a tokenizer's length function to budget in tokens). A message is only split
+    when it alone exceeds the budget, and every piece keeps its "role: " prefix.
+    `budget=None` puts everything in a single chunk.
+    """
+    head, tail = f"<{messages_tag}>{messages_prompt}:\n", f"</{messages_tag}>"
+    if budget is not None:
+        wrapper = count(head + tail)
+        if budget <= wrapper:
+            raise ValueError(f"budget must exceed the {wrapper} taken by the <{messages_tag}> wrapper")
+        budget -= wrapper
+    chunks: List[List[str]] = []
+    lines: List[str] = []
+    used = 0
+    separator = count("\n")
+    for msg in messages:
+        line = f"{msg.role}: {msg.content}"
+        if budget is None:
+            lines.append(line)
+            continue
+        cost = count(line)
+        if lines and used + separator + cost > budget:
+            chunks.append(lines)
+            lines, used = [], 0
+        if cost > budget:
+            prefix = f"{msg.role}: "
+            pieces = _split_to_budget(msg.content, budget, lambda piece: count(prefix + piece)) or [""]
+            chunks.extend([prefix + piece] for piece in pieces)
+            continue
+        used += (separator if lines else 0) + cost
+        lines.append(line)
+    if lines or not chunks:
+        chunks.append(lines)
+
+    return [{"role": "user", "content": head + "\n".join(chunk) + tail} for chunk in chunks]
+
+def iter_file_parts(file_path: str, label: str, description: str, chunk_chars: int = file_char_limit) -> Iterator[Dict[str, str]]:
+    """
+    Lazily yield one <file_part> message per `chunk_chars` characters of a file.
+
+    The file is read incrementally, so at most two parts are held in memory regardless of file
+    size. Parts are numbered as they are read; the final part is marked with the total
+    (part=N/N). Read or decode errors produce a single error message for the rest of the file.
     """
-    message_history = "\n".join([
-        f"{msg.role}: {msg.content}" for msg in messages
-    ])
+    open_tag = f"<{file_tag} label=\"{label}\" description=\"{description}\">"
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            part_number = 0
+            chunk = f.read(chunk_chars)
+            while chunk:
+                # read one part ahead so the final part can be marked
+                next_chunk = f.read(chunk_chars)
+                part_number += 1
+                part = f"{part_number}/{part_number}" if not next_chunk else str(part_number)
+                yield {"role": "user", "content": f"{open_tag}<{file_part_tag} part={part}>{chunk}</{file_part_tag}></{file_tag}>"}
+                chunk = next_chunk
+    except Exception as e:
+        # If we can't read the file, send an error message
+        yield {"role": "user", "content": f"{open_tag}[Error reading file: {str(e)}]</{file_tag}>"}
 
-    return [{"role": "user", "content": f"<{messages_tag}>{messages_prompt}:\n{message_history}</{messages_tag}>"}]
 
 def format_files(files: List[File]) -> List[Dict[str, str]]:
     """
     Format files into multiple separate messages, ensuring each message stays under file_char_limit.
-    Each file part becomes its own message.
+    Each file part becomes its own message. Use `iter_file_parts` to stream large files.
     """
     all_messages = []
-    
     for file in files:
-        try:
-            # Read file content from disk
-            with open(file.file_path, 'r', encoding='utf-8') as f:
-                file_content = f.read()
-        except Exception as e:
-            # If we can't read the file, send an error message
-            error_msg = f"<{file_tag} label=\"{file.label}\" description=\"{file.description}\">[Error reading file: {str(e)}]</{file_tag}>"
-            all_messages.append({"role": "user", "content": error_msg})
-            continue
-            
-        # chunk up file content into parts 
-        file_content_chunks = [file_content[i:i + file_char_limit] for i in range(0, len(file_content), file_char_limit)]
-        
-        # Create a separate message for each file part
-        for i, chunk in enumerate(file_content_chunks):
-            part_number = i + 1
-            total_parts = len(file_content_chunks)
-            
-            # Create the message content for this specific part
-            file_part_content = f"<{file_part_tag} part={part_number}/{total_parts}>{chunk}</{file_part_tag}>"
-            file_message = f"<{file_tag} label=\"{file.label}\" description=\"{file.description}\">{file_part_content}</{file_tag}>"
-            
-            all_messages.append({"role": "user", "content": file_message})
-    
+        all_messages.extend(iter_file_parts(file.file_path, file.label, file.description))
     return all_messages
-    
 
-    
+
+def format_memories(memories: Sequence[str]) -> str:
+    """ Numbered <relevant_memories> section, best match first ("" for no memories) """
+    if not memories:
+        return ""
+    lines = "".join(f"\n{i}. {m}" for i, m in enumerate(memories, 1))
+    return f"<{memories_tag}>{lines}\n</{memories_tag}>"
+
+
+def truncate_sentences(text: str, budget: int, count: Callable[[str], int] = len) -> str:
+    """ Longest run of leading sentences (or lines) that fits the budget; "" if not even one does """
+    if count(text) <= budget:
+        return text
+    ends = [m.start() for m in _SENTENCE_END.finditer(text)]
+    lo, hi = 0, len(ends)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count(text[:ends[mid - 1]]) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:ends[lo - 1]] if lo else ""
+
+
+class ContextSection(NamedTuple):
+    """ One part of an assembled prompt context; higher priority survives a tight budget longer """
+    name: str
+    text: str
+    priority: int = 0
+
+
+class AssembledContext(NamedTuple):
+    text: str
+    included: List[str]  # section names, and memory:N for the N-th ranked memory
+    truncated: List[str]  # included sections that were cut at a sentence boundary
+    dropped: List[str]
+    used: int  # size of text as measured by the tokenizer
+
+
+def assemble_context(
+    sections: Sequence[ContextSection],
+    memories: Sequence[str] = (),
+    budget: Optional[int] = None,
+    count: Callable[[str], int] = len,
+    memories_priority: int = 0,
+) -> AssembledContext:
+    """
+    Join sections and a <relevant_memories> section into a prompt context that fits `budget`.
+
+    Sections keep their order in the output, with memories last. Space is handed out by
+    priority (ties in order): a section that does not fit whole is truncated at a sentence
+    boundary inside its enclosing XML tag, or dropped if not even one sentence fits. Memories
+    are ranked best first and are kept or dropped whole, lowest-ranked first. `count`
+    measures size (characters by default; pass a tokenizer's length function to budget in
+    tokens). `budget=None` keeps everything.
+    """
+    names = [s.name for s in sections if s.text] + [f"memory:{i}" for i in range(1, len(memories) + 1)]
+    if budget is None:
+        parts = [s.text for s in sections if s.text] + [format_memories(memories)]
+        text = context_separator.join(p for p in parts if p)
+        return AssembledContext(text, names, [], [], count(text))
+
+    chosen: Dict[int, str] = {}  # section index -> text kept
+    truncated: List[str] = []
+    kept_memories: List[str] = []
+    separator = count(context_separator)
+    remaining = budget
+    groups = [(s.priority, i) for i, s in enumerate(sections) if s.text] + [(memories_priority, len(sections))]
+    for _, index in sorted(groups, key=lambda g: -g[0]):
+        # every part after the first costs one separator
+        available = remaining - (separator if chosen or kept_memories else 0)
+        if index == len(sections):
+            for memory in memories:
+                candidate = format_memories(kept_memories + [memory])
+                if count(candidate) > available:
+                    break
+                kept_memories.append(memory)
+            if kept_memories:
+                remaining = available - count(format_memories(kept_memories))
+            continue
+        section = sections[index]
+        cost = count(section.text)
+        if cost <= available:
+            chosen[index] = section.text
+            remaining = available - cost
+            continue
+        match = _ENCLOSING_TAG.match(section.text)
+        open_tag, body, close_tag = (match.group(1), match.group(3), match.group(4)) if match else ("", section.text, "")
+        body = truncate_sentences(body, available - count(open_tag + close_tag), count)
+        if body:
+            chosen[index] = open_tag + body + close_tag
+            truncated.append(section.name)
+            remaining = available - count(chosen[index])
+
+    parts = [chosen[i] for i in sorted(chosen)] + ([format_memories(kept_memories)] if kept_memories else [])
+    text = context_separator.join(parts)
+    included = [sections[i].name for i in sorted(chosen)] + [f"memory:{i}" for i in range(1, len(kept_memories) + 1)]
+    dropped = [name for name in names if name not in included]
+    return AssembledContext(text, included, truncated, dropped, count(text))
@@ -0,0 +1,230 @@
+import logging
+import random
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# return_when values for wait_for_runs
+ALL = "all"  # wait until every run reaches a terminal status
+FIRST = "first"  # return as soon as any run reaches a terminal status
+ANY_FAILED = "any_failed"  # return as soon as any run fails/is cancelled, otherwise wait for all
+
+COMPLETED = "completed"
+TERMINAL_STATUSES = frozenset({"completed", "failed", "cancelled", "expired"})
+FAILED_STATUSES = TERMINAL_STATUSES - {COMPLETED}
+
+
+def is_terminal(status) -> bool:
+    return status in TERMINAL_STATUSES
+
+
+def check_return_when(return_when: str) -> None:
+    if return_when not in (ALL, FIRST, ANY_FAILED):
+        raise ValueError(f"return_when must be one of {ALL!r}, {FIRST!r} or {ANY_FAILED!r}, got {return_when!r}")
+
+
+def is_satisfied(statuses: Dict[str, str], return_when: str) -> bool:
+    """ Whether the collected run statuses meet the return_when condition """
+    if return_when == FIRST:
+        return any(is_terminal(s) for s in statuses.values())
+    if return_when == ANY_FAILED and any(s in FAILED_STATUSES for s in statuses.values()):
+        return True
+    return all(is_terminal(s) for s in statuses.values())
+
+
+class Backoff:
+    """ Poll intervals that start fast and grow geometrically up to `maximum`, with +/- jitter
+
+    Fast runs are noticed within tens of milliseconds while long runs are polled at most
+    every `maximum` seconds. Jitter keeps many waiters from polling in lockstep.
+    """
+
+    def __init__(self, initial: float = 0.05, factor: float = 1.6, maximum: float = 2.0, jitter: float = 0.2):
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self.jitter = jitter
+        self._current = initial
+
+    def __iter__(self) -> "Backoff":
+        return self
+
+    def __next__(self) -> float:
+        delay = self._current
+        self._current = min(self._current * self.factor, self.maximum)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class RunHandle:
+    """ Future-like handle for a Letta run, resolved by a background poller
+
+    `result()` returns the final status ("completed") or raises RuntimeError if the run failed,
+    was cancelled or expired. Done-callbacks receive the handle and run on the poller thread
+    (or immediately, in the caller's thread, if the run has already finished).
+    """
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.status: Optional[str] = None
+        self._error: Optional[BaseException] = None
+        self._done = threading.Event()
+        self._callbacks: List[Callable[["RunHandle"], Any]] = []
+        self._lock = threading.Lock()
+        self._future: Optional[Future] = None
+
+    def __str__(self) -> str:
+        return self.run_id
+
+    def __repr__(self) -> str:
+        return f"RunHandle(run_id={self.run_id!r}, status={self.status!r})"
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def result(self, timeout: Optional[float] = None) -> str:
+        """ Block until the run finishes and return its status """
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Run {self.run_id} did not complete within {timeout} seconds")
+        if self._error is not None:
+            raise self._error
+        return self.status
+
+    def exception(self, timeout: Optional[float] = None) -> Optional[BaseException]:
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Run {self.run_id} did not complete within {timeout} seconds")
+        return self._error
+
+    def add_done_callback(self, fn: Callable[["RunHandle"], Any]) -> None:
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(fn)
+                return
+        self._invoke(fn)
+
+    def future(self) -> Future:
+        """ A concurrent.futures.Future that resolves with this run's result """
+        with self._lock:
+            if self._future is None:
+                self._future = Future()
+                self._future.set_running_or_notify_cancel()
+                future = self._future
+            else:
+                return self._future
+        self.add_done_callback(self._resolve_future)
+        return future
+
+    def _resolve_future(self, handle: "RunHandle") -> None:
+        if self._error is not None:
+            self._future.set_exception(self._error)
+        else:
+            self._future.set_result(self.status)
+
+    def _finish(self, status: Optional[str], error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self.status = status
+            if error is None and status in FAILED_STATUSES:
+                error = RuntimeError(f"Run {self.run_id} finished with status {status!r}")
+            self._error = error
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            self._invoke(fn)
+
+    def _invoke(self, fn: Callable[["RunHandle"], Any]) -> None:
+        try:
+            fn(self)
+        except Exception:
+            logger.exception("Run %s done-callback raised", self.run_id)
+
+
+class RunPoller:
+    """ One background thread that polls every pending RunHandle of a Memory instance
+
+    The thread starts on demand and exits once nothing is pending. Polling uses `Backoff`,
+    which resets whenever a new run is registered so fresh runs are noticed quickly.
+    """
+
+    max_consecutive_errors = 5
+
+    def __init__(self, get_status: Callable[[str], str], on_finished: Callable[[str], None]):
+        self._get_status = get_status
+        self._on_finished = on_finished
+        self._pending: Dict[str, RunHandle] = {}
+        self._errors: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._generation = 0  # bumped on every new run so the loop can reset its backoff
+
+    def track(self, run_id: str) -> RunHandle:
+        """ Return a handle for run_id, polled in the background until it finishes """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("RunPoller is closed")
+            handle = self._pending.get(run_id)
+            if handle is None:
+                handle = RunHandle(run_id)
+                self._pending[run_id] = handle
+                self._generation += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="ai-memory-sdk-runs", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            return handle
+
+    def close(self) -> None:
+        """ Stop polling; handles still pending fail with RuntimeError """
+        with self._cond:
+            self._closed = True
+            thread = self._thread
+            self._cond.notify()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        for run_id in list(self._pending):
+            self._resolve(run_id, None, RuntimeError(f"Stopped polling run {run_id} before it finished"))
+
+    def _loop(self) -> None:
+        backoff = Backoff()
+        generation = -1
+        while True:
+            with self._cond:
+                if self._closed or not self._pending:
+                    self._thread = None
+                    return
+                if generation != self._generation:
+                    generation = self._generation
+                    backoff = Backoff()
+                pending = list(self._pending)
+            for run_id in pending:
+                self._poll(run_id)
+            with self._cond:
+                if self._pending and not self._closed and generation == self._generation:
+                    self._cond.wait(next(backoff))
+
+    def _poll(self, run_id: str) -> None:
+        try:
+            status = self._get_status(run_id)
+        except Exception as e:
+            self._errors[run_id] = self._errors.get(run_id, 0) + 1
+            if self._errors[run_id] < self.max_consecutive_errors:
+                return
+            self._resolve(run_id, None, e)
+            return
+        self._errors.pop(run_id, None)
+        if is_terminal(status):
+            self._on_finished(run_id)
+            self._resolve(run_id, status)
+        else:
+            with self._cond:
+                handle = self._pending.get(run_id)
+            if handle is not None:
+                handle.status = status
+
+    def _resolve(self, run_id: str, status: Optional[str], error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            handle = self._pending.pop(run_id, None)
+            self._errors.pop(run_id, None)
+        if handle is not None:
+            handle._finish(status, error)
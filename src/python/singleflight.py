@@ -0,0 +1,90 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, NamedTuple, Optional
+
+
+class FlightStats(NamedTuple):
+    executed: int  # calls that went upstream
+    shared: int  # calls that joined an identical call already in flight instead
+    in_flight: int
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """ Collapse concurrent calls with the same key into one
+
+    The first caller for a key runs `fn`; callers arriving while it is in flight wait for it and
+    receive the same result, or the same exception. Nothing is cached: once the call returns,
+    the next caller for the key runs `fn` again.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._executed = 0
+        self._shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._executed += 1
+            else:
+                self._shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> FlightStats:
+        with self._lock:
+            return FlightStats(self._executed, self._shared, len(self._calls))
+
+
+class AsyncSingleFlight:
+    """ SingleFlight for coroutines sharing one event loop """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self._executed = 0
+        self._shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is not None:
+            self._shared += 1
+            # shield: a cancelled follower must not cancel the call the others are waiting for
+            return await asyncio.shield(future)
+        self._executed += 1
+        future = self._calls[key] = asyncio.ensure_future(fn())
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._calls.pop(key, None)
+            else:
+                future.add_done_callback(lambda _f: self._calls.pop(key, None))
+
+    def stats(self) -> FlightStats:
+        return FlightStats(self._executed, self._shared, len(self._calls))
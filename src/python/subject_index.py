@@ -0,0 +1,87 @@
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class SubjectIndex:
+    """ Persistent subject tag -> agent id -> {label: block id} map, stored in SQLite
+
+    Memory consults the index before scanning agents by tag, and keeps it current on every
+    agent and block it creates or deletes, so a subject lookup is one indexed read no matter
+    how many agents the Letta project holds. The database runs in WAL mode, so several
+    processes can share one file. Agents or blocks changed by clients that do not use the
+    index are picked up by `Memory.rebuild_subject_index()`.
+
+    Args:
+        path: SQLite database file (":memory:" keeps the index for this process only)
+        busy_timeout: Seconds to wait for another process's write lock
+    """
+
+    def __init__(self, path: str = ":memory:", busy_timeout: float = 5.0):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS tags (tag TEXT PRIMARY KEY, agent_id TEXT NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS tags_agent ON tags (agent_id)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS blocks (agent_id TEXT, label TEXT, block_id TEXT NOT NULL, "
+                "PRIMARY KEY (agent_id, label)) WITHOUT ROWID"
+            )
+
+    def agent_for(self, tag: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT agent_id FROM tags WHERE tag = ?", (tag,)).fetchone()
+        return row[0] if row else None
+
+    def set_agent(self, agent_id: str, tags: Iterable[str]) -> None:
+        """ Record that each of the tags identifies this agent """
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO tags VALUES (?, ?)", ((t, agent_id) for t in tags))
+
+    def forget_agent(self, agent_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM tags WHERE agent_id = ?", (agent_id,))
+            self._conn.execute("DELETE FROM blocks WHERE agent_id = ?", (agent_id,))
+
+    def block_id(self, agent_id: str, label: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT block_id FROM blocks WHERE agent_id = ? AND label = ?", (agent_id, label)
+            ).fetchone()
+        return row[0] if row else None
+
+    def blocks(self, agent_id: str) -> Dict[str, str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT label, block_id FROM blocks WHERE agent_id = ?", (agent_id,)).fetchall()
+        return dict(rows)
+
+    def set_block(self, agent_id: str, label: str, block_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO blocks VALUES (?, ?, ?)", (agent_id, label, block_id))
+
+    def set_blocks(self, agent_id: str, blocks: Iterable[Tuple[str, str]]) -> None:
+        """ Replace an agent's (label, block id) pairs with a fresh listing """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM blocks WHERE agent_id = ?", (agent_id,))
+            self._conn.executemany("INSERT OR REPLACE INTO blocks VALUES (?, ?, ?)", ((agent_id, l, b) for l, b in blocks))
+
+    def forget_block(self, agent_id: str, block_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM blocks WHERE agent_id = ? AND block_id = ?", (agent_id, block_id))
+
+    def rebuild(self, agents: Iterable[Tuple[str, Iterable[str], Iterable[Tuple[str, str]]]]) -> None:
+        """ Replace the whole index with (agent id, tags, (label, block id) pairs) in one transaction """
+        agents = [(agent_id, list(tags), list(blocks)) for agent_id, tags, blocks in agents]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM tags")
+            self._conn.execute("DELETE FROM blocks")
+            for agent_id, tags, blocks in agents:
+                self._conn.executemany("INSERT OR REPLACE INTO tags VALUES (?, ?)", ((t, agent_id) for t in tags))
+                self._conn.executemany("INSERT OR REPLACE INTO blocks VALUES (?, ?, ?)", ((agent_id, l, b) for l, b in blocks))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
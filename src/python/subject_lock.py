@@ -0,0 +1,100 @@
+import hashlib
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows: only in-process locking is supported there
+    fcntl = None
+
+
+class SubjectLocks:
+    """ Per-subject mutual exclusion for check-then-create sequences
+
+    Always serializes threads of this process. With a `directory`, it also takes an exclusive
+    `flock` on one file per subject there, which serializes every process (e.g. uvicorn
+    workers) pointing at the same directory. Locks are not reentrant.
+
+    Args:
+        directory: Where per-subject lock files are kept (None: this process only). POSIX only.
+        timeout: Seconds to wait for a lock before raising TimeoutError (None: wait forever)
+    """
+
+    def __init__(self, directory: Optional[str] = None, timeout: Optional[float] = 60.0, poll_interval: float = 0.05):
+        if directory is not None:
+            if fcntl is None:
+                raise RuntimeError("Cross-process subject locks need fcntl (POSIX); pass directory=None")
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._locks: "weakref.WeakValueDictionary[str, threading.Lock]" = weakref.WeakValueDictionary()
+        self._guard = threading.Lock()
+
+    def lock_path(self, subject_id: str) -> Optional[str]:
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, hashlib.sha1(subject_id.encode("utf-8")).hexdigest() + ".lock")
+
+    @contextmanager
+    def hold(self, subject_id: str) -> Iterator[None]:
+        """ Hold the subject's lock for the duration of the block """
+        held = self.acquire(subject_id)
+        try:
+            yield
+        finally:
+            self.release(held)
+
+    def acquire(self, subject_id: str) -> Tuple[threading.Lock, Optional[int]]:
+        """ Take the subject's lock (and file lock), blocking; pass the result to release(), from any thread """
+        with self._guard:
+            lock = self._locks.get(subject_id)
+            if lock is None:
+                lock = self._locks[subject_id] = threading.Lock()
+        if not lock.acquire(timeout=-1 if self.timeout is None else self.timeout):
+            raise TimeoutError(f"Timed out waiting for the lock on subject {subject_id}")
+        try:
+            return lock, self.acquire_file(subject_id)
+        except BaseException:
+            lock.release()
+            raise
+
+    def release(self, held: Tuple[threading.Lock, Optional[int]]) -> None:
+        lock, fd = held
+        try:
+            self.release_file(fd)
+        finally:
+            lock.release()
+
+    def acquire_file(self, subject_id: str) -> Optional[int]:
+        """ Take the subject's cross-process file lock (None without a directory) """
+        path = self.lock_path(subject_id)
+        if path is None:
+            return None
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    os.close(fd)
+                    raise TimeoutError(f"Timed out waiting for the lock file of subject {subject_id}")
+                time.sleep(self.poll_interval)
+
+    def release_file(self, fd: Optional[int]) -> None:
+        if fd is None:
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+# default for Memory instances created without subject_locks, so separate instances in one process exclude each other
+process_locks = SubjectLocks()
@@ -0,0 +1,221 @@
+import sys
+import types
+import time
+from collections import Counter
+
+import pytest
+
+
+# Fake letta_client that counts upstream calls so claims can be told apart from creations
+letta_client = types.ModuleType("letta_client")
+
+
+class _Storage:
+    def __init__(self):
+        self.agents = {}
+        self.agent_blocks = {}
+        self.blocks = {}
+        self.run_counter = 0
+        self.agent_counter = 0
+        self.block_counter = 0
+        self.calls = Counter()
+
+
+_store = _Storage()
+
+
+class _AgentsBlocks:
+    def attach(self, agent_id: str, block_id: str):
+        _store.calls["agents.blocks.attach"] += 1
+        _store.agent_blocks.setdefault(agent_id, [])
+        if block_id not in _store.agent_blocks[agent_id]:
+            _store.agent_blocks[agent_id].append(block_id)
+
+    def list(self, agent_id: str):
+        _store.calls["agents.blocks.list"] += 1
+        ids = _store.agent_blocks.get(agent_id, [])
+        return [types.SimpleNamespace(**_store.blocks[i]) for i in ids if i in _store.blocks]
+
+    def detach(self, agent_id: str, block_id: str):
+        _store.calls["agents.blocks.detach"] += 1
+        ids = _store.agent_blocks.get(agent_id, [])
+        _store.agent_blocks[agent_id] = [i for i in ids if i != block_id]
+
+    def retrieve(self, agent_id: str, label: str):
+        _store.calls["agents.blocks.retrieve"] += 1
+        for i in _store.agent_blocks.get(agent_id, []):
+            if i in _store.blocks and _store.blocks[i]["label"] == label:
+                return types.SimpleNamespace(**_store.blocks[i])
+        raise KeyError("Block not found")
+
+
+class _AgentsMessages:
+    def create_async(self, agent_id: str, messages):
+        _store.calls["agents.messages.create_async"] += 1
+        _store.run_counter += 1
+        return types.SimpleNamespace(id=f"run-{_store.run_counter}")
+
+
+class _AgentsPassages:
+    def create(self, agent_id: str, text: str, tags=None):
+        _store.calls["agents.passages.create"] += 1
+        return [types.SimpleNamespace(id=f"passage-{agent_id}", text=text)]
+
+    def search(self, agent_id: str, query: str, tags=None, **options):
+        _store.calls["agents.passages.search"] += 1
+        result = types.SimpleNamespace(content=f"match for {query}", timestamp=None, tags=tags)
+        return types.SimpleNamespace(results=[result])
+
+
+class _Agents:
+    def __init__(self):
+        self.blocks = _AgentsBlocks()
+        self.messages = _AgentsMessages()
+        self.passages = _AgentsPassages()
+
+    def create(self, name: str, model: str, agent_type: str, initial_message_sequence, tags):
+        _store.calls["agents.create"] += 1
+        _store.agent_counter += 1
+        agent_id = f"agent-{_store.agent_counter}"
+        _store.agents[agent_id] = {"id": agent_id, "name": name, "tags": tags}
+        _store.agent_blocks[agent_id] = []
+        return types.SimpleNamespace(id=agent_id)
+
+    def list(self, tags, match_all_tags=True):
+        _store.calls["agents.list"] += 1
+        return [types.SimpleNamespace(**a) for a in _store.agents.values() if all(t in a["tags"] for t in tags)]
+
+    def modify(self, agent_id: str, name=None, tags=None):
+        _store.calls["agents.modify"] += 1
+        _store.agents[agent_id].update(name=name, tags=tags)
+
+    def delete(self, agent_id: str):
+        _store.calls["agents.delete"] += 1
+        _store.agents.pop(agent_id, None)
+        _store.agent_blocks.pop(agent_id, None)
+
+
+class _Blocks:
+    def create(self, label: str, description: str, limit: int, value: str):
+        _store.calls["blocks.create"] += 1
+        _store.block_counter += 1
+        block_id = f"block-{_store.block_counter}"
+        _store.blocks[block_id] = {
+            "id": block_id,
+            "label": label,
+            "description": description,
+            "limit": limit,
+            "value": value,
+        }
+        return types.SimpleNamespace(**_store.blocks[block_id])
+
+    def modify(self, block_id: str, value=None, description=None, limit=None):
+        _store.calls["blocks.modify"] += 1
+        _store.blocks[block_id].update(value=value, description=description, limit=limit)
+
+    def delete(self, block_id: str):
+        _store.calls["blocks.delete"] += 1
+        _store.blocks.pop(block_id, None)
+
+
+class _Runs:
+    def retrieve(self, run_id: str):
+        _store.calls["runs.retrieve"] += 1
+        return types.SimpleNamespace(id=run_id, status="completed")
+
+
+class Letta:
+    def __init__(self, token=None, base_url=None, **kwargs):
+        self.agents = _Agents()
+        self.blocks = _Blocks()
+        self.runs = _Runs()
+
+
+letta_client.Letta = Letta
+sys.modules['letta_client'] = letta_client
+
+
+from agent_pool import PoolPolicy, pool_agent_name  # noqa: E402
+from ai_memory_sdk import Memory  # noqa: E402
+
+
+def _wait_ready(memory, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while memory._agent_pool.ready_count() < count:
+        assert time.monotonic() < deadline, "agent pool did not fill"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def pooled_memory():
+    memory = Memory(api_key="test", agent_pool=PoolPolicy(size=2, refill_interval=0.05))
+    _wait_ready(memory, 2)
+    _store.calls.clear()
+    yield memory
+    memory.close()
+
+
+def test_new_user_claims_pooled_agent(pooled_memory):
+    agent_id = pooled_memory.initialize_user_memory("pool-user", user_context_block_value="Name: Ada")
+
+    # one re-tag, one value update and the initial passage instead of agent and block creation
+    assert _store.calls["agents.create"] == 0
+    assert _store.calls["blocks.create"] == 0
+    assert _store.calls["agents.modify"] == 1
+    assert _store.calls["blocks.modify"] == 1
+    assert _store.agents[agent_id]["tags"] == ["pool-user", "ai-memory-sdk"]
+    assert pooled_memory.get_user_memory("pool-user") == "Name: Ada"
+    assert pooled_memory.get_summary("pool-user") == ""
+
+    # the background thread replaces the claimed member
+    _wait_ready(pooled_memory, 2)
+    assert pooled_memory._agent_pool.claimed == 1
+
+
+def test_pool_only_serves_matching_blocks(pooled_memory):
+    agent_id = pooled_memory.initialize_subject("pool-subject")
+
+    assert _store.calls["agents.modify"] == 0
+    assert _store.calls["agents.create"] == 1
+    assert "subj:pool-subject" in _store.agents[agent_id]["tags"]
+
+
+def test_subject_pool_and_close_discards_members():
+    memory = Memory(api_key="test", agent_pool=PoolPolicy(size=1, blocks=(), name="subjects", refill_interval=0.05))
+    _wait_ready(memory, 1)
+    agent_id = memory.initialize_subject("pooled-subject")
+    assert _store.agents[agent_id]["name"] == "subconscious_agent_subject_pooled-subject"
+    assert "ai-memory-sdk-pool:subjects" not in _store.agents[agent_id]["tags"]
+
+    _wait_ready(memory, 1)
+    pool_members = [a for a in _store.agents.values() if "ai-memory-sdk-pool:subjects" in a["tags"]]
+    memory.close()
+    assert pool_members and all(a["id"] not in _store.agents for a in pool_members)
+    assert agent_id in _store.agents
+
+
+def test_pool_sweeps_members_left_by_dead_process():
+    old = _store.agents["agent-stale"] = {
+        "id": "agent-stale",
+        "name": pool_agent_name("swept", time.time() - 3 * 3600),
+        "tags": ["ai-memory-sdk-pool:swept", "ai-memory-sdk"],
+    }
+    _store.agent_blocks["agent-stale"] = []
+    memory = Memory(api_key="test", agent_pool=PoolPolicy(size=1, name="swept", max_age=3600, refill_interval=0.05))
+    _wait_ready(memory, 1)
+    memory.close()
+
+    assert old["id"] not in _store.agents
+
+
+def test_unclosed_pool_discards_members_at_exit():
+    import agent_pool
+
+    memory = Memory(api_key="test", agent_pool=PoolPolicy(size=1, blocks=(), name="at-exit", refill_interval=0.05))
+    _wait_ready(memory, 1)
+    members = [a["id"] for a in _store.agents.values() if "ai-memory-sdk-pool:at-exit" in a["tags"]]
+
+    agent_pool._close_open_pools()  # what the atexit hook runs for pools never closed
+    assert members and all(agent_id not in _store.agents for agent_id in members)
+    assert memory._agent_pool not in agent_pool._open_pools
+    memory.close()
@@ -0,0 +1,215 @@
+import asyncio
+import sys
+import types
+
+import pytest
+
+
+# Fake letta_client whose AsyncLetta exposes awaitable methods
+letta_client = types.ModuleType("letta_client")
+
+
+class _Storage:
+    def __init__(self):
+        self.agents = {}
+        self.agent_blocks = {}
+        self.blocks = {}
+        self.passages = []
+        self.run_counter = 0
+        self.agent_counter = 0
+        self.block_counter = 0
+        self.polls = {}  # run_id -> number of status polls before completing
+
+
+_store = _Storage()
+
+
+class _AgentsBlocks:
+    async def attach(self, agent_id: str, block_id: str):
+        _store.agent_blocks.setdefault(agent_id, []).append(block_id)
+
+    async def list(self, agent_id: str):
+        ids = _store.agent_blocks.get(agent_id, [])
+        return [types.SimpleNamespace(**_store.blocks[i]) for i in ids if i in _store.blocks]
+
+    async def detach(self, agent_id: str, block_id: str):
+        _store.agent_blocks[agent_id] = [i for i in _store.agent_blocks.get(agent_id, []) if i != block_id]
+
+    async def retrieve(self, agent_id: str, label: str):
+        for i in _store.agent_blocks.get(agent_id, []):
+            if i in _store.blocks and _store.blocks[i]["label"] == label:
+                return types.SimpleNamespace(**_store.blocks[i])
+        raise KeyError("Block not found")
+
+
+class _AgentsMessages:
+    async def create_async(self, agent_id: str, messages):
+        _store.run_counter += 1
+        run_id = f"run-{_store.run_counter}"
+        _store.polls[run_id] = 1
+        return types.SimpleNamespace(id=run_id)
+
+
+class _AgentsPassages:
+    async def create(self, agent_id: str, text: str, tags=None):
+        _store.passages.append({"agent_id": agent_id, "text": text, "tags": tags or []})
+        return [types.SimpleNamespace(id=f"passage-{len(_store.passages)}", text=text)]
+
+    async def search(self, agent_id: str, query: str, tags=None):
+        results = [
+            types.SimpleNamespace(content=p["text"], timestamp="2025-01-01T00:00:00", tags=p["tags"])
+            for p in _store.passages
+            if p["agent_id"] == agent_id and query in p["text"] and all(t in p["tags"] for t in (tags or []))
+        ]
+        return types.SimpleNamespace(results=results)
+
+
+class _Agents:
+    def __init__(self):
+        self.blocks = _AgentsBlocks()
+        self.messages = _AgentsMessages()
+        self.passages = _AgentsPassages()
+
+    async def create(self, name: str, model: str, agent_type: str, initial_message_sequence, tags):
+        _store.agent_counter += 1
+        agent_id = f"agent-{_store.agent_counter}"
+        _store.agents[agent_id] = {"id": agent_id, "name": name, "tags": tags}
+        _store.agent_blocks[agent_id] = []
+        return types.SimpleNamespace(id=agent_id)
+
+    async def list(self, tags, match_all_tags=True):
+        return [types.SimpleNamespace(**a) for a in _store.agents.values() if all(t in a["tags"] for t in tags)]
+
+    async def delete(self, agent_id: str):
+        _store.agents.pop(agent_id, None)
+        _store.agent_blocks.pop(agent_id, None)
+
+
+class _Blocks:
+    async def create(self, label: str, description: str, limit: int, value: str):
+        _store.block_counter += 1
+        block_id = f"block-{_store.block_counter}"
+        _store.blocks[block_id] = {
+            "id": block_id,
+            "label": label,
+            "description": description,
+            "limit": limit,
+            "value": value,
+        }
+        return types.SimpleNamespace(**_store.blocks[block_id])
+
+    async def delete(self, block_id: str):
+        _store.blocks.pop(block_id, None)
+
+
+class _Runs:
+    async def retrieve(self, run_id: str):
+        if _store.polls.get(run_id, 0) > 0:
+            _store.polls[run_id] -= 1
+            return types.SimpleNamespace(id=run_id, status="running")
+        return types.SimpleNamespace(id=run_id, status="completed")
+
+
+class AsyncLetta:
+    def __init__(self, token=None, base_url=None, **kwargs):
+        self.agents = _Agents()
+        self.blocks = _Blocks()
+        self.runs = _Runs()
+
+
+class Letta(AsyncLetta):
+    pass
+
+
+letta_client.Letta = Letta
+letta_client.AsyncLetta = AsyncLetta
+sys.modules['letta_client'] = letta_client
+
+
+from async_memory import AsyncMemory  # noqa: E402
+
+
+def test_async_subject_blocks_roundtrip():
+    async def scenario():
+        memory = AsyncMemory(api_key="test", subject_id="async_user")
+        await memory.initialize_memory("prefs", "Preferences", value="Likes tea")
+        assert await memory.get_memory("prefs") == "Likes tea"
+        formatted = await memory.get_memory("prefs", prompt_formatted=True)
+        assert formatted.startswith("<prefs") and "Likes tea" in formatted
+
+        labels = [b.label for b in await memory.list_blocks()]
+        assert labels == ["prefs"]
+
+        await memory.delete_block("prefs")
+        assert await memory.get_memory("prefs") is None
+
+    asyncio.run(scenario())
+
+
+def test_async_user_helpers_and_search():
+    async def scenario():
+        memory = AsyncMemory(api_key="test")
+        await memory.initialize_user_memory("async_bob", user_context_block_value="Name: Bob", reset=True)
+        run = await memory.add_messages(
+            "async_bob", [{"role": "user", "content": "I love cats"}], skip_vector_storage=False
+        )
+        await memory.wait_for_run(run, timeout=5)
+
+        assert await memory.get_user_memory("async_bob") == "Name: Bob"
+        assert await memory.get_summary("async_bob", prompt_formatted=True) == "<conversation_summary></conversation_summary>"
+        assert await memory.search("async_bob", "cats") == ["I love cats"]
+
+        await memory.delete_user("async_bob")
+        assert await memory.get_memory_agent_id("async_bob") is None
+
+    asyncio.run(scenario())
+
+
+def test_wait_for_run_yields_to_event_loop():
+    async def scenario():
+        memory = AsyncMemory(api_key="test", subject_id="async_loop")
+        run = await memory.add_messages([{"role": "user", "content": "hello"}])
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        task = asyncio.ensure_future(ticker())
+        await memory.wait_for_run(run, timeout=5)
+        task.cancel()
+        assert ticks > 1
+
+    asyncio.run(scenario())
+
+
+def test_async_initialize_subject_without_reset_raises():
+    async def scenario():
+        memory = AsyncMemory(api_key="test")
+        await memory.initialize_subject("async_project", reset=True)
+        with pytest.raises(ValueError, match="already exists"):
+            await memory.initialize_subject("async_project")
+
+    asyncio.run(scenario())
+
+
+def test_async_memory_rejects_sync_only_options():
+    from agent_pool import PoolPolicy
+    from buffer import BufferPolicy
+
+    with pytest.raises(ValueError, match="message_buffer is not supported by AsyncMemory"):
+        AsyncMemory(api_key="test", message_buffer=BufferPolicy())
+    with pytest.raises(ValueError, match="agent_pool is not supported by AsyncMemory"):
+        AsyncMemory(api_key="test", agent_pool=PoolPolicy())
+
+
+def test_memory_base_requires_create_client():
+    from ai_memory_sdk import _MemoryBase
+
+    class Incomplete(_MemoryBase):
+        pass
+
+    with pytest.raises(TypeError, match="_create_client"):
+        Incomplete(api_key="test")
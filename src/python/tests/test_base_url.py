@@ -5,7 +5,7 @@ import types
 letta_client = types.ModuleType("letta_client")
 
 class Letta:
-    def __init__(self, token=None, base_url=None):
+    def __init__(self, token=None, base_url=None, **kwargs):
         self.token = token
         self.base_url = base_url
 
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from benchmarks.emulator import EmulatedApiError, EndpointProfile, Fixed, LettaEmulator
+from benchmarks.workloads import WORKLOADS, BenchEnv, percentile, run_benchmarks, run_workload
+
+
+def test_emulator_injects_latency_and_counts_calls():
+    emulator = LettaEmulator(profiles={"agents.create": EndpointProfile(Fixed(0.05))})
+    start = time.perf_counter()
+    agent = emulator.agents.create(name="a", tags=["x"])
+    assert time.perf_counter() - start >= 0.05
+    emulator.agents.blocks.list(agent.id)
+    assert emulator.agents.list(tags=["x"])[0].id == agent.id
+    assert emulator.calls() == {"agents.create": 1, "agents.blocks.list": 1, "agents.list": 1}
+
+    with emulator.bypassed():
+        emulator.agents.list()
+    assert emulator.calls()["agents.list"] == 1
+
+
+def test_emulator_errors_and_rate_limits():
+    emulator = LettaEmulator(profiles={
+        "agents.list": EndpointProfile(error_rate=1.0),
+        "runs.retrieve": EndpointProfile(rate_limit=1.0, burst=2),
+    })
+    with pytest.raises(EmulatedApiError) as failed:
+        emulator.agents.list()
+    assert failed.value.status_code == 500
+
+    run_statuses = []
+    for _ in range(3):
+        try:
+            emulator.runs.retrieve("run-missing")
+        except EmulatedApiError as e:
+            run_statuses.append(e.status_code)
+        except LookupError:
+            run_statuses.append("served")
+    assert run_statuses == ["served", "served", 429]
+    assert emulator.errors() == {"429": 1, "500": 1}
+
+
+def test_percentile():
+    assert percentile([], 50) is None
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile([0, 10], 95) == pytest.approx(9.5)
+
+
+def test_workloads_report_latency_and_calls_per_op():
+    results = run_benchmarks(sorted(WORKLOADS), ops=12, concurrency=4, users=3, time_scale=0.0)
+    by_name = {r.workload: r for r in results}
+    assert set(by_name) == set(WORKLOADS)
+    for result in results:
+        assert result.errors == 0 and result.ops == 12
+        assert result.p50_ms <= result.p95_ms <= result.p99_ms
+        assert result.upstream_calls_per_op == pytest.approx(sum(result.calls_per_op.values()), abs=0.01)
+    assert by_name["onboarding"].calls_per_op["agents.create"] == 1.0
+
+
+def test_failed_operations_are_counted():
+    env = BenchEnv(LettaEmulator(profiles={"agents.passages.search": EndpointProfile(error_rate=1.0)}, time_scale=0.0), users=2)
+    try:
+        result = run_workload(WORKLOADS["archival_search"], env, ops=5, concurrency=2)
+    finally:
+        env.close()
+    assert result.errors == 5 and result.error_types == {"EmulatedApiError(500)": 5}
+    assert result.p50_ms is None
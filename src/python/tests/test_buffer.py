@@ -0,0 +1,167 @@
+import gc
+import sys
+import time
+import weakref
+import types
+
+import pytest
+
+
+# Fake letta_client that records every sleeptime run started
+letta_client = types.ModuleType("letta_client")
+
+
+class _Storage:
+    def __init__(self):
+        self.agents = {}
+        self.runs = []  # (agent_id, messages) per create_async call
+        self.passages = []
+        self.agent_counter = 0
+        self.fail_runs = False
+
+
+_store = _Storage()
+
+
+class _AgentsMessages:
+    def create_async(self, agent_id: str, messages):
+        if _store.fail_runs:
+            raise RuntimeError("upstream unavailable")
+        _store.runs.append((agent_id, messages))
+        return types.SimpleNamespace(id=f"run-{len(_store.runs)}")
+
+
+class _AgentsPassages:
+    def create(self, agent_id: str, text: str, tags=None):
+        _store.passages.append({"agent_id": agent_id, "text": text})
+        return [types.SimpleNamespace(id=f"passage-{len(_store.passages)}")]
+
+
+class _Agents:
+    def __init__(self):
+        self.messages = _AgentsMessages()
+        self.passages = _AgentsPassages()
+
+    def create(self, name: str, model: str, agent_type: str, initial_message_sequence, tags):
+        _store.agent_counter += 1
+        agent_id = f"agent-{_store.agent_counter}"
+        _store.agents[agent_id] = {"id": agent_id, "name": name, "tags": tags}
+        return types.SimpleNamespace(id=agent_id)
+
+    def list(self, tags, match_all_tags=True):
+        return [types.SimpleNamespace(**a) for a in _store.agents.values() if all(t in a["tags"] for t in tags)]
+
+
+class Letta:
+    def __init__(self, token=None, base_url=None, **kwargs):
+        self.agents = _Agents()
+
+
+letta_client.Letta = Letta
+sys.modules['letta_client'] = letta_client
+
+
+from ai_memory_sdk import Memory  # noqa: E402
+import buffer  # noqa: E402
+from buffer import BufferPolicy, MessageBuffer  # noqa: E402
+
+
+def _turn(i):
+    return [{"role": "user", "content": f"question {i}"}, {"role": "assistant", "content": f"answer {i}"}]
+
+
+@pytest.fixture(autouse=True)
+def reset_store():
+    _store.runs.clear()
+    _store.passages.clear()
+    _store.fail_runs = False
+
+
+def test_unbuffered_memory_starts_a_run_per_call():
+    memory = Memory(api_key="test", subject_id="plain")
+    assert memory.add_messages(_turn(0)) == "run-1"
+    assert memory.add_messages(_turn(1)) == "run-2"
+    assert memory.flush() == []
+
+
+def test_buffer_flushes_on_message_count():
+    memory = Memory(api_key="test", subject_id="chatty", message_buffer=BufferPolicy(max_messages=6, flush_interval=None))
+
+    assert memory.add_messages(_turn(0)) is None
+    assert memory.add_messages(_turn(1)) is None
+    assert _store.runs == []
+
+    assert memory.add_messages(_turn(2)) == "run-1"
+    assert len(_store.runs) == 1
+    content = _store.runs[0][1][0]["content"]
+    assert "question 0" in content and "answer 2" in content
+    memory.close()
+
+
+def test_buffer_flushes_on_character_budget():
+    policy = BufferPolicy(max_messages=100, max_chars=50, flush_interval=None)
+    memory = Memory(api_key="test", subject_id="wordy", message_buffer=policy)
+
+    assert memory.add_messages([{"role": "user", "content": "x" * 30}]) is None
+    assert memory.add_messages([{"role": "user", "content": "y" * 30}]) == "run-1"
+    memory.close()
+
+
+def test_buffer_flushes_on_interval():
+    memory = Memory(api_key="test", subject_id="slow_chat", message_buffer=BufferPolicy(flush_interval=0.1))
+
+    memory.add_messages(_turn(0))
+    deadline = time.monotonic() + 2
+    while not _store.runs and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+    assert len(_store.runs) == 1
+    memory.close()
+
+
+def test_buffers_are_per_subject_and_flushed_on_close():
+    memory = Memory(api_key="test", message_buffer=BufferPolicy(flush_interval=None))
+    memory.add_messages_for_subject("alpha", _turn(0))
+    memory.add_messages_for_subject("beta", _turn(1))
+    memory.add_messages_for_subject("alpha", _turn(2), skip_vector_storage=False)
+
+    assert memory.flush("alpha") == ["run-1", "run-2"]
+    assert [p["text"] for p in _store.passages if not p["text"].startswith("Initialized")] == ["question 2", "answer 2"]
+
+    memory.close()
+    assert len(_store.runs) == 3
+    assert "question 1" in _store.runs[2][1][0]["content"]
+
+
+def test_failed_flush_keeps_messages_queued():
+    memory = Memory(api_key="test", subject_id="flaky", message_buffer=BufferPolicy(flush_interval=None))
+    memory.add_messages(_turn(0))
+
+    _store.fail_runs = True
+    with pytest.raises(RuntimeError, match="unavailable"):
+        memory.flush()
+    memory.add_messages(_turn(1))
+
+    _store.fail_runs = False
+    assert memory.flush() == ["run-1"]
+    content = _store.runs[0][1][0]["content"]
+    assert content.index("question 0") < content.index("question 1")
+    memory.close()
+
+
+def test_dropped_buffer_is_collected_without_flushing(caplog):
+    flushed = []
+    open_before = len(buffer._open_buffers)
+    message_buffer = MessageBuffer(BufferPolicy(flush_interval=60.0), lambda key, messages: flushed.append((key, messages)))
+    message_buffer.add("alpha", _turn(0))
+    timer = message_buffer._timer
+    ref = weakref.ref(message_buffer)
+
+    del message_buffer
+    gc.collect()
+    assert ref() is None and len(buffer._open_buffers) <= open_before
+    # no network I/O from the finalizer: the queued messages are reported, not sent
+    assert flushed == []
+    assert "2 buffered messages were not sent" in caplog.text
+    timer.join(timeout=2)
+    assert not timer.is_alive()
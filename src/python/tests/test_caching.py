@@ -0,0 +1,317 @@
+import sys
+import types
+from collections import Counter
+
+import pytest
+
+
+# Fake letta_client that counts upstream calls so cache hits can be asserted
+letta_client = types.ModuleType("letta_client")
+
+
+class _Storage:
+    def __init__(self):
+        self.agents = {}
+        self.agent_blocks = {}
+        self.blocks = {}
+        self.run_counter = 0
+        self.agent_counter = 0
+        self.block_counter = 0
+        self.calls = Counter()
+
+
+_store = _Storage()
+
+
+class _AgentsBlocks:
+    def attach(self, agent_id: str, block_id: str):
+        _store.calls["agents.blocks.attach"] += 1
+        _store.agent_blocks.setdefault(agent_id, [])
+        if block_id not in _store.agent_blocks[agent_id]:
+            _store.agent_blocks[agent_id].append(block_id)
+
+    def list(self, agent_id: str):
+        _store.calls["agents.blocks.list"] += 1
+        ids = _store.agent_blocks.get(agent_id, [])
+        return [types.SimpleNamespace(**_store.blocks[i]) for i in ids if i in _store.blocks]
+
+    def detach(self, agent_id: str, block_id: str):
+        _store.calls["agents.blocks.detach"] += 1
+        ids = _store.agent_blocks.get(agent_id, [])
+        _store.agent_blocks[agent_id] = [i for i in ids if i != block_id]
+
+    def retrieve(self, agent_id: str, label: str):
+        _store.calls["agents.blocks.retrieve"] += 1
+        for i in _store.agent_blocks.get(agent_id, []):
+            if i in _store.blocks and _store.blocks[i]["label"] == label:
+                return types.SimpleNamespace(**_store.blocks[i])
+        raise KeyError("Block not found")
+
+
+class _AgentsMessages:
+    def create_async(self, agent_id: str, messages):
+        _store.calls["agents.messages.create_async"] += 1
+        _store.run_counter += 1
+        return types.SimpleNamespace(id=f"run-{_store.run_counter}")
+
+
+class _AgentsPassages:
+    def create(self, agent_id: str, text: str, tags=None):
+        _store.calls["agents.passages.create"] += 1
+        return [types.SimpleNamespace(id=f"passage-{agent_id}", text=text)]
+
+    def search(self, agent_id: str, query: str, tags=None, **options):
+        _store.calls["agents.passages.search"] += 1
+        result = types.SimpleNamespace(content=f"match for {query}", timestamp=None, tags=tags)
+        return types.SimpleNamespace(results=[result])
+
+
+class _Agents:
+    def __init__(self):
+        self.blocks = _AgentsBlocks()
+        self.messages = _AgentsMessages()
+        self.passages = _AgentsPassages()
+
+    def create(self, name: str, model: str, agent_type: str, initial_message_sequence, tags):
+        _store.calls["agents.create"] += 1
+        _store.agent_counter += 1
+        agent_id = f"agent-{_store.agent_counter}"
+        _store.agents[agent_id] = {"id": agent_id, "name": name, "tags": tags}
+        _store.agent_blocks[agent_id] = []
+        return types.SimpleNamespace(id=agent_id)
+
+    def list(self, tags, match_all_tags=True):
+        _store.calls["agents.list"] += 1
+        return [types.SimpleNamespace(**a) for a in _store.agents.values() if all(t in a["tags"] for t in tags)]
+
+    def delete(self, agent_id: str):
+        _store.calls["agents.delete"] += 1
+        _store.agents.pop(agent_id, None)
+        _store.agent_blocks.pop(agent_id, None)
+
+
+class _Blocks:
+    def create(self, label: str, description: str, limit: int, value: str):
+        _store.calls["blocks.create"] += 1
+        _store.block_counter += 1
+        block_id = f"block-{_store.block_counter}"
+        _store.blocks[block_id] = {
+            "id": block_id,
+            "label": label,
+            "description": description,
+            "limit": limit,
+            "value": value,
+        }
+        return types.SimpleNamespace(**_store.blocks[block_id])
+
+    def delete(self, block_id: str):
+        _store.calls["blocks.delete"] += 1
+        _store.blocks.pop(block_id, None)
+
+
+class _Runs:
+    def retrieve(self, run_id: str):
+        _store.calls["runs.retrieve"] += 1
+        return types.SimpleNamespace(id=run_id, status="completed")
+
+
+class Letta:
+    def __init__(self, token=None, base_url=None, **kwargs):
+        self.agents = _Agents()
+        self.blocks = _Blocks()
+        self.runs = _Runs()
+
+
+letta_client.Letta = Letta
+sys.modules['letta_client'] = letta_client
+
+
+from ai_memory_sdk import Memory  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    _store.calls.clear()
+    yield
+
+
+def test_subject_lookup_is_cached():
+    memory = Memory(api_key="test", subject_id="cache_user")
+    memory.initialize_memory("notes", "Notes", value="hello")
+    _store.calls.clear()
+
+    memory.list_blocks()
+    memory.list_blocks()
+    memory.add_messages([{"role": "user", "content": "hi"}])
+
+    assert _store.calls["agents.list"] == 0
+
+
+def test_subject_cache_disabled():
+    memory = Memory(api_key="test", subject_id="cache_user_off", subject_cache_size=0)
+    memory.initialize_subject("cache_user_off")
+    _store.calls.clear()
+
+    memory.list_blocks()
+    memory.list_blocks()
+
+    assert _store.calls["agents.list"] == 2
+
+
+def test_subject_cache_ttl_expires(monkeypatch):
+    memory = Memory(api_key="test", subject_id="cache_user_ttl", subject_cache_ttl=10)
+    memory.initialize_subject("cache_user_ttl")
+    _store.calls.clear()
+
+    import cache
+    now = cache.time.monotonic()
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now + 11)
+    memory.list_blocks()
+
+    assert _store.calls["agents.list"] == 1
+
+
+def test_delete_invalidates_cached_agent():
+    memory = Memory(api_key="test")
+    memory.initialize_user_memory("cache_user_del", reset=True)
+    assert memory.get_memory_agent_id("cache_user_del") is not None
+
+    memory.delete_user("cache_user_del")
+
+    assert memory.get_memory_agent_id("cache_user_del") is None
+
+
+def test_initialize_subject_reset_returns_new_agent():
+    memory = Memory(api_key="test")
+    first = memory.initialize_subject("cache_project", reset=True)
+    second = memory.initialize_subject("cache_project", reset=True)
+
+    assert first != second
+    assert memory._get_agent_for_subject("cache_project").id == second
+
+
+def test_max_staleness_serves_block_without_upstream_calls():
+    memory = Memory(api_key="test", subject_id="block_user")
+    memory.initialize_memory("prefs", "Preferences", value="tea")
+    assert memory.get_memory("prefs") == "tea"
+    _store.calls.clear()
+
+    assert memory.get_memory("prefs", max_staleness=30) == "tea"
+    assert memory.get_memory("prefs", max_staleness=30, prompt_formatted=True).startswith("<prefs")
+    assert memory.get_memory("missing", max_staleness=30) is None
+    memory.get_memory("missing", max_staleness=30)
+
+    assert sum(_store.calls.values()) == 1  # only the first lookup of "missing" lists blocks
+
+
+def test_default_reads_stay_fresh():
+    memory = Memory(api_key="test", subject_id="block_user_fresh")
+    memory.initialize_memory("prefs", "Preferences", value="tea")
+    block_id = memory.initialize_memory("prefs", "Preferences")
+    _store.blocks[block_id]["value"] = "coffee"  # updated server-side, e.g. by the sleeptime agent
+
+    assert memory.get_memory("prefs", max_staleness=30) == "tea"
+    assert memory.get_memory("prefs") == "coffee"
+    assert memory.get_memory("prefs", max_staleness=30) == "coffee"
+
+
+def test_block_cache_invalidated_by_reset_delete_and_run_completion():
+    memory = Memory(api_key="test", subject_id="block_user_inval")
+    memory.initialize_memory("prefs", "Preferences", value="v1")
+
+    memory.initialize_memory("prefs", "Preferences", value="v2", reset=True)
+    assert memory.get_memory("prefs", max_staleness=30) == "v2"
+
+    memory.delete_block("prefs")
+    assert memory.get_memory("prefs", max_staleness=30) is None
+
+    block_id = memory.initialize_memory("prefs", "Preferences", value="v3")
+    run = memory.add_messages([{"role": "user", "content": "I now prefer juice"}])
+    _store.blocks[block_id]["value"] = "v4"
+    memory.wait_for_run(run)
+    assert memory.get_memory("prefs", max_staleness=30) == "v4"
+
+
+def test_user_helpers_accept_max_staleness():
+    memory = Memory(api_key="test")
+    memory.initialize_user_memory("block_legacy_user", user_context_block_value="Name: Ada", reset=True)
+    assert memory.get_user_memory("block_legacy_user") == "Name: Ada"
+    memory.get_summary("block_legacy_user")
+    _store.calls.clear()
+
+    assert memory.get_user_memory("block_legacy_user", max_staleness=30) == "Name: Ada"
+    assert memory.get_summary("block_legacy_user", max_staleness=30, prompt_formatted=True) == (
+        "<conversation_summary></conversation_summary>"
+    )
+    assert sum(_store.calls.values()) == 0
+
+
+def test_search_results_are_cached_until_new_passages():
+    memory = Memory(api_key="test")
+    memory.initialize_user_memory("searcher", reset=True)
+
+    first = memory.search("searcher", "Favorite  foods")
+    first.append("caller mutation")
+    assert memory.search("searcher", "favorite foods") == ["match for Favorite  foods"]
+    assert _store.calls["agents.passages.search"] == 1
+    memory.search("searcher", "favorite foods", tags=["assistant"])
+    assert _store.calls["agents.passages.search"] == 2
+
+    memory.add_messages("searcher", [{"role": "user", "content": "I like ramen"}], skip_vector_storage=False)
+    memory.search("searcher", "favorite foods")
+    assert _store.calls["agents.passages.search"] == 3
+
+    stats = memory.search_cache_stats()
+    assert (stats.hits, stats.misses) == (1, 3)
+
+
+def test_search_pushes_options_to_server(monkeypatch):
+    seen = {}
+
+    def search(self, agent_id, query, tags=None, **options):
+        seen.update(options)
+        results = [
+            types.SimpleNamespace(content=f"hit {i}", timestamp=f"2025-01-0{i + 1}T00:00:00", tags=["user"])
+            for i in range(options.get("top_k", 10))
+        ]
+        return types.SimpleNamespace(results=results)
+
+    monkeypatch.setattr(_AgentsPassages, "search", search)
+    memory = Memory(api_key="test")
+    memory.initialize_user_memory("pusher", reset=True)
+
+    from datetime import datetime
+    hits = memory.search("pusher", "anything", limit=2, start_datetime=datetime(2025, 1, 1), end_datetime="2025-02-01")
+
+    assert seen == {"top_k": 2, "start_datetime": "2025-01-01T00:00:00", "end_datetime": "2025-02-01"}
+    assert hits == ["hit 0", "hit 1"]
+    assert hits[1].timestamp == "2025-01-02T00:00:00" and hits[1].tags == ["user"] and hits[1].score is None
+    # different options are cached separately
+    assert len(memory.search("pusher", "anything", limit=3)) == 3
+
+
+def test_context_bundle_lists_blocks_once():
+    memory = Memory(api_key="test")
+    memory.initialize_user_memory("bundled", user_context_block_value="Name: Ada", reset=True)
+    memory.initialize_memory("prefs", "Preferences", value="Likes tea", subject_id="bundled")
+    _store.calls.clear()
+
+    bundle = memory.get_context_bundle("bundled", labels=["human", "prefs", "missing"], query="tea", k=2)
+
+    assert [b.label for b in bundle.blocks] == ["human", "prefs"]
+    assert bundle.block("prefs").value == "Likes tea"
+    assert bundle.memories == ["match for tea"]
+    assert bundle.prompt == (
+        '<human description="Details about the human user you are speaking to.">Name: Ada</human>\n\n'
+        '<prefs description="Preferences">Likes tea</prefs>\n\n'
+        "<relevant_memories>\n1. match for tea\n</relevant_memories>"
+    )
+    assert _store.calls["agents.blocks.list"] == 1
+    assert _store.calls["agents.blocks.retrieve"] == 0
+    assert _store.calls["agents.list"] == 0
+
+    # with max_staleness every block comes from the cache and the repeated search from the search cache
+    _store.calls.clear()
+    again = memory.get_context_bundle("bundled", labels=["human", "prefs"], query="tea", k=2, max_staleness=60)
+    assert again.prompt == bundle.prompt
+    assert sum(_store.calls.values()) == 0
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+from ai_memory_sdk import Memory
+from async_memory import AsyncMemory
+from call_stats import OTHER
+from local_backend import LocalLetta
+
+
+def _memory_with_user(**kwargs):
+    memory = Memory(backend=LocalLetta(), **kwargs)
+    memory.initialize_user_memory("alice", user_context_block_value="Likes tea")
+    memory.add_passages([{"text": "Alice ordered a teapot", "tags": ["user"]}], subject_id="alice")
+    return memory
+
+
+def test_context_bundle_call_budget():
+    memory = _memory_with_user()
+    memory.get_context_bundle("alice")  # warms the subject -> agent lookup
+
+    with memory.track_calls() as calls:
+        bundle = memory.get_context_bundle("alice", query="teapot")
+    assert bundle.memories and bundle.block("human").value == "Likes tea"
+    stats = calls.stats()
+    assert stats.total <= 2
+    assert stats.by_endpoint == {"agents.blocks.list": 1, "agents.passages.search": 1}
+    # the search ran on the executor and is still attributed to the public method
+    assert stats.calls("get_context_bundle") == stats.total
+
+
+def test_stats_attribute_calls_to_outermost_public_method():
+    memory = Memory(backend=LocalLetta())
+    memory.initialize_user_memory("bob")
+    memory.get_user_memory("bob")
+    stats = memory.stats()
+
+    assert stats.calls("initialize_user_memory", "agents.create") == 1
+    assert stats.calls("get_user_memory") >= 1
+    assert set(stats.by_operation) == {"initialize_user_memory", "get_user_memory"}
+    assert stats.total == sum(stats.by_endpoint.values()) == stats.calls()
+
+    memory.reset_stats()
+    assert memory.stats().total == 0
+
+
+def test_scopes_are_isolated_and_direct_calls_count_as_other():
+    memory = _memory_with_user()
+    with memory.track_calls() as outer:
+        memory.get_user_memory("alice")
+        with memory.track_calls() as inner:
+            memory._upstream.agents.list()
+    assert inner.stats().by_operation == {OTHER: {"agents.list": 1}}
+    assert outer.total == inner.total + memory.stats().calls("get_user_memory")
+
+
+def test_scopes_only_count_their_own_context():
+    memory = _memory_with_user()
+    memory.get_context_bundle("alice")
+    barrier = threading.Barrier(4)
+    totals = []
+
+    def request(i):
+        with memory.track_calls() as calls:
+            barrier.wait()
+            for n in range(i + 1):
+                memory.get_context_bundle("alice", query=f"teapot {i} {n}")
+            barrier.wait()
+        totals.append((i, calls.stats().calls(endpoint="agents.passages.search")))
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # each search ran on the executor, and is still counted only by the scope that asked for it
+    assert sorted(totals) == [(0, 1), (1, 2), (2, 3), (3, 4)]
+
+
+def test_async_memory_counts_calls():
+    async def main():
+        memory = AsyncMemory(backend=LocalLetta())
+        await memory.initialize_subject("customer-1")
+        with memory.track_calls() as calls:
+            await memory.get_context_bundle("customer-1", query="anything")
+        return calls.stats()
+
+    stats = asyncio.run(main())
+    assert stats.by_endpoint == {"agents.blocks.list": 1, "agents.passages.search": 1}
+    assert set(stats.by_operation) == {"get_context_bundle"}
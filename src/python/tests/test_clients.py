@@ -0,0 +1,73 @@
+import asyncio
+import sys
+import types
+
+import httpx
+
+
+# Create a fake letta_client module whose clients record how they were built
+letta_client = types.ModuleType("letta_client")
+
+
+class Letta:
+    def __init__(self, token=None, base_url=None, httpx_client=None, timeout=None):
+        self.token = token
+        self.base_url = base_url
+        self.httpx_client = httpx_client
+        self.timeout = timeout
+
+
+class AsyncLetta(Letta):
+    pass
+
+
+letta_client.Letta = Letta
+letta_client.AsyncLetta = AsyncLetta
+sys.modules['letta_client'] = letta_client
+
+from ai_memory_sdk import Memory  # noqa: E402
+from async_memory import AsyncMemory  # noqa: E402
+from clients import ClientOptions  # noqa: E402
+
+
+def test_instances_share_client_per_server_and_key():
+    a = Memory(api_key="key-1", subject_id="customer-a")
+    b = Memory(api_key="key-1", subject_id="customer-b")
+    other_key = Memory(api_key="key-2")
+    self_hosted = Memory(api_key="key-1", base_url="http://localhost:8283")
+
+    assert a.letta_client is b.letta_client
+    assert other_key.letta_client is not a.letta_client
+    assert self_hosted.letta_client is not a.letta_client
+    assert self_hosted.letta_client.base_url == "http://localhost:8283"
+    assert isinstance(a.letta_client.httpx_client, httpx.Client)
+
+
+def test_options_configure_a_separate_pool():
+    options = ClientOptions(max_connections=4, timeout=5.0, connect_timeout=1.0, http2=False)
+    tuned = Memory(api_key="key-1", http_options=options)
+    default = Memory(api_key="key-1")
+
+    assert tuned.letta_client is not default.letta_client
+    assert tuned.letta_client is Memory(api_key="key-1", http_options=options).letta_client
+    assert tuned.letta_client.timeout == 5.0
+    assert tuned.letta_client.httpx_client.timeout == httpx.Timeout(5.0, connect=1.0)
+
+
+def test_share_client_false_gets_own_client():
+    shared = Memory(api_key="key-1")
+    private = Memory(api_key="key-1", share_client=False)
+
+    assert private.letta_client is not shared.letta_client
+
+
+def test_async_clients_are_shared_within_a_loop():
+    async def build():
+        a, b = AsyncMemory(api_key="key-1"), AsyncMemory(api_key="key-1")
+        assert a.letta_client is b.letta_client
+        assert isinstance(a.letta_client.httpx_client, httpx.AsyncClient)
+        return a.letta_client
+
+    first = asyncio.run(build())
+    second = asyncio.run(build())
+    assert first is not second
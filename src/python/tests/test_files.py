@@ -0,0 +1,156 @@
+import os
+import sys
+import tracemalloc
+import types
+
+
+# Fake letta_client that records the message content of every run
+letta_client = types.ModuleType("letta_client")
+
+
+class _Storage:
+    def __init__(self):
+        self.agents = {}
+        self.runs = []  # content of each create_async message
+        self.agent_counter = 0
+
+
+_store = _Storage()
+
+
+class _AgentsMessages:
+    def create_async(self, agent_id: str, messages):
+        _store.runs.append(messages[0]["content"])
+        return types.SimpleNamespace(id=f"run-{len(_store.runs)}")
+
+
+class _AgentsPassages:
+    def create(self, agent_id: str, text: str, tags=None):
+        return [types.SimpleNamespace(id="passage")]
+
+
+class _Agents:
+    def __init__(self):
+        self.messages = _AgentsMessages()
+        self.passages = _AgentsPassages()
+
+    def create(self, name: str, model: str, agent_type: str, initial_message_sequence, tags):
+        _store.agent_counter += 1
+        agent_id = f"agent-{_store.agent_counter}"
+        _store.agents[agent_id] = {"id": agent_id, "name": name, "tags": tags}
+        return types.SimpleNamespace(id=agent_id)
+
+    def list(self, tags, match_all_tags=True):
+        return [types.SimpleNamespace(**a) for a in _store.agents.values() if all(t in a["tags"] for t in tags)]
+
+
+class Letta:
+    def __init__(self, token=None, base_url=None, **kwargs):
+        self.agents = _Agents()
+
+
+letta_client.Letta = Letta
+sys.modules['letta_client'] = letta_client
+
+
+from ai_memory_sdk import Memory  # noqa: E402
+import prompt_formatter  # noqa: E402
+
+
+def test_add_files_sends_one_run_per_part(tmp_path):
+    (tmp_path / "a.txt").write_text("x" * 45000, encoding="utf-8")
+    (tmp_path / "empty.txt").write_text("", encoding="utf-8")
+    memory = Memory(api_key="test", subject_id="docs")
+    _store.runs.clear()
+
+    run_ids = memory.add_files([
+        {"file_path": str(tmp_path / "a.txt"), "description": "A big file"},
+        {"file_path": str(tmp_path / "empty.txt")},
+    ])
+
+    assert run_ids == ["run-3", None]
+    assert len(_store.runs) == 3
+    assert all('label="a.txt" description="A big file"' in c for c in _store.runs)
+    assert "part=3/3" in _store.runs[-1]
+    # the returned id stands for every part of the file
+    assert memory._run_groups.get("run-3") == ["run-1", "run-2"]
+
+
+def test_add_files_memory_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(_AgentsMessages, "create_async", lambda self, agent_id, messages: types.SimpleNamespace(id="run"))
+    path = tmp_path / "big.log"
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(200):
+            f.write("log line\n" * 5000)  # ~9 MB total
+    memory = Memory(api_key="test", subject_id="logs")
+
+    tracemalloc.start()
+    memory.add_files([{"file_path": str(path)}])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert peak < 20 * prompt_formatter.file_char_limit
+
+
+def _write_tree(root, files):
+    for rel, text in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+
+
+def test_sync_directory_only_reingests_changed_files(tmp_path, monkeypatch):
+    import file_sync
+
+    docs = tmp_path / "kb"
+    _write_tree(docs, {"a.md": "alpha", "b.md": "beta", "sub/c.md": "gamma", ".hidden": "skip"})
+    memory = Memory(api_key="test", subject_id="kb")
+    _store.runs.clear()
+
+    first = memory.sync_directory(str(docs), description="Knowledge base")
+    assert first.ingested == ["a.md", "b.md", os.path.join("sub", "c.md")]
+    assert len(_store.runs) == 3
+    assert (docs / ".ai_memory_sync.kb.json").exists()
+
+    # untouched files are skipped from size/mtime alone, without hashing
+    hashed = []
+    real_hash_files = file_sync.hash_files
+
+    def recording_hash_files(paths, max_workers=None):
+        hashed.extend(paths)
+        return real_hash_files(paths, max_workers=1)
+
+    monkeypatch.setattr(file_sync, "hash_files", recording_hash_files)
+    second = memory.sync_directory(str(docs))
+    assert second.ingested == [] and hashed == []
+
+    # a rewrite with identical content is hashed but not re-sent; a real edit is
+    (docs / "a.md").write_text("alpha", encoding="utf-8")
+    os.utime(docs / "a.md", (1, 1))
+    (docs / "b.md").write_text("beta v2", encoding="utf-8")
+    (docs / "sub" / "c.md").unlink()
+    third = memory.sync_directory(str(docs))
+
+    assert third.ingested == ["b.md"]
+    assert third.removed == [os.path.join("sub", "c.md")]
+    assert "a.md" in third.unchanged
+    assert len(_store.runs) == 4 and "beta v2" in _store.runs[-1]
+
+
+def test_hash_files_in_thread_pool(tmp_path, monkeypatch):
+    from multiprocessing.process import BaseProcess
+
+    from file_sync import hash_file, hash_files
+
+    # hashing must never fork: the SDK's background threads could hold locks at fork time
+    def no_fork(*args, **kwargs):
+        raise AssertionError("hash_files started a process")
+    monkeypatch.setattr(BaseProcess, "start", no_fork)
+
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"f{i}.txt"
+        path.write_bytes(os.urandom(1000 + i))
+        paths.append(str(path))
+
+    assert hash_files(paths, max_workers=2) == [hash_file(p) for p in paths]
@@ -0,0 +1,216 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from ai_memory_sdk import Memory
+from async_memory import AsyncMemory
+from dedupe import PassageDedupe
+from local_backend import LocalLetta, NotFoundError
+from subject_index import SubjectIndex
+
+
+def _summarize(backend, agent_id, messages):
+    """ Deterministic learner: the summary block becomes the number of messages seen so far """
+    seen = len(backend.messages(agent_id))
+    backend.set_block_value(agent_id, "summary", f"{seen} messages")
+
+
+def test_local_backend_needs_no_letta_client():
+    # a fresh interpreter, where importing letta_client fails even if it is installed
+    script = """
+import asyncio, sys
+sys.modules["letta_client"] = None
+from ai_memory_sdk import Memory
+from async_memory import AsyncMemory
+from local_backend import LocalLetta
+
+memory = Memory(backend=LocalLetta())
+memory.initialize_user_memory("ada", user_context_block_value="Likes tea")
+assert memory.get_user_memory("ada") == "Likes tea"
+
+async def main():
+    memory = AsyncMemory(backend=LocalLetta())
+    await memory.initialize_subject("project")
+    return await memory.get_memory_agent_id("project")
+
+assert asyncio.run(main())
+"""
+    src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", script], cwd=src, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+
+
+def test_memory_runs_against_local_backend():
+    backend = LocalLetta(learner=_summarize)
+    memory = Memory(backend=backend)
+
+    agent_id = memory.initialize_user_memory("alice", user_context_block_value="Likes tea")
+    assert memory.get_memory_agent_id("alice") == agent_id
+    assert memory.get_user_memory("alice") == "Likes tea"
+
+    run_id = memory.add_messages("alice", [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}])
+    memory.wait_for_run(run_id)
+    assert memory.get_summary("alice") == "1 messages"  # messages are formatted into one chunk
+
+    with pytest.raises(ValueError):
+        memory.initialize_user_memory("alice")
+    memory.delete_user("alice")
+    assert memory.get_memory_agent_id("alice") is None
+    assert backend.agents.list() == []
+
+
+def test_bm25_search_ranks_and_filters():
+    backend = LocalLetta()
+    memory = Memory(backend=backend, subject_id="customer-1")
+    memory.add_passages([
+        {"text": "The customer ordered a laptop and a laptop bag", "tags": ["orders"]},
+        {"text": "The customer asked about the laptop warranty", "tags": ["support"]},
+        {"text": "Shipping address is in Berlin", "tags": ["profile"]},
+    ])
+    agent_id = memory._get_agent_for_subject("customer-1").id
+
+    results = backend.agents.passages.search(agent_id, query="laptop", top_k=5).results
+    assert [r.content for r in results] == [
+        "The customer ordered a laptop and a laptop bag",
+        "The customer asked about the laptop warranty",
+    ]
+    assert results[0].score > results[1].score
+    support = backend.agents.passages.search(agent_id, query="laptop", tags=["support"]).results
+    assert [r.content for r in support] == ["The customer asked about the laptop warranty"]
+    assert backend.agents.passages.search(agent_id, query="laptop", end_datetime="2000-01-01T00:00:00Z").results == []
+
+
+def test_state_persists_and_pages(tmp_path):
+    path = str(tmp_path / "memory.db")
+    backend = LocalLetta(path)
+    for i in range(5):
+        backend.agents.create(name=f"agent-{i}", tags=["ai-memory-sdk", f"subj:{i}"])
+    agent_id = backend.agents.list(tags=["subj:3"])[0].id
+    for i in range(5):
+        backend.agents.passages.create(agent_id, text=f"passage {i}")
+    backend.close()
+
+    reopened = LocalLetta(path)
+    first = reopened.agents.list(tags=["ai-memory-sdk"], limit=2)
+    rest = reopened.agents.list(tags=["ai-memory-sdk"], after=first[-1].id, limit=10)
+    assert [a.name for a in first + rest] == [f"agent-{i}" for i in range(5)]
+    assert reopened.agents.list(tags=["subj:1", "subj:2"], match_all_tags=True) == []
+    assert len(reopened.agents.list(tags=["subj:1", "subj:2"], match_all_tags=False)) == 2
+    page = reopened.agents.passages.list(agent_id, limit=2)
+    assert [p.text for p in reopened.agents.passages.list(agent_id, after=page[-1].id)] == [f"passage {i}" for i in range(2, 5)]
+    assert [r.content for r in reopened.agents.passages.search(agent_id, query="passage 4", top_k=1).results] == ["passage 4"]
+
+    block = reopened.blocks.create(label="human", value="x", limit=3)
+    with pytest.raises(ValueError):
+        reopened.blocks.modify(block.id, value="too long")
+    with pytest.raises(NotFoundError):
+        reopened.agents.blocks.retrieve(agent_id, "human")
+    reopened.close()
+
+
+def test_failed_learner_fails_run_and_runs_keep_order():
+    order = []
+
+    def learner(backend, agent_id, messages):
+        order.append(messages[0]["content"])
+        if messages[0]["content"] == "boom":
+            raise RuntimeError("learner failed")
+
+    backend = LocalLetta(learner=learner, workers=4)
+    agent_id = backend.agents.create(name="a").id
+    runs = [backend.agents.messages.create_async(agent_id, messages=[{"role": "user", "content": c}]) for c in ("1", "boom", "3")]
+    assert backend.join(timeout=5)
+    assert order == ["1", "boom", "3"]
+    assert [backend.runs.retrieve(r.id).status for r in runs] == ["completed", "failed", "completed"]
+    assert "learner failed" in backend.runs.retrieve(runs[1].id).error
+
+
+def test_async_memory_wraps_local_backend():
+    async def main():
+        memory = AsyncMemory(backend=LocalLetta())
+        agent_id = await memory.initialize_subject("customer-1")
+        await memory.initialize_memory("preferences", "User preferences", value="Dark mode", subject_id="customer-1")
+        return agent_id, await memory.get_memory("preferences", subject_id="customer-1")
+
+    agent_id, value = asyncio.run(main())
+    assert agent_id.startswith("agent-") and value == "Dark mode"
+
+
+def test_search_sees_passages_from_other_instances(tmp_path):
+    path = str(tmp_path / "shared.db")
+    writer, reader = LocalLetta(path), LocalLetta(path)
+    agent_id = writer.agents.create(name="a").id
+    writer.agents.passages.create(agent_id, text="ordered a laptop")
+    assert [r.content for r in reader.agents.passages.search(agent_id, query="laptop").results] == ["ordered a laptop"]
+
+    # appended by another process after the reader built its index
+    writer.agents.passages.create(agent_id, text="returned the laptop")
+    assert len(reader.agents.passages.search(agent_id, query="laptop").results) == 2
+
+    writer.agents.delete(agent_id)
+    with pytest.raises(NotFoundError):
+        reader.agents.passages.search(agent_id, query="laptop")
+    other = writer.agents.create(name="b").id
+    assert reader.agents.passages.search(other, query="laptop").results == []
+    # interleaved writes: the reader's own passage lands after one it has not seen
+    writer.agents.passages.create(other, text="shipped the laptop")
+    reader.agents.passages.create(other, text="kept")
+    assert [r.content for r in reader.agents.passages.search(other, query="laptop").results] == ["shipped the laptop"]
+    writer.close()
+    reader.close()
+
+
+def _recording(cls, calls, names=None):
+    """ Subclass of cls recording (method, called on the main thread) for its public methods """
+    class Recording(cls):
+        def __getattribute__(self, name):
+            attr = super().__getattribute__(name)
+            if not callable(attr) or name.startswith("_") or (names is not None and name not in names):
+                return attr
+
+            def call(*args, **kwargs):
+                calls.append((name, threading.current_thread() is threading.main_thread()))
+                return attr(*args, **kwargs)
+            return call
+    return Recording
+
+
+def test_async_memory_keeps_sqlite_stores_off_the_event_loop():
+    loop_threads = []
+
+    async def main():
+        memory = AsyncMemory(backend=LocalLetta(), subject_index=_recording(SubjectIndex, loop_threads)(),
+                             passage_dedupe=_recording(PassageDedupe, loop_threads)(seed_existing=True))
+        await memory.initialize_subject("customer-1")
+        await memory.initialize_memory("preferences", "User preferences", value="Dark mode", subject_id="customer-1")
+        await memory.add_passages([{"text": "likes tea"}, {"text": "likes tea"}], subject_id="customer-1")
+        memory._agent_cache.clear()
+        return await memory.get_memory("preferences", subject_id="customer-1")
+
+    assert asyncio.run(main()) == "Dark mode"
+    assert loop_threads and not [name for name, on_loop in loop_threads if on_loop]
+
+
+def test_async_memory_keeps_local_index_off_the_event_loop():
+    pytest.importorskip("numpy")
+    from local_index import LocalIndex
+
+    loop_threads = []
+
+    async def main():
+        index = _recording(LocalIndex, loop_threads, names={"load", "add", "search"})()
+        memory = AsyncMemory(backend=LocalLetta(), local_index=index)
+        await memory.initialize_subject("customer-1")
+        await memory.add_passages([{"text": "likes green tea", "tags": ["user"]}], subject_id="customer-1")
+        first = await memory.search("customer-1", "green tea")  # loads the index
+        await memory.add_passages([{"text": "likes black tea", "tags": ["user"]}], subject_id="customer-1")
+        return first, await memory.search("customer-1", "black tea")  # appended to the loaded index
+
+    first, second = asyncio.run(main())
+    assert first == ["likes green tea"] and second[0] == "likes black tea"
+    assert {name for name, _ in loop_threads} == {"load", "add", "search"}
+    assert not [name for name, on_loop in loop_threads if on_loop]
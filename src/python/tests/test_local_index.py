@@ -0,0 +1,161 @@
+import sys
+import types
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+
+# Fake letta_client that counts remote passage searches
+letta_client = types.ModuleType("letta_client")
+
+
+class _Storage:
+    def __init__(self):
+        self.agents = {}
+        self.passages = []
+        self.agent_counter = 0
+        self.remote_searches = 0
+        self.list_calls = 0
+
+
+_store = _Storage()
+
+
+class _AgentsPassages:
+    def create(self, agent_id: str, text: str, tags=None):
+        _store.passages.append({"id": f"passage-{len(_store.passages)}", "agent_id": agent_id, "text": text, "tags": tags or []})
+        return [types.SimpleNamespace(id=_store.passages[-1]["id"], text=text)]
+
+    def list(self, agent_id: str, after=None, limit=1000):
+        _store.list_calls += 1
+        stored = [types.SimpleNamespace(**p) for p in _store.passages if p["agent_id"] == agent_id]
+        start = next((i + 1 for i, p in enumerate(stored) if p.id == after), 0)
+        return stored[start:start + limit]
+
+    def search(self, agent_id: str, query: str, tags=None):
+        _store.remote_searches += 1
+        results = [
+            types.SimpleNamespace(content=p["text"], timestamp="2025-01-01T00:00:00", tags=p["tags"])
+            for p in _store.passages
+            if p["agent_id"] == agent_id and query in p["text"] and any(t in p["tags"] for t in (tags or p["tags"]))
+        ]
+        return types.SimpleNamespace(results=results)
+
+
+class _Agents:
+    def __init__(self):
+        self.passages = _AgentsPassages()
+        self.messages = types.SimpleNamespace(create_async=lambda agent_id, messages: types.SimpleNamespace(id="run-1"))
+
+    def create(self, name: str, model: str, agent_type: str, initial_message_sequence, tags):
+        _store.agent_counter += 1
+        agent_id = f"agent-{_store.agent_counter}"
+        _store.agents[agent_id] = {"id": agent_id, "name": name, "tags": tags}
+        return types.SimpleNamespace(id=agent_id)
+
+    def list(self, tags, match_all_tags=True):
+        return [types.SimpleNamespace(**a) for a in _store.agents.values() if all(t in a["tags"] for t in tags)]
+
+
+class Letta:
+    def __init__(self, token=None, base_url=None, **kwargs):
+        self.agents = _Agents()
+        self.runs = types.SimpleNamespace(retrieve=lambda run_id: types.SimpleNamespace(id=run_id, status="completed"))
+
+
+letta_client.Letta = Letta
+sys.modules['letta_client'] = letta_client
+
+
+from ai_memory_sdk import Memory  # noqa: E402
+from local_index import HashingEmbedder, LocalIndex  # noqa: E402
+
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    embed = HashingEmbedder(dim=64)
+    a, b = embed(["I love cats", "I love cats"]), embed(["i LOVE cats"])
+
+    assert np.allclose(a[0], a[1]) and np.allclose(a[0], b[0])
+    assert np.isclose(np.linalg.norm(a[0]), 1.0)
+
+
+def test_local_index_top_k_with_tag_filter():
+    index = LocalIndex(top_k=2)
+    index.load("agent", [
+        ("cats are great pets", ["user"]),
+        ("my cats sleep all day", ["user"]),
+        ("dogs bark loudly", ["user"]),
+        ("cats cats cats", ["assistant"]),
+    ])
+
+    hits = index.search("agent", "cats")
+    assert len(hits) == 2 and hits[0].score >= hits[1].score
+    assert {h.text for h in index.search("agent", "cats", tags=["user"])} == {"cats are great pets", "my cats sleep all day"}
+    assert index.search("agent", "spaceships") == []
+    assert index.search("unknown", "cats") is None
+
+
+def test_memory_search_is_served_locally():
+    memory = Memory(api_key="test", local_index=LocalIndex())
+    memory.initialize_subject("local_user")
+    memory.add_messages_for_subject("local_user", [{"role": "user", "content": "I adopted two cats"}], skip_vector_storage=False)
+    _store.remote_searches = 0
+
+    assert memory.search("local_user", "cats") == ["I adopted two cats"]
+    assert _store.list_calls == 1  # loaded once from the server
+
+    # passages written through this instance are indexed immediately
+    memory.add_passages([{"text": "cats prefer fish", "tags": ["user"]}], subject_id="local_user")
+    assert memory.search("local_user", "cats")[0] in {"I adopted two cats", "cats prefer fish"}
+    assert len(memory.search("local_user", "cats")) == 2
+    assert _store.remote_searches == 0 and _store.list_calls == 1
+
+    # nothing similar locally: fall back to the server
+    assert memory.search("local_user", "zebra") == []
+    assert _store.remote_searches == 1
+
+
+def test_weak_local_match_falls_back_to_the_server():
+    memory = Memory(api_key="test", local_index=LocalIndex())
+    memory.initialize_subject("weak_user")
+    memory.add_passages([{"text": "I adopted two cats today", "tags": ["user"]}], subject_id="weak_user")
+    _store.remote_searches = 0
+
+    # the only overlap is "today": not a local answer, so the server's semantic search decides
+    assert memory.search("weak_user", "tell me about the weather today") == []
+    assert _store.remote_searches == 1
+    assert memory.search("weak_user", "two cats") == ["I adopted two cats today"]
+    assert _store.remote_searches == 1
+
+
+def test_local_hits_carry_scores_and_respect_limit_and_threshold():
+    memory = Memory(api_key="test", local_index=LocalIndex())
+    memory.initialize_subject("scored_user")
+    memory.add_passages([
+        {"text": "cats cats cats", "tags": ["user"]},
+        {"text": "cats and dogs", "tags": ["user"]},
+        {"text": "my cats nap", "tags": ["user"]},
+    ], subject_id="scored_user")
+
+    hits = memory.search("scored_user", "cats", limit=2)
+    assert len(hits) == 2 and hits[0].score >= hits[1].score > 0
+
+    strict = memory.search("scored_user", "cats", score_threshold=hits[0].score)
+    assert [h.score for h in strict] == [hits[0].score]
+
+
+def test_finished_run_reloads_local_index():
+    memory = Memory(api_key="test", local_index=LocalIndex())
+    memory.initialize_subject("run_user")
+    run_id = memory.add_messages_for_subject("run_user", [{"role": "user", "content": "I adopted two cats"}])
+    assert memory.search("run_user", "cats") == []  # indexed empty, and the server has nothing either
+    agent_id = memory.get_memory_agent_id("run_user")
+
+    # the sleeptime agent inserts a passage on the server during its run
+    _store.passages.append({"id": "passage-sleeptime", "agent_id": agent_id, "text": "owns two cats", "tags": ["user"]})
+    memory.wait_for_run(run_id)
+    searches, lists = _store.remote_searches, _store.list_calls
+
+    assert memory.search("run_user", "cats") == ["owns two cats"]
+    assert _store.remote_searches == searches and _store.list_calls == lists + 1  # reloaded, answered locally
@@ -0,0 +1,139 @@
+import sys
+import time
+import types
+
+
+# Create a fake letta_client module; MemoryService's fetches are stubbed per test
+letta_client = types.ModuleType("letta_client")
+
+
+class Letta:
+    def __init__(self, *args, **kwargs):
+        self.agents = types.SimpleNamespace(list=lambda **kwargs: [])
+
+
+letta_client.Letta = Letta
+sys.modules['letta_client'] = letta_client
+
+from api.memory_service import MemoryService  # noqa: E402
+from local_backend import LocalLetta  # noqa: E402
+
+
+def _service(delays, **kwargs):
+    service = MemoryService(api_key="test", **kwargs)
+
+    def fetch(name, key, value):
+        def _fetch(*args, **kwargs):
+            delay = delays.get(name, 0)
+            if isinstance(delay, Exception):
+                # what the real methods return when the backend fails
+                return {"success": False, "error": str(delay), key: type(value)()}
+            time.sleep(delay)
+            return {"success": True, key: value}
+        return _fetch
+
+    service.get_user_context = fetch("user_context", "context", "<human>Ada</human>")
+    service.get_summary = fetch("summary", "summary", "<summary>Tea</summary>")
+    service.search_memories = fetch("relevant_memories", "results", ["likes tea"])
+    return service
+
+
+def test_full_context_fetches_concurrently():
+    service = _service({"user_context": 0.3, "summary": 0.3, "relevant_memories": 0.3})
+    start = time.monotonic()
+    result = service.get_full_context("tea", user_id="ada")
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 0.6
+    assert result["degraded"] == []
+    assert result["combined_context"] == (
+        "<human>Ada</human>\n\n<summary>Tea</summary>\n\n<relevant_memories>\n1. likes tea\n</relevant_memories>"
+    )
+
+
+def test_full_context_degrades_parts_past_deadline():
+    service = _service({"relevant_memories": 1.0, "summary": RuntimeError("boom")}, context_timeout=0.2)
+    start = time.monotonic()
+    result = service.get_full_context("tea", user_id="ada")
+
+    assert time.monotonic() - start < 0.6
+    assert result["success"] is True
+    assert sorted(result["degraded"]) == ["relevant_memories", "summary"]
+    assert result["relevant_memories"] == [] and result["summary"] == ""
+    assert result["combined_context"] == "<human>Ada</human>"
+
+    # a per-request deadline overrides the service default
+    result = service.get_full_context("tea", user_id="ada", timeout=2.0)
+    assert result["relevant_memories"] == ["likes tea"]
+
+
+def test_full_context_budget_reports_dropped_parts():
+    service = _service({})
+    result = service.get_full_context("tea", user_id="ada", budget=len("<human>Ada</human>"))
+
+    assert result["combined_context"] == "<human>Ada</human>"
+    assert result["included"] == ["user_context"]
+    assert result["dropped"] == ["summary", "memory:1"]
+
+
+def test_initialize_existing_user_skips_lock_and_scan():
+    service = MemoryService(backend=LocalLetta())
+    created = service.initialize_user("ada", user_info="Likes tea")
+    assert created["success"] is True
+
+    with service.memory.track_calls() as calls:
+        again = service.initialize_user("ada")
+    assert again["agent_id"] == created["agent_id"] and "already exists" in again["message"]
+    assert calls.total == 0
+    assert service.initialize_with_blocks("ada")["success"] is False
+
+
+def test_search_memories_applies_score_threshold():
+    service = MemoryService(backend=LocalLetta())
+    service.initialize_user("ada")
+    service.memory.add_passages([
+        {"text": "ordered a laptop and a laptop bag", "tags": ["user"]},
+        {"text": "asked about shipping to Berlin for the laptop", "tags": ["user"]},
+    ], subject_id="ada")
+
+    everything = service.search_memories("laptop", user_id="ada")
+    assert everything["count"] == everything["total_found"] == 2
+    best = max(hit.score for hit in everything["results"])
+    strict = service.search_memories("laptop", user_id="ada", score_threshold=best)
+    assert strict["results"] == ["ordered a laptop and a laptop bag"]
+    assert strict["threshold_applied"] is True and everything["threshold_applied"] is None
+
+
+class _UnscoredLetta(LocalLetta):
+    """ LocalLetta whose search results carry no score, like Letta's """
+
+    def _search(self, *args, **kwargs):
+        response = super()._search(*args, **kwargs)
+        return response._replace(results=[r._replace(score=None) for r in response.results])
+
+
+def test_search_memories_flags_an_unapplied_score_threshold():
+    service = MemoryService(backend=_UnscoredLetta())
+    service.initialize_user("ada")
+    service.memory.add_passages([{"text": "ordered a laptop", "tags": ["user"]}], subject_id="ada")
+
+    result = service.search_memories("laptop", user_id="ada", score_threshold=0.99)
+    assert result["results"] == ["ordered a laptop"]
+    assert result["threshold_applied"] is False
+
+
+def test_initialize_with_blocks_goes_through_memory():
+    service = MemoryService(backend=LocalLetta())
+    created = service.initialize_with_blocks("ada", blocks=[
+        {"label": "preferences", "description": "Known preferences", "value": "Dark mode"},
+    ])
+    assert created["success"] is True and created["blocks_created"] == 3
+    assert service.memory.get_memory("preferences", subject_id="ada") == "Dark mode"
+    assert service.memory.get_memory_agent_id("ada") == created["agent_id"]
+
+    again = service.initialize_with_blocks("ada")
+    assert again["success"] is False and "reset=True" in again["error"]
+    recreated = service.initialize_user("ada", user_info="Likes tea", reset=True)
+    assert recreated["agent_id"] != created["agent_id"]
+    assert service.memory.get_user_memory("ada") == "Likes tea"
+    assert service.memory.get_memory("preferences", subject_id="ada") is None
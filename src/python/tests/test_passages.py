@@ -0,0 +1,182 @@
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Fake letta_client whose passage writes are slow and can fail on demand
+letta_client = types.ModuleType("letta_client")
+
+
+class _Storage:
+    def __init__(self):
+        self.agents = {}
+        self.passages = []
+        self.agent_counter = 0
+        self.run_counter = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+
+_store = _Storage()
+
+
+class _AgentsMessages:
+    def create_async(self, agent_id: str, messages):
+        _store.run_counter += 1
+        return types.SimpleNamespace(id=f"run-{_store.run_counter}")
+
+
+class _AgentsPassages:
+    def create(self, agent_id: str, text: str, tags=None):
+        with _store.lock:
+            _store.in_flight += 1
+            _store.max_in_flight = max(_store.max_in_flight, _store.in_flight)
+        try:
+            time.sleep(0.02)
+            if "boom" in text:
+                raise RuntimeError("embedding failed")
+            with _store.lock:
+                _store.passages.append({"agent_id": agent_id, "text": text, "tags": tags})
+                return [types.SimpleNamespace(id=f"passage-{len(_store.passages)}", text=text)]
+        finally:
+            with _store.lock:
+                _store.in_flight -= 1
+
+    def list(self, agent_id: str, after=None, limit=1000):
+        stored = [
+            types.SimpleNamespace(id=f"passage-{i}", text=p["text"])
+            for i, p in enumerate(_store.passages) if p["agent_id"] == agent_id
+        ]
+        start = next((i + 1 for i, p in enumerate(stored) if p.id == after), 0)
+        return stored[start:start + limit]
+
+
+class _Agents:
+    def __init__(self):
+        self.messages = _AgentsMessages()
+        self.passages = _AgentsPassages()
+
+    def create(self, name: str, model: str, agent_type: str, initial_message_sequence, tags):
+        _store.agent_counter += 1
+        agent_id = f"agent-{_store.agent_counter}"
+        _store.agents[agent_id] = {"id": agent_id, "name": name, "tags": tags}
+        return types.SimpleNamespace(id=agent_id)
+
+    def list(self, tags, match_all_tags=True):
+        return [types.SimpleNamespace(**a) for a in _store.agents.values() if all(t in a["tags"] for t in tags)]
+
+
+class Letta:
+    def __init__(self, token=None, base_url=None, **kwargs):
+        self.agents = _Agents()
+
+
+letta_client.Letta = Letta
+sys.modules['letta_client'] = letta_client
+
+
+from ai_memory_sdk import Memory  # noqa: E402
+from passages import write_passages  # noqa: E402
+from dedupe import PassageDedupe, fingerprint  # noqa: E402
+
+
+def test_write_passages_keeps_order_and_reports_failures():
+    def create(text, tags=None):
+        if text == "bad":
+            raise ValueError("rejected")
+        time.sleep(0.01 if text == "a" else 0)
+        return [types.SimpleNamespace(id=f"id-{text}")]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = write_passages(create, [{"text": "a"}, {"text": "bad"}, {"text": "c"}], executor=executor)
+
+    assert [r.index for r in results] == [0, 1, 2]
+    assert [r.passage_id for r in results] == ["id-a", None, "id-c"]
+    assert [r.ok for r in results] == [True, False, True]
+    assert isinstance(results[1].error, ValueError)
+
+
+def test_archival_writes_are_concurrent_and_bounded():
+    _store.max_in_flight = 0
+    memory = Memory(api_key="test", subject_id="bulk_user", passage_write_concurrency=4)
+    messages = [{"role": "user", "content": f"message {i}"} for i in range(12)]
+
+    start = time.time()
+    memory.add_messages(messages, skip_vector_storage=False)
+    elapsed = time.time() - start
+
+    stored = [p["text"] for p in _store.passages if p["text"].startswith("message")]
+    assert sorted(stored) == sorted(m["content"] for m in messages)
+    assert 1 < _store.max_in_flight <= 4
+    assert elapsed < 12 * 0.02
+    memory.close()
+
+
+def test_add_passages_does_not_abort_on_failure():
+    memory = Memory(api_key="test", subject_id="bulk_user_fail")
+
+    results = memory.add_passages([
+        {"text": "fine one", "tags": ["note"]},
+        {"text": "boom"},
+        {"text": "fine two"},
+    ])
+
+    assert [r.ok for r in results] == [True, False, True]
+    assert "embedding failed" in str(results[1].error)
+    stored = [p["text"] for p in _store.passages if p["agent_id"] == memory._get_agent_for_subject("bulk_user_fail").id]
+    assert "fine one" in stored and "fine two" in stored
+    memory.close()
+
+
+def _texts_for(memory, subject_id):
+    agent_id = memory._get_agent_for_subject(subject_id).id
+    return [p["text"] for p in _store.passages if p["agent_id"] == agent_id]
+
+
+def test_fingerprint_normalizes_text():
+    assert fingerprint("I love  cats\n") == fingerprint("i love cats")
+    assert fingerprint("I love cats") != fingerprint("I love dogs")
+    assert fingerprint("ok", ["user", "sdk"]) == fingerprint("OK", ["sdk", "user"]) != fingerprint("ok", ["assistant", "sdk"])
+
+
+def test_dedupe_skips_resent_history(tmp_path):
+    dedupe = PassageDedupe(str(tmp_path / "fingerprints.db"))
+    memory = Memory(api_key="test", subject_id="dedupe_user", passage_dedupe=dedupe)
+    window_1 = [{"role": "user", "content": "hello"}, {"role": "assistant", "content": "hi there"}]
+    window_2 = window_1 + [{"role": "user", "content": "Hello "}, {"role": "user", "content": "new fact"}]
+    # same text under another role is a different passage
+    window_3 = [{"role": "assistant", "content": "hello"}]
+
+    memory.add_messages(window_1, skip_vector_storage=False)
+    memory.add_messages(window_2, skip_vector_storage=False)
+    memory.add_messages(window_3, skip_vector_storage=False)
+
+    assert sorted(_texts_for(memory, "dedupe_user")) == [
+        "Initialized memory for subject dedupe_user", "hello", "hello", "hi there", "new fact",
+    ]
+    assert dedupe.skipped == 3
+
+    user_tags = ["user", memory._default_tag]
+    results = memory.add_passages([{"text": "new fact", "tags": user_tags}, {"text": "boom"}, {"text": "another"}])
+    assert [(r.duplicate, r.ok) for r in results] == [(True, True), (False, False), (False, True)]
+    # a failed write releases its fingerprint, so it can be retried
+    assert dedupe.claim(memory._get_agent_for_subject("dedupe_user").id, ["boom"]) == [True]
+    memory.close()
+
+    # fingerprints persist across processes
+    reopened = PassageDedupe(str(tmp_path / "fingerprints.db"))
+    assert reopened.claim(memory._get_agent_for_subject("dedupe_user").id, [("hello", user_tags), ("fresh", user_tags)]) == [False, True]
+
+
+def test_dedupe_seeds_from_existing_passages():
+    plain = Memory(api_key="test", subject_id="seeded_user")
+    plain.add_passages([{"text": "already archived"}])
+
+    memory = Memory(api_key="test", subject_id="seeded_user", passage_dedupe=PassageDedupe(seed_existing=True))
+    results = memory.add_passages([{"text": "Already archived"}, {"text": "brand new"}])
+
+    assert [r.duplicate for r in results] == [True, False]
+    assert _texts_for(memory, "seeded_user").count("already archived") == 1
@@ -0,0 +1,124 @@
+import re
+
+import pytest
+
+from prompt_formatter import ContextSection, assemble_context, format_memories, format_messages, messages_tag, truncate_sentences
+from schemas import MessageCreate
+
+
+def _messages(*pairs):
+    return [MessageCreate(role=role, content=content) for role, content in pairs]
+
+
+def _body(chunk):
+    content = chunk["content"]
+    assert content.startswith(f"<{messages_tag}>") and content.endswith(f"</{messages_tag}>")
+    return content[len(f"<{messages_tag}>"):-len(f"</{messages_tag}>")].split(":\n", 1)[1]
+
+
+def test_short_history_is_one_chunk():
+    chunks = format_messages(_messages(("user", "hi"), ("assistant", "hello")))
+
+    assert len(chunks) == 1
+    assert _body(chunks[0]) == "user: hi\nassistant: hello"
+
+
+# characters taken by the <messages> wrapper of every chunk
+WRAPPER = len(format_messages([], budget=None)[0]["content"])
+
+
+def test_chunks_respect_budget_without_splitting_messages():
+    messages = _messages(*[("user", "x" * 30) for _ in range(10)])  # 36 chars per line
+
+    chunks = format_messages(messages, budget=WRAPPER + 100)
+
+    assert all(len(c["content"]) <= WRAPPER + 100 for c in chunks)
+    bodies = [_body(c) for c in chunks]
+    assert [len(b.split("\n")) for b in bodies] == [2, 2, 2, 2, 2]
+    assert "\n".join(bodies) == "\n".join(f"user: {'x' * 30}" for _ in range(10))
+
+
+def test_oversized_message_is_split_on_its_own():
+    messages = _messages(("user", "short"), ("assistant", "y" * 250), ("user", "after"))
+
+    chunks = format_messages(messages, budget=WRAPPER + 100)
+    bodies = [_body(c) for c in chunks]
+
+    assert bodies[0] == "user: short"
+    assert bodies[-1] == "user: after"
+    # every piece of the split message still says who spoke
+    assert all(b.startswith("assistant: ") for b in bodies[1:-1])
+    assert "".join(b[len("assistant: "):] for b in bodies[1:-1]) == "y" * 250
+    assert all(len(c["content"]) <= WRAPPER + 100 for c in chunks)
+
+
+def test_budget_must_leave_room_inside_the_wrapper():
+    with pytest.raises(ValueError, match="wrapper"):
+        format_messages(_messages(("user", "hi")), budget=WRAPPER)
+
+
+def test_pluggable_token_count():
+    words = lambda text: len(text.split())  # noqa: E731
+    messages = _messages(*[("user", "one two three") for _ in range(4)])  # 4 "tokens" per line
+    wrapper = words(format_messages([], budget=None)[0]["content"])
+
+    chunks = format_messages(messages, budget=wrapper + 8, count=words)
+
+    assert len(chunks) == 2
+    assert all(words(c["content"]) <= wrapper + 8 for c in chunks)
+    assert format_messages(messages, budget=None) == format_messages(messages, budget=10 ** 6)
+
+
+def test_iter_file_parts_streams_and_marks_last(tmp_path):
+    from prompt_formatter import iter_file_parts
+
+    path = tmp_path / "notes.txt"
+    path.write_text("a" * 25, encoding="utf-8")
+
+    parts = iter_file_parts(str(path), "notes", "Meeting notes", chunk_chars=10)
+    first = next(parts)  # lazily produced
+    rest = list(parts)
+
+    assert first["content"] == '<file label="notes" description="Meeting notes"><file_part part=1>' + "a" * 10 + "</file_part></file>"
+    assert [p["content"].split(">")[1] for p in rest] == ["<file_part part=2", "<file_part part=3/3"]
+    assert list(iter_file_parts(str(tmp_path / "missing.txt"), "x", ""))[0]["content"].endswith("</file>")
+
+
+def test_truncate_sentences_stops_at_boundary():
+    text = "First one. Second one! Third one?"
+    assert truncate_sentences(text, 100) == text
+    assert truncate_sentences(text, 25) == "First one. Second one!"
+    assert truncate_sentences(text, 5) == ""
+
+
+def test_assemble_context_without_budget_keeps_everything():
+    sections = [ContextSection("human", "<human>Ada</human>"), ContextSection("summary", "")]
+    ctx = assemble_context(sections, ["likes tea"])
+
+    assert ctx.text == "<human>Ada</human>\n\n" + format_memories(["likes tea"])
+    assert ctx.included == ["human", "memory:1"] and ctx.dropped == []
+
+
+def test_assemble_context_trims_by_priority():
+    human = "<human>Name is Ada. Lives in Paris. Works as a pilot.</human>"
+    summary = "<summary>Talked about tea.</summary>"
+    sections = [ContextSection("human", human, priority=2), ContextSection("summary", summary, priority=0)]
+    memories = ["likes green tea", "owns a cat", "x" * 200]
+    budget = len(format_memories(memories[:2])) + 2 + len(human) - len(" Works as a pilot.")
+
+    ctx = assemble_context(sections, memories, budget=budget, memories_priority=3)
+
+    assert ctx.text == "<human>Name is Ada. Lives in Paris.</human>\n\n" + format_memories(memories[:2])
+    assert ctx.used <= budget
+    assert ctx.included == ["human", "memory:1", "memory:2"]
+    assert ctx.truncated == ["human"]
+    assert ctx.dropped == ["summary", "memory:3"]
+
+
+def test_assemble_context_uses_tokenizer():
+    tokens = lambda text: len(re.findall(r"\w+|[^\w\s]", text))  # noqa: E731
+    sections = [ContextSection("notes", "<notes>one two. three four.</notes>")]
+    ctx = assemble_context(sections, budget=10, count=tokens)
+
+    assert ctx.text == "<notes>one two.</notes>"
+    assert ctx.used == 10
@@ -0,0 +1,198 @@
+import sys
+import time
+import types
+from collections import Counter
+
+import pytest
+
+
+# Fake letta_client whose runs follow scripted status sequences
+letta_client = types.ModuleType("letta_client")
+
+
+class _Storage:
+    def __init__(self):
+        self.scripts = {}  # run_id -> list of statuses returned by successive polls
+        self.polls = Counter()
+        self.submitted = []  # messages passed to each create_async call
+        self.chunk_script = {}  # submission index -> statuses for that chunk's run
+
+
+_store = _Storage()
+
+
+class _Runs:
+    def retrieve(self, run_id: str):
+        _store.polls[run_id] += 1
+        script = _store.scripts[run_id]
+        status = script.pop(0) if len(script) > 1 else script[0]
+        return types.SimpleNamespace(id=run_id, status=status)
+
+
+class _AgentsMessages:
+    def create_async(self, agent_id: str, messages):
+        run_id = f"chunk-{len(_store.submitted)}"
+        _store.submitted.append(messages)
+        _store.scripts[run_id] = list(_store.chunk_script.get(len(_store.submitted) - 1, ["completed"]))
+        return types.SimpleNamespace(id=run_id)
+
+
+class Letta:
+    def __init__(self, token=None, base_url=None, **kwargs):
+        self.runs = _Runs()
+        self.agents = types.SimpleNamespace(messages=_AgentsMessages())
+
+
+letta_client.Letta = Letta
+sys.modules['letta_client'] = letta_client
+
+
+from ai_memory_sdk import Memory  # noqa: E402
+from runs import ALL, ANY_FAILED, FIRST, Backoff  # noqa: E402
+
+
+@pytest.fixture
+def memory():
+    _store.scripts.clear()
+    _store.polls.clear()
+    _store.submitted.clear()
+    _store.chunk_script.clear()
+    return Memory(api_key="test")
+
+
+def test_wait_for_runs_all(memory):
+    _store.scripts.update({
+        "fast": ["completed"],
+        "slow": ["running", "running", "completed"],
+        "bad": ["running", "failed"],
+    })
+
+    statuses = memory.wait_for_runs(["fast", "slow", "bad"], timeout=5, return_when=ALL)
+
+    assert statuses == {"fast": "completed", "slow": "completed", "bad": "failed"}
+    assert _store.polls["fast"] == 1  # finished runs are not polled again
+
+
+def test_wait_for_runs_first_returns_early(memory):
+    _store.scripts.update({"fast": ["running", "completed"], "stuck": ["running"]})
+
+    start = time.monotonic()
+    statuses = memory.wait_for_runs(["fast", "stuck"], timeout=5, return_when=FIRST)
+
+    assert statuses == {"fast": "completed", "stuck": "running"}
+    assert time.monotonic() - start < 1
+
+
+def test_wait_for_runs_any_failed(memory):
+    _store.scripts.update({"bad": ["running", "cancelled"], "stuck": ["running"]})
+
+    statuses = memory.wait_for_runs(["bad", "stuck"], timeout=5, return_when=ANY_FAILED)
+
+    assert statuses == {"bad": "cancelled", "stuck": "running"}
+
+
+def test_wait_for_runs_timeout_returns_pending_status(memory):
+    _store.scripts.update({"stuck": ["running"]})
+
+    start = time.monotonic()
+    statuses = memory.wait_for_runs(["stuck"], timeout=0.3)
+
+    assert statuses == {"stuck": "running"}
+    assert 0.3 <= time.monotonic() - start < 1
+
+
+def test_wait_for_run_raises_on_failed_run(memory):
+    _store.scripts.update({"bad": ["running", "failed"]})
+
+    with pytest.raises(RuntimeError, match="failed"):
+        memory.wait_for_run("bad", timeout=5)
+
+
+def test_wait_for_runs_rejects_unknown_return_when(memory):
+    with pytest.raises(ValueError, match="return_when"):
+        memory.wait_for_runs(["x"], return_when="sometimes")
+
+
+def test_backoff_grows_to_maximum():
+    backoff = Backoff(initial=0.1, factor=2, maximum=1, jitter=0)
+    delays = [next(backoff) for _ in range(6)]
+
+    assert delays == pytest.approx([0.1, 0.2, 0.4, 0.8, 1, 1])
+
+
+def test_run_handle_result_and_callbacks(memory):
+    _store.scripts.update({"bg": ["running", "running", "completed"]})
+    seen = []
+
+    handle = memory.run_handle("bg")
+    handle.add_done_callback(lambda h: seen.append(h.status))
+
+    assert handle.result(timeout=5) == "completed"
+    assert handle.done()
+    assert seen == ["completed"]
+    # callbacks added after completion run immediately
+    handle.add_done_callback(lambda h: seen.append("late"))
+    assert seen == ["completed", "late"]
+
+
+def test_run_handle_future_adapter(memory):
+    _store.scripts.update({"ok": ["running", "completed"], "bad": ["running", "failed"]})
+
+    ok_future = memory.run_handle("ok").future()
+    bad_future = memory.run_handle("bad").future()
+
+    assert ok_future.result(timeout=5) == "completed"
+    with pytest.raises(RuntimeError, match="failed"):
+        bad_future.result(timeout=5)
+
+
+def test_run_handle_result_timeout(memory):
+    _store.scripts.update({"stuck": ["running"]})
+
+    handle = memory.run_handle("stuck")
+    with pytest.raises(TimeoutError):
+        handle.result(timeout=0.2)
+    assert not handle.done()
+    assert handle.status == "running"
+
+    memory.close()
+    with pytest.raises(RuntimeError, match="Stopped polling"):
+        handle.result(timeout=1)
+
+
+def test_handles_share_one_poller_thread(memory):
+    import threading
+
+    _store.scripts.update({f"r{i}": ["running", "completed"] for i in range(5)})
+    before = threading.active_count()
+
+    handles = [memory.run_handle(f"r{i}") for i in range(5)]
+
+    assert threading.active_count() <= before + 1
+    assert [h.result(timeout=5) for h in handles] == ["completed"] * 5
+    assert memory.wait_for_run(handles[0]) is None
+
+
+def _long_history():
+    return [{"role": "user", "content": f"{i}: " + "x" * 2000} for i in range(6)]
+
+
+def test_chunked_submission_waits_for_every_chunk(memory):
+    _store.chunk_script.update({0: ["running", "running", "running", "completed"]})
+
+    run_id = memory._learn_messages_sync("agent-1", _long_history(), skip_vector_storage=True)
+
+    assert len(_store.submitted) == 3
+    assert all(len(m) == 1 for m in _store.submitted)
+    assert run_id == "chunk-2"
+    assert memory.wait_for_runs([run_id], timeout=5) == {run_id: "completed"}
+    assert _store.polls["chunk-0"] == 4
+
+
+def test_chunked_submission_fails_if_any_chunk_fails(memory):
+    _store.chunk_script.update({1: ["running", "failed"]})
+
+    run_id = memory._learn_messages_sync("agent-1", _long_history(), skip_vector_storage=True)
+
+    with pytest.raises(RuntimeError, match="failed"):
+        memory.run_handle(run_id).result(timeout=5)
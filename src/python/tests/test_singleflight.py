@@ -0,0 +1,219 @@
+import asyncio
+import sys
+import threading
+import time
+import types
+from collections import Counter
+
+import pytest
+
+
+# Fake letta_client with slow, counted reads so overlapping lookups can be observed
+letta_client = types.ModuleType("letta_client")
+
+
+class _Storage:
+    def __init__(self):
+        self.agents = {}
+        self.agent_blocks = {}
+        self.blocks = {}
+        self.run_counter = 0
+        self.agent_counter = 0
+        self.block_counter = 0
+        self.calls = Counter()
+        self.delay = 0.0  # seconds every read takes
+
+
+_store = _Storage()
+
+
+class _AgentsBlocks:
+    def attach(self, agent_id: str, block_id: str):
+        _store.calls["agents.blocks.attach"] += 1
+        _store.agent_blocks.setdefault(agent_id, [])
+        if block_id not in _store.agent_blocks[agent_id]:
+            _store.agent_blocks[agent_id].append(block_id)
+
+    def list(self, agent_id: str):
+        _store.calls["agents.blocks.list"] += 1
+        time.sleep(_store.delay)
+        ids = _store.agent_blocks.get(agent_id, [])
+        return [types.SimpleNamespace(**_store.blocks[i]) for i in ids if i in _store.blocks]
+
+    def detach(self, agent_id: str, block_id: str):
+        _store.calls["agents.blocks.detach"] += 1
+        ids = _store.agent_blocks.get(agent_id, [])
+        _store.agent_blocks[agent_id] = [i for i in ids if i != block_id]
+
+    def retrieve(self, agent_id: str, label: str):
+        _store.calls["agents.blocks.retrieve"] += 1
+        for i in _store.agent_blocks.get(agent_id, []):
+            if i in _store.blocks and _store.blocks[i]["label"] == label:
+                return types.SimpleNamespace(**_store.blocks[i])
+        raise KeyError("Block not found")
+
+
+class _AgentsMessages:
+    def create_async(self, agent_id: str, messages):
+        _store.calls["agents.messages.create_async"] += 1
+        _store.run_counter += 1
+        return types.SimpleNamespace(id=f"run-{_store.run_counter}")
+
+
+class _AgentsPassages:
+    def create(self, agent_id: str, text: str, tags=None):
+        _store.calls["agents.passages.create"] += 1
+        return [types.SimpleNamespace(id=f"passage-{agent_id}", text=text)]
+
+    def search(self, agent_id: str, query: str, tags=None, **options):
+        _store.calls["agents.passages.search"] += 1
+        time.sleep(_store.delay)
+        result = types.SimpleNamespace(content=f"match for {query}", timestamp=None, tags=tags)
+        return types.SimpleNamespace(results=[result])
+
+
+class _Agents:
+    def __init__(self):
+        self.blocks = _AgentsBlocks()
+        self.messages = _AgentsMessages()
+        self.passages = _AgentsPassages()
+
+    def create(self, name: str, model: str, agent_type: str, initial_message_sequence, tags):
+        _store.calls["agents.create"] += 1
+        _store.agent_counter += 1
+        agent_id = f"agent-{_store.agent_counter}"
+        _store.agents[agent_id] = {"id": agent_id, "name": name, "tags": tags}
+        _store.agent_blocks[agent_id] = []
+        return types.SimpleNamespace(id=agent_id)
+
+    def list(self, tags, match_all_tags=True):
+        _store.calls["agents.list"] += 1
+        time.sleep(_store.delay)
+        return [types.SimpleNamespace(**a) for a in _store.agents.values() if all(t in a["tags"] for t in tags)]
+
+    def delete(self, agent_id: str):
+        _store.calls["agents.delete"] += 1
+        _store.agents.pop(agent_id, None)
+        _store.agent_blocks.pop(agent_id, None)
+
+
+class _Blocks:
+    def create(self, label: str, description: str, limit: int, value: str):
+        _store.calls["blocks.create"] += 1
+        _store.block_counter += 1
+        block_id = f"block-{_store.block_counter}"
+        _store.blocks[block_id] = {
+            "id": block_id,
+            "label": label,
+            "description": description,
+            "limit": limit,
+            "value": value,
+        }
+        return types.SimpleNamespace(**_store.blocks[block_id])
+
+    def delete(self, block_id: str):
+        _store.calls["blocks.delete"] += 1
+        _store.blocks.pop(block_id, None)
+
+
+class _Runs:
+    def retrieve(self, run_id: str):
+        _store.calls["runs.retrieve"] += 1
+        return types.SimpleNamespace(id=run_id, status="completed")
+
+
+class Letta:
+    def __init__(self, token=None, base_url=None, **kwargs):
+        self.agents = _Agents()
+        self.blocks = _Blocks()
+        self.runs = _Runs()
+
+
+letta_client.Letta = Letta
+sys.modules['letta_client'] = letta_client
+
+
+from ai_memory_sdk import Memory  # noqa: E402
+from singleflight import AsyncSingleFlight, SingleFlight  # noqa: E402
+
+
+def _concurrently(fn, n=8):
+    barrier = threading.Barrier(n)
+    results, errors = [], []
+
+    def worker():
+        barrier.wait()
+        try:
+            results.append(fn())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_single_flight_shares_result_and_error():
+    flights = SingleFlight()
+
+    def slow():
+        time.sleep(0.1)
+        return object()
+
+    results, _ = _concurrently(lambda: flights.do("k", slow))
+    assert len({id(r) for r in results}) == 1
+    assert flights.stats().executed == 1 and flights.stats().shared == 7
+
+    def failing():
+        time.sleep(0.1)
+        raise RuntimeError("upstream down")
+
+    _, errors = _concurrently(lambda: flights.do("k", failing))
+    assert len(errors) == 8 and len({id(e) for e in errors}) == 1
+
+    # nothing is cached once the call has returned
+    assert flights.do("k", lambda: 1) == 1
+    assert flights.stats().in_flight == 0
+
+
+def test_async_single_flight():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def main():
+        flights = AsyncSingleFlight()
+        results = await asyncio.gather(*(flights.do("k", fetch) for _ in range(5)))
+        return results, flights.stats()
+
+    results, stats = asyncio.run(main())
+    assert results == ["value"] * 5 and len(calls) == 1
+    assert stats.executed == 1 and stats.shared == 4 and stats.in_flight == 0
+
+
+def test_concurrent_context_reads_share_upstream_calls():
+    memory = Memory(api_key="test", subject_cache_size=0, search_cache_size=0)
+    memory.initialize_subject("hot-user")
+    memory.initialize_memory("prefs", "Preferences", value="tea", subject_id="hot-user")
+    _store.calls.clear()
+    _store.delay = 0.1
+    try:
+        results, errors = _concurrently(lambda: (
+            memory.get_memory("prefs", subject_id="hot-user"),
+            memory.search("hot-user", "tea"),
+        ))
+    finally:
+        _store.delay = 0.0
+
+    assert not errors
+    assert all(r == ("tea", ["match for tea"]) for r in results)
+    assert _store.calls["agents.list"] == 2  # one shared tag scan for get_memory and one for search
+    assert _store.calls["agents.blocks.list"] == 1
+    assert _store.calls["agents.passages.search"] == 1
+    assert memory.coalescing_stats().shared > 0
@@ -0,0 +1,193 @@
+import sys
+import types
+import sqlite3
+from collections import Counter
+
+import pytest
+
+
+# Fake letta_client that counts upstream calls so index hits can be told apart from tag scans
+letta_client = types.ModuleType("letta_client")
+
+
+class _Storage:
+    def __init__(self):
+        self.agents = {}
+        self.agent_blocks = {}
+        self.blocks = {}
+        self.run_counter = 0
+        self.agent_counter = 0
+        self.block_counter = 0
+        self.calls = Counter()
+
+
+_store = _Storage()
+
+
+class _AgentsBlocks:
+    def attach(self, agent_id: str, block_id: str):
+        _store.calls["agents.blocks.attach"] += 1
+        _store.agent_blocks.setdefault(agent_id, [])
+        if block_id not in _store.agent_blocks[agent_id]:
+            _store.agent_blocks[agent_id].append(block_id)
+
+    def list(self, agent_id: str):
+        _store.calls["agents.blocks.list"] += 1
+        ids = _store.agent_blocks.get(agent_id, [])
+        return [types.SimpleNamespace(**_store.blocks[i]) for i in ids if i in _store.blocks]
+
+    def detach(self, agent_id: str, block_id: str):
+        _store.calls["agents.blocks.detach"] += 1
+        ids = _store.agent_blocks.get(agent_id, [])
+        _store.agent_blocks[agent_id] = [i for i in ids if i != block_id]
+
+    def retrieve(self, agent_id: str, label: str):
+        _store.calls["agents.blocks.retrieve"] += 1
+        for i in _store.agent_blocks.get(agent_id, []):
+            if i in _store.blocks and _store.blocks[i]["label"] == label:
+                return types.SimpleNamespace(**_store.blocks[i])
+        raise KeyError("Block not found")
+
+
+class _AgentsMessages:
+    def create_async(self, agent_id: str, messages):
+        _store.calls["agents.messages.create_async"] += 1
+        _store.run_counter += 1
+        return types.SimpleNamespace(id=f"run-{_store.run_counter}")
+
+
+class _AgentsPassages:
+    def create(self, agent_id: str, text: str, tags=None):
+        _store.calls["agents.passages.create"] += 1
+        return [types.SimpleNamespace(id=f"passage-{agent_id}", text=text)]
+
+    def search(self, agent_id: str, query: str, tags=None, **options):
+        _store.calls["agents.passages.search"] += 1
+        result = types.SimpleNamespace(content=f"match for {query}", timestamp=None, tags=tags)
+        return types.SimpleNamespace(results=[result])
+
+
+class _Agents:
+    def __init__(self):
+        self.blocks = _AgentsBlocks()
+        self.messages = _AgentsMessages()
+        self.passages = _AgentsPassages()
+
+    def create(self, name: str, model: str, agent_type: str, initial_message_sequence, tags):
+        _store.calls["agents.create"] += 1
+        _store.agent_counter += 1
+        agent_id = f"agent-{_store.agent_counter}"
+        _store.agents[agent_id] = {"id": agent_id, "name": name, "tags": tags}
+        _store.agent_blocks[agent_id] = []
+        return types.SimpleNamespace(id=agent_id)
+
+    def list(self, tags, match_all_tags=True, after=None, limit=None):
+        _store.calls["agents.list"] += 1
+        matching = [a for a in _store.agents.values() if all(t in a["tags"] for t in tags)]
+        if after is not None:
+            matching = matching[[a["id"] for a in matching].index(after) + 1:]
+        blocks = lambda a: [types.SimpleNamespace(**_store.blocks[i]) for i in _store.agent_blocks[a["id"]]]  # noqa: E731
+        return [
+            types.SimpleNamespace(**a, memory=types.SimpleNamespace(blocks=blocks(a)))
+            for a in matching[:limit]
+        ]
+
+    def delete(self, agent_id: str):
+        _store.calls["agents.delete"] += 1
+        _store.agents.pop(agent_id, None)
+        _store.agent_blocks.pop(agent_id, None)
+
+
+class _Blocks:
+    def create(self, label: str, description: str, limit: int, value: str):
+        _store.calls["blocks.create"] += 1
+        _store.block_counter += 1
+        block_id = f"block-{_store.block_counter}"
+        _store.blocks[block_id] = {
+            "id": block_id,
+            "label": label,
+            "description": description,
+            "limit": limit,
+            "value": value,
+        }
+        return types.SimpleNamespace(**_store.blocks[block_id])
+
+    def delete(self, block_id: str):
+        _store.calls["blocks.delete"] += 1
+        _store.blocks.pop(block_id, None)
+
+
+class _Runs:
+    def retrieve(self, run_id: str):
+        _store.calls["runs.retrieve"] += 1
+        return types.SimpleNamespace(id=run_id, status="completed")
+
+
+class Letta:
+    def __init__(self, token=None, base_url=None, **kwargs):
+        self.agents = _Agents()
+        self.blocks = _Blocks()
+        self.runs = _Runs()
+
+
+letta_client.Letta = Letta
+sys.modules['letta_client'] = letta_client
+
+
+from ai_memory_sdk import Memory  # noqa: E402
+from subject_index import SubjectIndex  # noqa: E402
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return str(tmp_path / "subjects.db")
+
+
+def test_index_is_shared_through_wal_file(index_path):
+    writer = Memory(api_key="test", subject_index=SubjectIndex(index_path))
+    agent_id = writer.initialize_subject("indexed")
+    writer.initialize_memory("prefs", "Preferences", value="tea", subject_id="indexed")
+
+    # a second instance (e.g. another worker process) resolves the subject without a tag scan
+    reader = Memory(api_key="test", subject_index=SubjectIndex(index_path))
+    _store.calls.clear()
+    assert reader.get_memory_agent_id("indexed") == agent_id
+    assert reader.initialize_memory("prefs", "Preferences", subject_id="indexed") == _store.agent_blocks[agent_id][0]
+    assert _store.calls["agents.list"] == 0
+    assert _store.calls["agents.blocks.list"] == 0
+
+    assert sqlite3.connect(index_path).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_deletes_keep_index_current(index_path):
+    index = SubjectIndex(index_path)
+    memory = Memory(api_key="test", subject_index=index)
+    agent_id = memory.initialize_subject("short-lived")
+    block_id = memory.initialize_memory("notes", "Notes", subject_id="short-lived")
+    assert index.blocks(agent_id) == {"notes": block_id}
+
+    _store.calls.clear()
+    memory.delete_block("notes", subject_id="short-lived")
+    assert _store.calls["agents.blocks.list"] == 0
+    assert index.blocks(agent_id) == {}
+
+    memory.initialize_subject("short-lived", reset=True)
+    assert agent_id not in _store.agents
+    assert index.agent_for("subj:short-lived") not in (None, agent_id)
+
+
+def test_rebuild_from_paginated_scan(index_path):
+    memory = Memory(api_key="test")
+    created = {f"scan-{i}": memory.initialize_user_memory(f"scan-{i}", reset=True) for i in range(5)}
+
+    index = SubjectIndex(index_path)
+    indexed = Memory(api_key="test", subject_index=index)
+    _store.calls.clear()
+    assert indexed.rebuild_subject_index(page_size=2) == len([a for a in _store.agents.values() if "ai-memory-sdk" in a["tags"]])
+    assert _store.calls["agents.list"] >= 3
+
+    _store.calls.clear()
+    for user_id, agent_id in created.items():
+        assert indexed.get_memory_agent_id(user_id) == agent_id
+        assert set(index.blocks(agent_id)) == {"human", "summary"}
+    assert _store.calls["agents.list"] == 0
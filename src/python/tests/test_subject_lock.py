@@ -0,0 +1,296 @@
+import asyncio
+import sys
+import threading
+import time
+import types
+from collections import Counter
+
+import pytest
+
+
+# Fake letta_client whose agent creation is slow enough for concurrent callers to race
+letta_client = types.ModuleType("letta_client")
+
+
+class _Storage:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.agents = {}
+        self.agent_blocks = {}
+        self.blocks = {}
+        self.passages = {}
+        self.agent_counter = 0
+        self.block_counter = 0
+        self.calls = Counter()
+        self.delay = 0.0  # seconds agent creation takes
+
+
+_store = _Storage()
+
+
+class _AgentsBlocks:
+    def attach(self, agent_id: str, block_id: str):
+        _store.agent_blocks.setdefault(agent_id, []).append(block_id)
+
+    def list(self, agent_id: str):
+        return [types.SimpleNamespace(**_store.blocks[i]) for i in _store.agent_blocks.get(agent_id, [])]
+
+    def detach(self, agent_id: str, block_id: str):
+        _store.agent_blocks[agent_id] = [i for i in _store.agent_blocks.get(agent_id, []) if i != block_id]
+
+
+class _AgentsPassages:
+    def create(self, agent_id: str, text: str, tags=None):
+        passages = _store.passages.setdefault(agent_id, [])
+        passage = types.SimpleNamespace(id=f"passage-{agent_id}-{len(passages)}", text=text, tags=tags)
+        passages.append(passage)
+        return [passage]
+
+    def list(self, agent_id: str, after=None, limit=1000):
+        return list(_store.passages.get(agent_id, []))
+
+
+class _AgentsMessages:
+    def create_async(self, agent_id: str, messages):
+        _store.calls["agents.messages.create_async"] += 1
+        return types.SimpleNamespace(id=f"run-{agent_id}-{_store.calls['agents.messages.create_async']}")
+
+
+class _Agents:
+    def __init__(self):
+        self.blocks = _AgentsBlocks()
+        self.passages = _AgentsPassages()
+        self.messages = _AgentsMessages()
+
+    def create(self, name: str, model: str, agent_type: str, initial_message_sequence, tags):
+        _store.calls["agents.create"] += 1
+        time.sleep(_store.delay)
+        _store.agent_counter += 1
+        agent_id = f"agent-{_store.agent_counter}"
+        _store.agents[agent_id] = {"id": agent_id, "name": name, "tags": tags, "created_at": _store.agent_counter}
+        _store.agent_blocks[agent_id] = []
+        return types.SimpleNamespace(id=agent_id)
+
+    def list(self, tags, match_all_tags=True):
+        _store.calls["agents.list"] += 1
+        # newest first, so lookups must not simply take the first match
+        agents = sorted(_store.agents.values(), key=lambda a: a["created_at"], reverse=True)
+        return [types.SimpleNamespace(**a) for a in agents if all(t in a["tags"] for t in tags)]
+
+    def delete(self, agent_id: str):
+        _store.calls["agents.delete"] += 1
+        _store.agents.pop(agent_id, None)
+        _store.agent_blocks.pop(agent_id, None)
+        _store.passages.pop(agent_id, None)
+
+
+class _Blocks:
+    def create(self, label: str, description: str, limit: int, value: str):
+        _store.block_counter += 1
+        block_id = f"block-{_store.block_counter}"
+        _store.blocks[block_id] = {"id": block_id, "label": label, "description": description, "limit": limit, "value": value}
+        return types.SimpleNamespace(**_store.blocks[block_id])
+
+
+class Letta:
+    def __init__(self, token=None, base_url=None, **kwargs):
+        self.agents = _Agents()
+        self.blocks = _Blocks()
+
+
+class _Async:
+    """ Coroutine facade over the sync fake, yielding to the event loop before every call """
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return _Async(attr)
+
+        async def call(*args, **kwargs):
+            await asyncio.sleep(0.01)
+            return attr(*args, **kwargs)
+        return call
+
+
+class AsyncLetta:
+    def __init__(self, token=None, base_url=None, **kwargs):
+        self.agents = _Async(_Agents())
+        self.blocks = _Async(_Blocks())
+
+
+letta_client.Letta = Letta
+letta_client.AsyncLetta = AsyncLetta
+sys.modules['letta_client'] = letta_client
+
+
+from ai_memory_sdk import Memory  # noqa: E402
+from async_memory import AsyncMemory  # noqa: E402
+from subject_lock import SubjectLocks  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _fresh_store():
+    _store.reset()
+
+
+def _concurrently(fn, n=8):
+    barrier = threading.Barrier(n)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(fn())
+
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_first_writes_create_one_agent():
+    _store.delay = 0.05
+    # separate instances share no caches or in-flight lookups, only the process-wide subject locks
+    memories = [Memory(api_key="x", subject_cache_size=0) for _ in range(8)]
+    it = iter(memories)
+    lock = threading.Lock()
+
+    def ensure():
+        with lock:
+            memory = next(it)
+        return memory._ensure_subject("customer-1")
+
+    results = _concurrently(ensure)
+    assert _store.calls["agents.create"] == 1
+    assert len(set(results)) == 1 and set(results) == set(_store.agents)
+
+
+def test_async_concurrent_first_writes_create_one_agent():
+    async def main():
+        memories = [AsyncMemory(api_key="x", subject_cache_size=0) for _ in range(5)]
+        return await asyncio.gather(*(m._ensure_subject("customer-1") for m in memories))
+
+    results = asyncio.run(main())
+    assert _store.calls["agents.create"] == 1
+    assert len(set(results)) == 1
+
+
+def test_concurrent_first_add_messages_create_one_user_agent():
+    _store.delay = 0.05
+    memories = [Memory(api_key="x", subject_cache_size=0) for _ in range(4)]
+    it = iter(memories)
+    lock = threading.Lock()
+
+    def add():
+        with lock:
+            memory = next(it)
+        memory.add_messages("u1", [{"role": "user", "content": "hi"}])
+        return memory.get_memory_agent_id("u1")
+
+    results = _concurrently(add, n=4)
+    assert _store.calls["agents.create"] == 1
+    assert _store.calls["agents.messages.create_async"] == 4
+    assert len(set(results)) == 1
+    assert sorted(b["label"] for b in _store.blocks.values()) == ["human", "summary"]
+
+
+def test_async_concurrent_first_add_messages_create_one_user_agent():
+    async def main():
+        memories = [AsyncMemory(api_key="x", subject_cache_size=0) for _ in range(4)]
+        await asyncio.gather(*(m.add_messages("u1", [{"role": "user", "content": "hi"}]) for m in memories))
+
+    asyncio.run(main())
+    assert _store.calls["agents.create"] == 1
+    assert _store.calls["agents.messages.create_async"] == 4
+
+
+def test_file_lock_excludes_other_instances(tmp_path):
+    holder = SubjectLocks(str(tmp_path))
+    other = SubjectLocks(str(tmp_path), timeout=0.1)
+    with holder.hold("customer-1"):
+        with pytest.raises(TimeoutError):
+            with other.hold("customer-1"):
+                pass
+        # other subjects are not affected
+        with other.hold("customer-2"):
+            pass
+    with other.hold("customer-1"):
+        pass
+
+
+def test_cancelled_async_lock_releases_file_lock(tmp_path):
+    holder = SubjectLocks(str(tmp_path))
+    memory = AsyncMemory(api_key="x", subject_locks=SubjectLocks(str(tmp_path), poll_interval=0.01))
+
+    async def main():
+        async def locked():
+            async with memory.subject_lock("customer-1"):
+                pass
+
+        with holder.hold("customer-1"):
+            task = asyncio.ensure_future(locked())
+            await asyncio.sleep(0.05)  # the executor thread is now polling for the file lock
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        await asyncio.sleep(0.1)  # the thread takes the freed lock, then hands it back
+
+    asyncio.run(main())
+    with SubjectLocks(str(tmp_path), timeout=0.2).hold("customer-1"):
+        pass
+
+
+def test_async_lock_excludes_sync_holders_of_the_same_locks():
+    locks = SubjectLocks()
+    memory = AsyncMemory(api_key="x", subject_locks=locks)
+    acquired = threading.Event()
+
+    async def locked():
+        async with memory.subject_lock("customer-1"):
+            acquired.set()
+
+    with Memory(api_key="x", subject_locks=locks).subject_lock("customer-1"):
+        thread = threading.Thread(target=asyncio.run, args=(locked(),))
+        thread.start()
+        assert not acquired.wait(0.2)
+    assert acquired.wait(2)
+    thread.join()
+    # the async holder handed the thread lock back
+    with locks.hold("customer-1"):
+        pass
+
+
+def test_duplicates_resolve_to_oldest_and_reconcile_merges_them():
+    memory = Memory(api_key="x")
+    tags = memory._subject_tags("customer-1")
+    first = memory._create_sleeptime_agent("a", tags)
+    second = memory._create_sleeptime_agent("b", tags)
+    memory._create_context_block(first, "human", "About the user", value="Likes tea")
+    memory._create_context_block(second, "human", "About the user", value="")
+    memory._create_context_block(second, "preferences", "Preferences", value="Dark mode")
+    memory.letta_client.agents.passages.create(agent_id=first, text="Ordered a laptop")
+    memory.letta_client.agents.passages.create(agent_id=second, text="ordered a  LAPTOP")
+    memory.letta_client.agents.passages.create(agent_id=second, text="Asked for a refund")
+
+    assert memory._get_agent_for_subject("customer-1").id == first
+
+    preview = memory.reconcile_subject("customer-1", dry_run=True)
+    assert preview.kept == first and preview.deleted == [second]
+    assert preview.passages_copied == 1 and preview.blocks_copied == 1
+    assert second in _store.agents
+
+    result = memory.reconcile_subject("customer-1")
+    assert result == preview
+    assert list(_store.agents) == [first]
+    assert [p.text for p in _store.passages[first]] == ["Ordered a laptop", "Asked for a refund"]
+    assert memory.get_memory("human", subject_id="customer-1") == "Likes tea"
+    assert memory.get_memory("preferences", subject_id="customer-1") == "Dark mode"
+
+    assert memory.reconcile_subject("customer-1").deleted == []
+    assert memory.reconcile_subject("nobody").kept is None
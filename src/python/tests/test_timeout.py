@@ -97,14 +97,14 @@ class _Runs:
 
 
 class Letta:
-    def __init__(self, token=None):
+    def __init__(self, token=None, **kwargs):
         self.agents = _Agents()
         self.blocks = _Blocks()
         self.runs = _Runs()
 
 
 class AsyncLetta:
-    def __init__(self, token=None):
+    def __init__(self, token=None, **kwargs):
         self.agents = types.SimpleNamespace(passages=_AgentsPassages())
 
 